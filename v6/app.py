@@ -4,52 +4,401 @@ OIR報告系統主應用程式
 Flask Web應用，支援多語言介面
 """
 
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_file
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_file, Response
+import io
 import os
 from datetime import datetime
 import tempfile
 import json
+import atexit
+import time
+import math
+import hmac
 from database import DatabaseManager
-from languages import get_text, get_available_languages, get_language_name
+from report_template import get_report_template
+from languages import get_text, get_available_languages, get_template_context
 from temp_data import TempDataManager
+from batch_report import BatchReportGenerator
+from report_store import ReportStore
+from janitor import Janitor
+from inspection_stats import DATAPOINT_COUNT, item_statistics
+from bulk_input import parse_datapoint, make_item_data, parse_table, apply_bulk_items
+from events import EventBroker, SQLiteEventRelay, event_stream_response
+from gauge import GaugeIngestor
+from server_session import ServerSessionInterface, SQLiteSessionStore, FileSessionStore
+from metrics import metrics, init_app as init_metrics
+from logging_setup import setup_logging, fields
+from render_cache import RenderCache
 import logging
 
-# 設置日誌
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-change-this-in-production'
 
-# 設置絕對路徑
-BASE_PATH = r'C:\Users\aaron\OneDrive\桌面\intern\JE\OIR Report\v6'
-app.config['BASE_PATH'] = BASE_PATH
+# 以下為預設設定，create_app會依序以 OIR_SETTINGS 指定的設定檔、OIR_ 開頭的環境變數
+# （如 OIR_BASE_PATH=/srv/oir、OIR_SECRET_KEY=...）及傳入的config覆寫
 
-# 初始化資料庫和臨時數據管理器
-db_manager = DatabaseManager(BASE_PATH)
-temp_manager = TempDataManager(BASE_PATH)
+# 基礎路徑（資料庫、報告模板及各種存放區），預設為本程式所在目錄
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+
+# 儲存後端：'sqlite' 保存歷史記錄到OIR_database.sqlite3，'excel' 沿用OIR_database.xlsx的database工作表
+STORAGE_BACKEND = 'sqlite'
+
+# 歷史搜尋結果每頁記錄數
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+
+# 已生成報告的存放區（內容定址，依容量及時間淘汰），相對路徑以BASE_PATH為基準，設為None則下載時重新生成報告
+REPORT_STORE_DIR = 'report_store'
+REPORT_STORE_MAX_BYTES = 200 * 1024 * 1024
+REPORT_STORE_MAX_AGE = 24 * 3600
+
+# session存放位置：'sqlite' 保存到OIR_sessions.sqlite3，'file' 保存到臨時目錄，cookie只保存session ID
+SESSION_STORE = 'sqlite'
+SESSION_CACHE_SIZE = 1024
+
+# 批次報告的工作程序數量，None則使用CPU核心數
+BATCH_WORKERS = None
+
+# 效能量測：每個路由的延遲直方圖及區段拆分（/metrics、/debug/metrics）
+# METRICS_PROFILE_RATE為以cProfile分析的請求比例，0為停用（分析會使請求變慢）
+METRICS_ENABLED = True
+METRICS_PROFILE_RATE = 0.0
+
+# 日誌：由背景執行緒寫入輪替檔案（相對路徑以BASE_PATH為基準，None則只輸出到標準錯誤）
+# LOG_LEVELS設定各模組的層級，例如 {'app': 'DEBUG'} 記錄每次數據提交的詳細內容
+LOG_FILE = os.path.join('logs', 'oir.log')
+LOG_LEVEL = 'INFO'
+LOG_LEVELS = {}
+LOG_FORMAT = 'text'  # 'text' 或 'json'
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+
+# 渲染快取：只依語言變化的頁面及片段（導覽列、步驟指示）的最大項目數，0為停用
+# 頁面回應帶有ETag及Last-Modified，重複載入返回304；debug模式下不快取（模板會自動重新載入）
+RENDER_CACHE_SIZE = 256
+
+# 伺服器的工作程序數量及每個工作程序的執行緒數量（serve.py依命令列參數設定；
+# 直接以gunicorn執行時以 OIR_SERVER_WORKERS / OIR_SERVER_THREADS 設定）；
+# 伺服器推送事件的串流各佔用一個執行緒，預設的執行緒數量足夠同時處理串流及一般請求
+SERVER_WORKERS = 1
+SERVER_THREADS = 16
+
+# 伺服器推送事件（/events：session變更、報告生成進度、批次工作進度；/gauge/events：量測設備讀數）
+# 每個工作程序同時連線的串流數上限（每個串流佔用一個伺服器執行緒，None則為SERVER_THREADS的一半，
+# 另一半保留給一般請求；0則停用串流）及每個串流的最長時間（秒，之後瀏覽器自動重新連線並補回期間的事件）
+EVENT_MAX_STREAMS = None
+EVENT_STREAM_MAX_DURATION = 60
+# SERVER_WORKERS大於1時以此SQLite資料庫在工作程序之間轉送事件（相對路徑以BASE_PATH為基準）
+EVENT_RELAY_FILE = 'OIR_events.sqlite3'
+
+# 量測設備讀數輸入：GAUGE_TCP_ADDRESS為設備伺服器／模擬設備連線的位址（None則不監聽），
+# GAUGE_SERIAL_PORTS為工作站 -> 序列埠，例如 {'caliper-1': '/dev/ttyUSB0'}（需要pyserial）
+# 綁定及尚未合併的讀數保存在GAUGE_DB_FILE（相對路徑以BASE_PATH為基準，所有工作程序共用），
+# TCP監聽及序列埠只由一個工作程序開啟，讀數事件經事件轉送送到任何工作程序的串流；
+# GAUGE_API_TOKENS為工作站 -> 權杖，HTTP送出讀數需帶 X-Gauge-Token 標頭，沒有設定權杖的工作站只接受本機送出
+GAUGE_ENABLED = False
+GAUGE_DB_FILE = 'OIR_gauge.sqlite3'
+GAUGE_TCP_ADDRESS = '127.0.0.1:5055'
+GAUGE_SERIAL_PORTS = {}
+GAUGE_SERIAL_BAUDRATE = 9600
+GAUGE_API_TOKENS = {}
+
+# 讀取report_data的路由，只在這些請求中合併量測設備的讀數
+_GAUGE_ENDPOINTS = frozenset({
+    'data_input', 'submit_data_input', 'submit_bulk_data_input', 'bind_gauge', 'gauge_events',
+    'data_input_back', 'confirm_data', 'submit_confirm_data', 'preview_report', 'generate_report',
+})
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# 由create_app建立
+janitor = None
+db_manager = None
+temp_manager = None
+batch_generator = None
+report_store = None
+render_cache = RenderCache(0)
+event_broker = None
+gauge_ingestor = None
+
+def create_app(config=None):
+    """
+    設定並初始化應用程式（同一程序只會初始化一次）
+    預先載入(preload)的伺服器在fork工作程序之前呼叫，OIS索引及報告模板只需載入一次，
+    工作程序透過寫時複製共用；工作程序之間的工作簿寫入以鎖檔協調
+
+    Args:
+        config (dict): 覆寫的設定值（最高優先）
+
+    Returns:
+        Flask: 已初始化的應用程式
+    """
+    global BASE_PATH, STORAGE_BACKEND, HISTORY_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE
+    global REPORT_STORE_DIR, REPORT_STORE_MAX_BYTES, REPORT_STORE_MAX_AGE
+    global SESSION_STORE, SESSION_CACHE_SIZE, BATCH_WORKERS, METRICS_ENABLED, METRICS_PROFILE_RATE
+    global RENDER_CACHE_SIZE, GAUGE_ENABLED
+    global janitor, db_manager, temp_manager, batch_generator, report_store, render_cache
+    global event_broker, gauge_ingestor
+
+    if db_manager is not None:
+        return app
+
+    app.config.from_mapping(
+        BASE_PATH=BASE_PATH,
+        STORAGE_BACKEND=STORAGE_BACKEND,
+        HISTORY_PAGE_SIZE=HISTORY_PAGE_SIZE,
+        HISTORY_MAX_PAGE_SIZE=HISTORY_MAX_PAGE_SIZE,
+        REPORT_STORE_DIR=REPORT_STORE_DIR,
+        REPORT_STORE_MAX_BYTES=REPORT_STORE_MAX_BYTES,
+        REPORT_STORE_MAX_AGE=REPORT_STORE_MAX_AGE,
+        SESSION_STORE=SESSION_STORE,
+        SESSION_CACHE_SIZE=SESSION_CACHE_SIZE,
+        BATCH_WORKERS=BATCH_WORKERS,
+        METRICS_ENABLED=METRICS_ENABLED,
+        METRICS_PROFILE_RATE=METRICS_PROFILE_RATE,
+        LOG_FILE=LOG_FILE,
+        LOG_LEVEL=LOG_LEVEL,
+        LOG_LEVELS=LOG_LEVELS,
+        LOG_FORMAT=LOG_FORMAT,
+        LOG_MAX_BYTES=LOG_MAX_BYTES,
+        LOG_BACKUP_COUNT=LOG_BACKUP_COUNT,
+        RENDER_CACHE_SIZE=RENDER_CACHE_SIZE,
+        SERVER_WORKERS=SERVER_WORKERS,
+        SERVER_THREADS=SERVER_THREADS,
+        EVENT_MAX_STREAMS=EVENT_MAX_STREAMS,
+        EVENT_STREAM_MAX_DURATION=EVENT_STREAM_MAX_DURATION,
+        EVENT_RELAY_FILE=EVENT_RELAY_FILE,
+        GAUGE_ENABLED=GAUGE_ENABLED,
+        GAUGE_DB_FILE=GAUGE_DB_FILE,
+        GAUGE_TCP_ADDRESS=GAUGE_TCP_ADDRESS,
+        GAUGE_SERIAL_PORTS=GAUGE_SERIAL_PORTS,
+        GAUGE_SERIAL_BAUDRATE=GAUGE_SERIAL_BAUDRATE,
+        GAUGE_API_TOKENS=GAUGE_API_TOKENS,
+    )
+    app.config.from_envvar('OIR_SETTINGS', silent=True)
+    app.config.from_prefixed_env('OIR')
+    if config:
+        app.config.update(config)
+
+    BASE_PATH = app.config['BASE_PATH']
+    STORAGE_BACKEND = app.config['STORAGE_BACKEND']
+    HISTORY_PAGE_SIZE = app.config['HISTORY_PAGE_SIZE']
+    HISTORY_MAX_PAGE_SIZE = app.config['HISTORY_MAX_PAGE_SIZE']
+    REPORT_STORE_DIR = app.config['REPORT_STORE_DIR']
+    if REPORT_STORE_DIR:
+        REPORT_STORE_DIR = app.config['REPORT_STORE_DIR'] = os.path.join(BASE_PATH, REPORT_STORE_DIR)
+    REPORT_STORE_MAX_BYTES = app.config['REPORT_STORE_MAX_BYTES']
+    REPORT_STORE_MAX_AGE = app.config['REPORT_STORE_MAX_AGE']
+    SESSION_STORE = app.config['SESSION_STORE']
+    SESSION_CACHE_SIZE = app.config['SESSION_CACHE_SIZE']
+    BATCH_WORKERS = app.config['BATCH_WORKERS']
+    METRICS_ENABLED = app.config['METRICS_ENABLED']
+    METRICS_PROFILE_RATE = float(app.config['METRICS_PROFILE_RATE'])
+    RENDER_CACHE_SIZE = int(app.config['RENDER_CACHE_SIZE'])
+    GAUGE_ENABLED = app.config['GAUGE_ENABLED']
+    template_file = os.path.join(BASE_PATH, 'OIR_Report_Sample_v2.xlsx')
+
+    # 日誌在建立其他服務之前設定，啟動期間的錯誤也會寫入日誌檔案
+    setup_logging(
+        os.path.join(BASE_PATH, app.config['LOG_FILE']) if app.config['LOG_FILE'] else None,
+        level=app.config['LOG_LEVEL'],
+        levels=app.config['LOG_LEVELS'],
+        max_bytes=app.config['LOG_MAX_BYTES'],
+        backup_count=app.config['LOG_BACKUP_COUNT'],
+        style=app.config['LOG_FORMAT'],
+    )
+
+    # 初始化資料庫和臨時數據管理器（OIS索引從快照恢復或在此建立）
+    janitor = Janitor()
+    db_manager = DatabaseManager(BASE_PATH, backend=STORAGE_BACKEND)
+    # 結束時保存索引快照，下次啟動（或新的工作程序）不需重新解析工作簿
+    atexit.register(db_manager.save_snapshot)
+    temp_manager = TempDataManager(BASE_PATH, janitor=janitor)
+    batch_generator = BatchReportGenerator(db_manager, template_file, max_workers=BATCH_WORKERS, janitor=janitor)
+    atexit.register(batch_generator.shutdown)
+    report_store = ReportStore(REPORT_STORE_DIR, REPORT_STORE_MAX_BYTES, REPORT_STORE_MAX_AGE) if REPORT_STORE_DIR else None
+
+    # 預先解析報告模板，工作程序不需在第一個請求時解析
+    if os.path.exists(template_file):
+        try:
+            get_report_template(template_file)
+        except Exception as e:
+            logger.error("Error preloading report template: %s", e)
+
+    # 由單一背景執行緒負責刪除過期的session備份、存放區報告及批次zip檔案
+    janitor.watch(temp_manager.temp_dir, 'session_*.json', TempDataManager.SESSION_TTL.total_seconds(), 'sessions')
+    janitor.watch(temp_manager.temp_dir, 'session_*.journal', TempDataManager.SESSION_TTL.total_seconds(), 'sessions')
+    janitor.watch(temp_manager.temp_dir, 'session_*.lock', TempDataManager.SESSION_TTL.total_seconds(), 'sessions')
+    janitor.watch(tempfile.gettempdir(), 'OIR_batch_*.zip', BatchReportGenerator.JOB_RETENTION.total_seconds(), 'batch')
+    janitor.watch(tempfile.gettempdir(), 'OIR_batch_*.json', BatchReportGenerator.JOB_RETENTION.total_seconds(), 'batch')
+    if report_store:
+        janitor.watch(report_store.directory, '*.xlsx', REPORT_STORE_MAX_AGE, 'reports', recursive=True)
+
+    # 伺服器端session（取代cookie session，session['report_data']的用法不變）
+    if SESSION_STORE == 'file':
+        session_store = FileSessionStore(os.path.join(tempfile.gettempdir(), 'oir_sessions'))
+        janitor.watch(session_store.directory, '*.session', app.permanent_session_lifetime.total_seconds(), 'server_sessions')
+    else:
+        session_store = SQLiteSessionStore(os.path.join(BASE_PATH, 'OIR_sessions.sqlite3'))
+    app.session_interface = ServerSessionInterface(
+        session_store, cache_size=SESSION_CACHE_SIZE, defaults={'language': 'en'}
+    )
+
+    if METRICS_ENABLED:
+        init_metrics(app, profile_rate=METRICS_PROFILE_RATE)
+
+    # 模板會自動重新載入時（debug模式）不快取，修改的模板立即生效
+    if not (app.debug or app.config.get('TEMPLATES_AUTO_RELOAD')):
+        render_cache = RenderCache(RENDER_CACHE_SIZE)
+        app.jinja_env.globals['cached_fragment'] = render_cache.fragment
+
+    # 串流佔用執行緒直到結束，最多使用一半的執行緒，一般請求不會因串流而排隊
+    max_streams = app.config['EVENT_MAX_STREAMS']
+    if max_streams is None:
+        max_streams = int(app.config['SERVER_THREADS']) // 2
+    if int(max_streams) >= int(app.config['SERVER_THREADS']):
+        logger.warning("EVENT_MAX_STREAMS (%s) leaves no threads for other requests (SERVER_THREADS=%s)",
+                       max_streams, app.config['SERVER_THREADS'])
+    relay = None
+    if int(app.config['SERVER_WORKERS']) > 1 and app.config['EVENT_RELAY_FILE']:
+        relay = SQLiteEventRelay(os.path.join(BASE_PATH, app.config['EVENT_RELAY_FILE']))
+    event_broker = EventBroker(
+        max_subscribers=max_streams,
+        max_duration=app.config['EVENT_STREAM_MAX_DURATION'],
+        relay=relay,
+    )
+    atexit.register(event_broker.close_all)
+    if GAUGE_ENABLED:
+        # 監聽執行緒在第一個請求時由取得監聽鎖的工作程序啟動（預先載入的伺服器fork之後）
+        gauge_ingestor = GaugeIngestor(
+            event_broker,
+            os.path.join(BASE_PATH, app.config['GAUGE_DB_FILE']),
+            tcp_address=app.config['GAUGE_TCP_ADDRESS'],
+            serial_ports=app.config['GAUGE_SERIAL_PORTS'],
+            baudrate=app.config['GAUGE_SERIAL_BAUDRATE'],
+        )
+        atexit.register(gauge_ingestor.stop)
+
+    janitor.start()
+    return app
 
 @app.before_request
 def before_request():
     """每個請求前的處理"""
-    # 設置預設語言
-    if 'language' not in session:
-        session['language'] = 'en'
+    # 預設語言由session.get('language', 'en')提供，不寫入session，
+    # 沒有cookie的請求（靜態檔案、/metrics、健康檢查）不會因此建立新的session
+    # 量測設備的讀數只在數據輸入相關的路由合併，其他請求不查詢讀數資料庫
+    if gauge_ingestor is not None and request.endpoint in _GAUGE_ENDPOINTS:
+        gauge_ingestor.start()
+        if gauge_ingestor.has_pending(session.sid):
+            _merge_gauge_readings()
+
+@app.after_request
+def after_request(response):
+    """請求修改了session時推送給訂閱該session的串流（沒有訂閱者時不建立事件）"""
+    if event_broker is not None and session.modified and getattr(session, 'sid', None):
+        channel = f'session:{session.sid}'
+        if event_broker.has_subscribers(channel):
+            event_broker.publish(channel, 'session', dict(session))
+    return response
+
+def _publish_progress(stage, percent, **extra):
+    """
+    推送目前session的報告生成進度
+
+    Args:
+        stage (str): 階段名稱
+        percent (int): 進度百分比
+        **extra: 其他事件內容
+    """
+    if event_broker is None:
+        return
+    channel = f'report:{session.sid}'
+    if event_broker.has_subscribers(channel):
+        event_broker.publish(channel, 'report_progress', dict(extra, stage=stage, percent=percent))
+
+def _job_progress_publisher(interval=0.5):
+    """
+    建立批次工作的進度回呼：進度最多每interval秒推送一次，工作結束時推送job_completed
+
+    Returns:
+        callable: progress_callback(job)
+    """
+    last_published = [0.0]
+
+    def publish(job):
+        if event_broker is None:
+            return
+        # 狀態在同一次加鎖中讀取，完成的工作一定帶有finished_at
+        status = job.to_dict()
+        if status['finished_at'] is not None:
+            event_broker.publish('jobs', 'job_completed', status)
+            return
+        now = time.monotonic()
+        if now - last_published[0] >= interval:
+            last_published[0] = now
+            event_broker.publish('jobs', 'job_progress', status)
+
+    return publish
+
+def _merge_gauge_readings():
+    """將量測設備的讀數批次合併到目前的報告（只寫入一次session及臨時備份）"""
+    pending = gauge_ingestor.take_pending(session.sid)
+    report_data = session.get('report_data')
+    if not pending or not report_data:
+        return
+    
+    ois_items = report_data['ois_items']
+    for index, slots in sorted(pending.items()):
+        if index >= len(ois_items):
+            continue
+        existing = report_data['items_data'].get(str(index))
+        datapoints = list(existing['datapoints']) if existing else [None] * DATAPOINT_COUNT
+        for slot, value in slots.items():
+            datapoints[slot] = value
+        report_data['items_data'][str(index)] = make_item_data(ois_items[index], index, datapoints)
+        # 目前項目的數據點已填滿時移到下一個項目
+        if report_data['current_item'] == index and all(value is not None for value in datapoints):
+            report_data['current_item'] = index + 1
+    
+    session['report_data'] = report_data
+    session_id = session.get('session_id', request.remote_addr)
+    temp_manager.save_session_data(session_id, dict(report_data))
+    logger.debug("Gauge readings merged", extra=fields(
+        ois_no=report_data.get('ois_no'), items=sorted(pending), current_item=report_data['current_item']
+    ))
+
+app.jinja_env.globals['cached_fragment'] = render_cache.fragment
+
+def render_page(template_name, **context):
+    """
+    渲染只依語言（及傳入參數）變化的頁面，使用渲染快取及ETag條件請求
+    有待顯示的flash訊息時不使用快取（訊息只顯示一次）
+
+    Args:
+        template_name (str): 模板名稱
+        **context: 模板參數（必須可雜湊，並且是頁面內容唯一的變化來源）
+
+    Returns:
+        Response: 頁面回應（200或304）
+    """
+    if not render_cache.enabled or '_flashes' in session:
+        return render_template(template_name, **context)
+    key = (template_name, session.get('language', 'en'), request.script_root, tuple(sorted(context.items())))
+    return render_cache.page(key, lambda: render_template(template_name, **context))
 
 @app.context_processor
 def inject_template_vars():
     """注入模板變數"""
-    return {
-        'get_text': lambda key: get_text(key, session.get('language', 'en')),
-        'current_lang': session.get('language', 'en'),
-        'available_languages': get_available_languages(),
-        'get_language_name': lambda code: get_language_name(code, session.get('language', 'en'))
-    }
+    # 每個語言預先建立的文字表及語言名稱（英文後備已解析）
+    return get_template_context(session.get('language', 'en'))
 
 @app.route('/')
 def index():
     """首頁"""
-    return render_template('index.html')
+    return render_page('index.html')
 
 @app.route('/set_language/<language>')
 def set_language(language):
@@ -61,7 +410,7 @@ def set_language(language):
 @app.route('/new_report')
 def new_report():
     """新增報告 - 第一步：輸入基本資訊"""
-    return render_template('new_report_step1.html')
+    return render_page('new_report_step1.html')
 
 @app.route('/new_report/step1', methods=['POST'])
 def new_report_step1():
@@ -133,85 +482,197 @@ def data_input():
                          item_data=current_item_data,
                          current_item=current_item + 1,
                          total_items=len(ois_items),
-                         existing_data=report_data['items_data'].get(str(current_item), {}))
+                         existing_data=report_data['items_data'].get(str(current_item), {}),
+                         gauge_enabled=gauge_ingestor is not None)
 
 @app.route('/data_input/submit', methods=['POST'])
 def submit_data_input():
     """提交數據輸入"""
     try:
-        logger.info("=== Data input submission started ===")
-        logger.info(f"Session keys: {list(session.keys())}")
-        
         if 'report_data' not in session:
-            logger.error("No report_data in session")
+            logger.warning("Data input submitted without report_data in session")
             return jsonify({'success': False, 'message': get_text('error', session.get('language', 'en'))})
         
         report_data = session['report_data']
         current_item = report_data['current_item']
-        logger.info(f"Current item: {current_item}")
-        logger.info(f"Report data keys: {list(report_data.keys())}")
         
-        # 獲取10個數據點
-        datapoints = []
-        for i in range(1, 11):
-            value = request.form.get(f'datapoint_{i}', '').strip()
-            logger.info(f"Datapoint {i}: '{value}'")
-            if value:
-                try:
-                    datapoints.append(float(value))
-                except ValueError:
-                    datapoints.append(value)  # 如果不是數字，保存原始值
-            else:
-                datapoints.append(None)
+        # 獲取10個數據點（不是數字則保存原始值）
+        datapoints = [parse_datapoint(request.form.get(f'datapoint_{i}', '')) for i in range(1, 11)]
         
-        logger.info(f"All datapoints: {datapoints}")
-    
         # 儲存當前項目的數據 - 確保所有值都是可序列化的
         current_ois_item = report_data['ois_items'][current_item]
-        logger.info(f"Current OIS item: {current_ois_item}")
-        
-        item_data = {
-            'item': int(current_ois_item['Item']) if current_ois_item['Item'] is not None else current_item + 1,
-            'description': str(current_ois_item['Description']) if current_ois_item['Description'] is not None else '',
-            'min_limit': float(current_ois_item['Minimum Limit']) if current_ois_item['Minimum Limit'] is not None else 0.0,
-            'max_limit': float(current_ois_item['Maximum Limit']) if current_ois_item['Maximum Limit'] is not None else 0.0,
-            'unit': str(current_ois_item['Unit']) if current_ois_item['Unit'] is not None else '',
-            'datapoints': datapoints
-        }
+        item_data = make_item_data(current_ois_item, current_item, datapoints)
         
-        logger.info(f"Prepared item data: {item_data}")
+        logger.debug("Prepared item data", extra=fields(ois_item=current_ois_item, item_data=item_data))
         # 確保 current_item 是字符串作為字典鍵，避免序列化問題
         report_data['items_data'][str(current_item)] = item_data
         
         # 移動到下一項目
         report_data['current_item'] += 1
-        logger.info(f"Moving to next item: {report_data['current_item']}")
         
-        # 嘗試保存到session
-        logger.info("Attempting to save to session...")
+        # 保存到session
         session['report_data'] = report_data
-        logger.info("Session save successful")
         
         # 保存到臨時文件作為備份
         session_id = session.get('session_id', request.remote_addr)
-        temp_result = temp_manager.save_session_data(session_id, report_data)
-        logger.info(f"Temp file save result: {temp_result}")
+        temp_result = temp_manager.append_item_data(session_id, report_data, str(current_item))
+        completed = report_data['current_item'] >= len(report_data['ois_items'])
+        logger.debug("Data input submitted", extra=fields(
+            ois_no=report_data.get('ois_no'), item=current_item, datapoints=datapoints,
+            temp_saved=temp_result, completed=completed
+        ))
         
         # 檢查是否完成所有項目
-        if report_data['current_item'] >= len(report_data['ois_items']):
-            logger.info("All items completed, redirecting to confirm_data")
+        if completed:
             return jsonify({'success': True, 'redirect': url_for('confirm_data')})
         else:
-            logger.info("More items remaining, redirecting to data_input")
             return jsonify({'success': True, 'redirect': url_for('data_input')})
             
     except Exception as e:
-        logger.error(f"Error in submit_data_input: {str(e)}")
-        logger.error(f"Exception type: {type(e).__name__}")
-        import traceback
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Error in submit_data_input: %s", e)
         return jsonify({'success': False, 'message': f'Error: {str(e)}'})
 
+@app.route('/data_input/bulk', methods=['POST'])
+def submit_bulk_data_input():
+    """
+    批量提交數據點（整份報告或部分項目），全部驗證通過後只保存一次session及臨時備份
+    JSON格式: {"items": [{"item": 1, "datapoints": [10.01, 10.02, ...]}, ...]}
+              或 {"text": "CSV/剪貼簿表格"}；也接受 text/csv、text/plain 內容或表單欄位 text
+    沒有項目編號的項目從目前項目（或 "start_item" 指定的項目編號）開始依序填入
+    """
+    if 'report_data' not in session:
+        return jsonify({'success': False, 'message': get_text('error', session.get('language', 'en'))}), 400
+    
+    report_data = session['report_data']
+    request_data = request.get_json(silent=True)
+    if isinstance(request_data, dict):
+        items = request_data.get('items')
+        text = request_data.get('text')
+        start_item = request_data.get('start_item')
+    else:
+        items = None
+        text = request.form.get('text') if request.form else request.get_data(as_text=True)
+        start_item = request.args.get('start_item') or request.form.get('start_item')
+    
+    if items is not None:
+        if not isinstance(items, list):
+            return jsonify({'success': False, 'message': 'items must be a list'}), 400
+        entries = items
+    else:
+        entries = parse_table(text or '')
+    
+    result = apply_bulk_items(report_data, entries, start_item)
+    if result['errors']:
+        return jsonify({'success': False, 'message': get_text('invalid_input', session.get('language', 'en')),
+                        'errors': result['errors']}), 400
+    
+    session['report_data'] = report_data
+    session_id = session.get('session_id', request.remote_addr)
+    temp_result = temp_manager.save_session_data(session_id, dict(report_data))
+    completed = report_data['current_item'] >= len(report_data['ois_items'])
+    logger.info("Bulk data input submitted", extra=fields(
+        ois_no=report_data.get('ois_no'), items=len(result['updated']), temp_saved=temp_result, completed=completed
+    ))
+    
+    return jsonify({
+        'success': True,
+        'updated': len(result['updated']),
+        'items': result['items'],
+        'current_item': report_data['current_item'],
+        'redirect': url_for('confirm_data') if completed else url_for('data_input')
+    })
+
+@app.route('/gauge/bind', methods=['POST'])
+def bind_gauge():
+    """
+    將量測設備工作站綁定到目前的報告，之後的讀數從目前項目的第一個空白數據點開始填入
+    JSON格式: {"station": "caliper-1"}
+    """
+    if gauge_ingestor is None:
+        return jsonify({'success': False, 'message': 'Gauge input is disabled'}), 404
+    if 'report_data' not in session:
+        return jsonify({'success': False, 'message': get_text('error', session.get('language', 'en'))}), 400
+    
+    station = str((request.get_json(silent=True) or request.form).get('station', '')).strip()
+    if not station:
+        return jsonify({'success': False, 'message': 'station is required'}), 400
+    
+    report_data = session['report_data']
+    current_item = report_data['current_item']
+    existing = report_data['items_data'].get(str(current_item))
+    datapoints = existing['datapoints'] if existing else []
+    slot = next((i for i, value in enumerate(datapoints) if value is None), len(datapoints))
+    if slot >= DATAPOINT_COUNT:
+        slot = 0
+    gauge_ingestor.bind(station, session.sid, current_item, len(report_data['ois_items']), slot)
+    
+    return jsonify({
+        'success': True,
+        'station': station,
+        'item_index': current_item,
+        'slot': slot,
+        'events_url': url_for('gauge_events')
+    })
+
+@app.route('/gauge/unbind', methods=['POST'])
+def unbind_gauge():
+    """解除目前session的量測設備綁定"""
+    if gauge_ingestor is not None:
+        gauge_ingestor.unbind(session.sid)
+    return jsonify({'success': True})
+
+@app.route('/gauge/events')
+def gauge_events():
+    """伺服器推送事件：目前session的讀數(reading)及項目完成(item_complete)"""
+    if gauge_ingestor is None:
+        return jsonify({'success': False, 'message': 'Gauge input is disabled'}), 404
+    return event_stream_response(event_broker, [GaugeIngestor.channel(session.sid)])
+
+@app.route('/api/gauge/<station>/readings', methods=['POST'])
+def api_gauge_readings(station):
+    """
+    API: 以HTTP送出量測設備讀數（網路量測設備或測試用）
+    JSON格式: {"values": [10.01, 10.02]}；也接受每行一個讀數的文字
+    工作站設定了權杖(GAUGE_API_TOKENS)時需帶 X-Gauge-Token 標頭，否則只接受本機送出；
+    瀏覽器發出的請求（帶Origin標頭）不需要權杖時一律拒絕，其他網站無法代替使用者送出讀數
+    """
+    if gauge_ingestor is None:
+        return jsonify({'success': False, 'message': 'Gauge input is disabled'}), 404
+    
+    token = app.config['GAUGE_API_TOKENS'].get(station)
+    if token:
+        allowed = hmac.compare_digest(request.headers.get('X-Gauge-Token', ''), str(token))
+    else:
+        allowed = request.remote_addr in ('127.0.0.1', '::1') and 'Origin' not in request.headers
+    if not allowed:
+        logger.warning("Rejected gauge readings", extra=fields(station=station, remote_addr=request.remote_addr))
+        return jsonify({'success': False, 'message': 'Forbidden'}), 403
+    
+    request_data = request.get_json(silent=True)
+    if isinstance(request_data, dict):
+        values = request_data.get('values') or []
+    else:
+        values = request.get_data(as_text=True).splitlines()
+    
+    events = []
+    for value in values:
+        # JSON數值直接使用，不經過文字解析
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            events.append(gauge_ingestor.add_reading(station, float(value)) if math.isfinite(value) else None)
+        elif str(value).strip():
+            events.append(gauge_ingestor.feed_line(str(value), station))
+    routed = [event for event in events if event is not None]
+    return jsonify({'success': True, 'received': len(events), 'routed': len(routed)})
+
+@app.route('/api/gauge/status')
+def api_gauge_status():
+    """API: 量測設備綁定及讀數統計"""
+    if gauge_ingestor is None:
+        return jsonify({'enabled': False})
+    status = gauge_ingestor.get_status()
+    status['enabled'] = True
+    return jsonify(status)
+
 @app.route('/data_input/back')
 def data_input_back():
     """返回上一個項目"""
@@ -270,7 +731,10 @@ def preview_report():
         return redirect(url_for('new_report'))
     
     report_data = session['report_data']
-    return render_template('preview_report.html', report_data=report_data)
+    item_stats = item_statistics(list(report_data['items_data'].values()))
+    return render_template('preview_report.html',
+                         report_data=report_data,
+                         item_stats=dict(zip(report_data['items_data'].keys(), item_stats)))
 
 @app.route('/generate_report')
 def generate_report():
@@ -294,6 +758,7 @@ def generate_report():
     
     try:
         # 保存到資料庫
+        _publish_progress('saving', 10)
         if db_manager.save_inspection_data(db_data):
             # 創建Excel報告 - 準備正確的數據格式
             excel_data = {
@@ -310,28 +775,31 @@ def generate_report():
             
             # 檢查模板文件是否存在
             sample_file = os.path.join(BASE_PATH, 'OIR_Report_Sample_v2.xlsx')
-            logger.info(f"Template file path: {sample_file}")
-            logger.info(f"Template file exists: {os.path.exists(sample_file)}")
-            
             if not os.path.exists(sample_file):
-                logger.error(f"Template file not found: {sample_file}")
+                logger.error("Template file not found: %s", sample_file)
                 flash('模板文件不存在', 'error')
                 return redirect(url_for('preview_report'))
             
-            excel_file = db_manager.create_report_excel(excel_data, sample_file)
-            logger.info(f"Generated Excel file: {excel_file}")
+            # 在記憶體中生成報告並直接回傳，不寫入共用的臨時目錄
+            _publish_progress('rendering', 40)
+            report_bytes = db_manager.render_report(excel_data, sample_file)
+            filename = db_manager.report_filename(excel_data)
+            _publish_progress('done' if report_bytes else 'failed', 100, filename=filename)
+            logger.info("Generated Excel report: %s", filename, extra=fields(
+                ois_no=report_data['ois_no'], items=len(excel_data['items'])
+            ))
             
-            if excel_file and os.path.exists(excel_file):
+            if report_bytes:
                 # 清理session
                 session.pop('report_data', None)
                 flash(get_text('report_generated', session.get('language', 'en')), 'success')
                 
-                return send_file(excel_file, 
+                return send_file(io.BytesIO(report_bytes), 
                                as_attachment=True, 
-                               download_name=os.path.basename(excel_file),
-                               mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+                               download_name=filename,
+                               mimetype=XLSX_MIMETYPE)
             else:
-                logger.error(f"Failed to create Excel file or file does not exist: {excel_file}")
+                logger.error("Failed to create Excel report: %s", filename)
                 flash('Excel文件生成失败', 'error')
                 return redirect(url_for('preview_report'))
         else:
@@ -340,7 +808,7 @@ def generate_report():
             return redirect(url_for('preview_report'))
             
     except Exception as e:
-        logger.error(f"Error in generate_report: {str(e)}")
+        logger.exception("Error in generate_report: %s", e)
         flash(f'報告生成錯誤: {str(e)}', 'error')
         return redirect(url_for('preview_report'))
     
@@ -352,39 +820,101 @@ def generate_report():
 @app.route('/history_report')
 def history_report():
     """歷史報告查詢頁面"""
-    return render_template('history_report.html')
+    return render_page('history_report.html')
 
-@app.route('/history_report/search', methods=['POST'])
-def search_history():
-    """搜尋歷史報告"""
+def _history_filters(source):
+    """從表單或查詢參數獲取歷史搜尋條件（移除空值）"""
     filters = {
-        'date_from': request.form.get('date_from'),
-        'date_to': request.form.get('date_to'),
-        'model_no': request.form.get('model_no'),
-        'lot_no': request.form.get('lot_no'),
-        'operator': request.form.get('operator')
+        'date_from': source.get('date_from'),
+        'date_to': source.get('date_to'),
+        'model_no': source.get('model_no'),
+        'lot_no': source.get('lot_no'),
+        'operator': source.get('operator')
     }
+    return {k: v for k, v in filters.items() if v}
+
+@app.route('/history_report/search', methods=['POST'])
+def search_history():
+    """搜尋歷史報告（只渲染第一頁，其餘頁面由 /api/history/search 提供）"""
+    filters = _history_filters(request.form)
+    page = db_manager.search_history_page(filters, 0, HISTORY_PAGE_SIZE)
+    
+    return render_template('history_results.html', 
+                         results=page['records'], 
+                         total=page['total'], 
+                         page_size=HISTORY_PAGE_SIZE, 
+                         filters=filters)
+
+@app.route('/api/history/search')
+def api_search_history():
+    """API: 分頁獲取歷史搜尋結果"""
+    filters = _history_filters(request.args)
+    offset = request.args.get('offset', 0, type=int)
+    limit = min(request.args.get('limit', HISTORY_PAGE_SIZE, type=int), HISTORY_MAX_PAGE_SIZE)
     
-    # 移除空值
-    filters = {k: v for k, v in filters.items() if v}
+    page = db_manager.search_history_page(filters, offset, limit)
+    page['success'] = True
+    return jsonify(page)
+
+@app.route('/api/history/statistics')
+def api_history_statistics():
+    """API: 分頁獲取歷史搜尋結果每筆記錄的統計值（平均值、標準差、超出規格數量、Cp/Cpk、接受/拒收）"""
+    filters = _history_filters(request.args)
+    offset = request.args.get('offset', 0, type=int)
+    limit = min(request.args.get('limit', HISTORY_PAGE_SIZE, type=int), HISTORY_MAX_PAGE_SIZE)
+    
+    page = db_manager.search_history_page(filters, offset, limit)
+    records = page.pop('records')
+    try:
+        statistics = db_manager.get_history_statistics(records)
+    except Exception as e:
+        logger.error("Error computing history statistics: %s", e)
+        return jsonify({'success': False, 'message': 'Statistics calculation failed'}), 500
     
-    results = db_manager.search_history_data(filters)
+    # 以記錄ID對應 /api/history/search 返回的記錄
+    page['statistics'] = [dict(stats, id=record.get('ID')) for record, stats in zip(records, statistics)]
+    page['success'] = True
+    return jsonify(page)
+
+@app.route('/api/history/trend/<model_no>')
+def api_history_trend(model_no):
+    """API: 型號（及項目）每日的數據點趨勢"""
+    trend = db_manager.get_daily_trend(
+        model_no,
+        item=request.args.get('item') or None,
+        date_from=request.args.get('date_from') or None,
+        date_to=request.args.get('date_to') or None
+    )
+    return jsonify({'success': True, 'model_no': model_no, 'trend': trend})
+
+@app.route('/api/spc/<model_no>/<item>')
+def api_spc_chart(model_no, item):
+    """API: 型號及項目的X-bar/S管制圖（每日一個子組）"""
+    chart = db_manager.get_spc_chart(
+        model_no,
+        item,
+        date_from=request.args.get('date_from') or None,
+        date_to=request.args.get('date_to') or None,
+        limit=request.args.get('limit', type=int)
+    )
+    if chart is None:
+        return jsonify({'success': False, 'message': 'SPC chart calculation failed'}), 500
     
-    return render_template('history_results.html', results=results, filters=filters)
+    chart['success'] = True
+    return jsonify(chart)
 
 @app.route('/history_report/prepare', methods=['POST'])
 def prepare_history_report():
-    """準備歷史報告生成 - 第一步：選擇記錄"""
+    """準備歷史報告生成 - 第一步：選擇記錄（只傳送記錄ID）"""
     try:
-        # 從POST請求中獲取記錄數據
         request_data = request.json
         
-        if not request_data:
+        if not request_data or not request_data.get('record_ids'):
             return jsonify({'success': False, 'message': '無效的記錄數據'})
         
-        # 將選中的記錄保存到session中
+        # 只在session中保存記錄ID，避免cookie過大
         session['history_report_data'] = {
-            'selected_records': request_data.get('records', []),
+            'record_ids': [int(record_id) for record_id in request_data['record_ids']],
             'multiple': request_data.get('multiple', False)
         }
         
@@ -395,7 +925,7 @@ def prepare_history_report():
         })
         
     except Exception as e:
-        logger.error(f"Error preparing history report: {str(e)}")
+        logger.exception("Error preparing history report: %s", e)
         return jsonify({'success': False, 'message': f'準備報告錯誤: {str(e)}'})
 
 @app.route('/history_report/additional_info')
@@ -406,7 +936,7 @@ def history_report_additional_info():
         return redirect(url_for('history_report'))
     
     history_data = session['history_report_data']
-    selected_records = history_data['selected_records']
+    selected_records = db_manager.get_history_records(history_data.get('record_ids', []))
     
     # 從第一筆記錄中獲取基本資訊作為預設值
     if selected_records:
@@ -437,54 +967,19 @@ def generate_history_report():
         location = request.form.get('location', '').strip()
         
         history_data = session['history_report_data']
-        selected_records = history_data['selected_records']
+        _publish_progress('loading', 10)
+        selected_records = db_manager.get_history_records(history_data.get('record_ids', []))
         
         if not selected_records:
             return jsonify({'success': False, 'message': '沒有選中的記錄'})
         
-        # 使用第一筆記錄的基本資訊
-        first_record = selected_records[0]
-        
-        # 準備Excel報告數據格式
-        excel_data = {
-            'model_no': first_record.get('Model No.', ''),
-            'order_no': order_no,
-            'shipment_size': shipment_size,
-            'lot_no': first_record.get('Lot No.', ''),
-            'inspector': first_record.get('Operator', ''),
-            'location': location,
-            'ois_no': first_record.get('OIS No.', ''),
-            'date': first_record.get('Date', ''),
-            'items': []
-        }
-        
-        # 重建items數據結構，處理所有選中的記錄
-        items_data = []
-        for record_index, record in enumerate(selected_records):
-            datapoints = []
-            for j in range(1, 11):  # 10個數據點
-                key = f'Datapoint_{j}'
-                if key in record and record[key] is not None:
-                    datapoints.append(record[key])
-                else:
-                    datapoints.append(None)
-            
-            # 如果有任何非空數據點，添加這個項目
-            if any(dp is not None for dp in datapoints):
-                items_data.append({
-                    'item': record.get('Item', record_index + 1),
-                    'description': f'Item {record.get("Item", record_index + 1)}',
-                    'min_limit': 0.0,
-                    'max_limit': 100.0,
-                    'unit': '',
-                    'datapoints': datapoints
-                })
-        
-        excel_data['items'] = items_data
+        # 準備Excel報告數據格式（使用第一筆記錄的基本資訊）
+        excel_data = db_manager.build_history_report_data(selected_records, order_no, shipment_size, location)
+        items_data = excel_data['items']
         
-        logger.info(f"Excel data structure: {list(excel_data.keys())}")
-        logger.info(f"Items data type: {type(excel_data['items'])}")
-        logger.info(f"Items count: {len(excel_data['items']) if excel_data['items'] else 0}")
+        logger.debug("History report data prepared", extra=fields(
+            records=len(selected_records), items=len(items_data) if items_data else 0
+        ))
         
         # 計算項目數量
         items_count = len(items_data) if items_data else 0
@@ -495,26 +990,31 @@ def generate_history_report():
             return jsonify({'success': False, 'message': '模板文件不存在'})
         
         # 生成Excel報告
-        excel_file = db_manager.create_report_excel(excel_data, sample_file)
+        _publish_progress('rendering', 40, records=len(selected_records))
+        report_bytes = db_manager.render_report(excel_data, sample_file)
         
-        if excel_file and os.path.exists(excel_file):
-            # 將生成的文件信息保存到session中
+        if report_bytes:
+            # 將生成的文件信息保存到session中（報告內容保存在報告存放區，未啟用時下載時重新生成）
+            _publish_progress('storing', 80)
             session['generated_report'] = {
-                'file_path': excel_file,
-                'filename': os.path.basename(excel_file),
+                'report_id': report_store.put(report_bytes) if report_store else None,
+                'filename': db_manager.report_filename(excel_data),
                 'report_data': excel_data,
                 'items_count': items_count
             }
             flash('報告生成成功', 'success')
+            _publish_progress('done', 100, filename=session['generated_report']['filename'])
             
             # 跳轉到報告生成頁面
             return redirect(url_for('history_report_generated'))
         else:
+            _publish_progress('failed', 100)
             flash('Excel文件生成失敗', 'error')
             return redirect(url_for('history_report'))
             
     except Exception as e:
-        logger.error(f"Error generating history report: {str(e)}")
+        logger.exception("Error generating history report: %s", e)
+        _publish_progress('failed', 100, message=str(e))
         flash(f'報告生成錯誤: {str(e)}', 'error')
         return redirect(url_for('history_report'))
 
@@ -538,37 +1038,96 @@ def download_generated_report():
         return redirect(url_for('history_report'))
     
     report_info = session['generated_report']
-    file_path = report_info['file_path']
     filename = report_info['filename']
     
-    if os.path.exists(file_path):
+    file_path = report_store.get_path(report_info.get('report_id')) if report_store else None
+    if file_path:
+        report = file_path
+    else:
+        # 報告不在存放區（未啟用或已淘汰），從session中的報告數據重新生成
+        report_bytes = db_manager.render_report(
+            report_info['report_data'], os.path.join(BASE_PATH, 'OIR_Report_Sample_v2.xlsx')
+        )
+        report = io.BytesIO(report_bytes) if report_bytes else None
+    
+    if report is not None:
         # 清理session
         session.pop('generated_report', None)
         session.pop('history_report_data', None)
         
-        return send_file(file_path, 
+        return send_file(report, 
                         as_attachment=True, 
                         download_name=filename,
-                        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+                        mimetype=XLSX_MIMETYPE)
     else:
         flash('文件不存在或已過期', 'error')
         return redirect(url_for('history_report'))
 
-@app.route('/download_history_report/<filename>')
-def download_history_report(filename):
-    """下載歷史報告文件"""
-    temp_dir = tempfile.gettempdir()
-    file_path = os.path.join(temp_dir, filename)
+@app.route('/download_history_report/<report_id>')
+def download_history_report(report_id):
+    """從報告存放區下載歷史報告文件"""
+    file_path = report_store.get_path(report_id) if report_store else None
     
-    if os.path.exists(file_path):
+    if file_path:
         return send_file(file_path, 
                         as_attachment=True, 
-                        download_name=filename,
-                        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+                        download_name=request.args.get('filename') or f"OIR_{report_id[:12]}.xlsx",
+                        mimetype=XLSX_MIMETYPE)
     else:
         flash('文件不存在或已過期', 'error')
         return redirect(url_for('history_report'))
 
+@app.route('/batch_report', methods=['POST'])
+def start_batch_report():
+    """
+    開始批次報告生成
+    JSON格式: {"items": [{"ois_no": ..., "lot_no": ...} 或 {"record_ids": [...]}, ...],
+              "order_no": ..., "shipment_size": ..., "location": ...}
+    """
+    request_data = request.get_json(silent=True) or {}
+    items = request_data.get('items')
+    
+    if not items or not isinstance(items, list):
+        return jsonify({'success': False, 'message': '沒有批次項目'}), 400
+    
+    template_file = batch_generator.template_file
+    if not os.path.exists(template_file):
+        return jsonify({'success': False, 'message': '模板文件不存在'}), 500
+    
+    defaults = {key: request_data.get(key, '') for key in ('order_no', 'shipment_size', 'location')}
+    job = batch_generator.start(items, defaults, progress_callback=_job_progress_publisher())
+    
+    return jsonify({
+        'success': True,
+        'job_id': job.job_id,
+        'status_url': url_for('api_batch_report_status', job_id=job.job_id),
+        'download_url': url_for('download_batch_report', job_id=job.job_id)
+    }), 202
+
+@app.route('/api/batch_report/<job_id>')
+def api_batch_report_status(job_id):
+    """API: 獲取批次報告生成進度及錯誤列表"""
+    job = batch_generator.get_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': '批次工作不存在'}), 404
+    
+    status = job.to_dict()
+    status['success'] = True
+    return jsonify(status)
+
+@app.route('/batch_report/<job_id>/download')
+def download_batch_report(job_id):
+    """下載批次生成的報告zip檔案"""
+    job = batch_generator.get_job(job_id)
+    if job is None or not job.zip_file or not os.path.exists(job.zip_file):
+        flash('文件不存在或已過期', 'error')
+        return redirect(url_for('history_report'))
+    
+    return send_file(job.zip_file, 
+                    as_attachment=True, 
+                    download_name=f"OIR_batch_{datetime.now().strftime('%Y%m%d')}.zip",
+                    mimetype='application/zip')
+
 @app.route('/api/ois_items/<ois_no>')
 def api_get_ois_items(ois_no):
     """API: 獲取OIS項目"""
@@ -580,29 +1139,53 @@ def debug_info():
     """調試資訊頁面"""
     return render_template('debug_info.html')
 
+@app.route('/events')
+def event_stream():
+    """
+    伺服器推送事件：目前session的變更(session)、報告生成進度(report_progress)、
+    批次工作進度(job_progress)及完成(job_completed)
+    """
+    return event_stream_response(event_broker, [f'session:{session.sid}', f'report:{session.sid}', 'jobs'])
+
+@app.route('/api/debug/events')
+def api_debug_events():
+    """API: 事件串流統計"""
+    return jsonify(event_broker.get_stats())
+
 @app.route('/api/debug/session')
 def api_debug_session():
     """API: 獲取session資訊"""
     return jsonify(dict(session))
 
+@app.route('/api/debug/janitor')
+def api_debug_janitor():
+    """API: 獲取臨時檔案清理統計"""
+    return jsonify(janitor.get_stats())
+
+@app.route('/debug/metrics')
+def debug_metrics():
+    """效能量測頁面（路由延遲、區段拆分及抽樣的cProfile結果）"""
+    return render_template('debug_metrics.html', metrics=metrics.summary(), enabled=METRICS_ENABLED)
+
+@app.route('/debug/metrics/reset', methods=['POST'])
+def reset_debug_metrics():
+    """清除效能量測統計"""
+    metrics.reset()
+    return redirect(url_for('debug_metrics'))
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus格式的效能量測（每個工作程序分別統計）"""
+    return Response(metrics.prometheus(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/debug/ois_numbers')
 def api_debug_ois_numbers():
     """API: 獲取所有可用的OIS編號"""
     try:
-        from openpyxl import load_workbook
-        wb = load_workbook(db_manager.database_file)
-        ws = wb['OIS']
-        
-        ois_numbers = set()
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            if row and row[0]:  # OIS No. is in first column
-                ois_numbers.add(row[0])
-        
-        wb.close()
-        return jsonify(sorted(list(ois_numbers)))
+        return jsonify(db_manager.get_ois_numbers())
         
     except Exception as e:
-        logger.error(f"Error getting OIS numbers: {e}")
+        logger.error("Error getting OIS numbers: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.errorhandler(404)
@@ -616,6 +1199,9 @@ def internal_error(error):
     return render_template('error.html', error_code=500), 500
 
 if __name__ == '__main__':
+    # 開發伺服器（生產環境請使用 serve.py）
+    create_app()
+    
     # 確保templates資料夾存在
     templates_dir = os.path.join(BASE_PATH, 'templates')
     if not os.path.exists(templates_dir):
@@ -626,4 +1212,6 @@ if __name__ == '__main__':
     if not os.path.exists(static_dir):
         os.makedirs(static_dir)
     
-    app.run(debug=True, host='127.0.0.1', port=5000)
+    # 重新載入器會以子程序重新執行create_app（索引、背景執行緒都建立兩次），因此停用
+    app.run(debug=app.debug, host=os.environ.get('OIR_HOST', '127.0.0.1'),
+            port=int(os.environ.get('OIR_PORT', 5000)), use_reloader=False)
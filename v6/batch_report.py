@@ -0,0 +1,490 @@
+# -*- coding: utf-8 -*-
+"""
+批次報告生成模組
+將多個批號或歷史記錄選擇在程序池中並行生成Excel報告，並打包成一個zip檔案
+
+命令列用法:
+    python batch_report.py --lot DCCDC-IS-11301110:Testing1 --lot 1061539-03:LOT9 -o reports.zip
+    python batch_report.py --input lots.csv --workers 4
+    (CSV欄位: ois_no, lot_no，可選 order_no, shipment_size, location)
+"""
+
+import argparse
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+from database import DatabaseManager
+from logging_setup import setup_logging
+
+logger = logging.getLogger(__name__)
+
+# 工作ID格式（uuid4().hex），從其他工作程序的狀態檔讀取時用於驗證
+_JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+def _render_report(data, template_file, output_file):
+    """
+    工作程序：生成單份報告（必須是模組層級函數才能傳送到程序池）
+
+    Returns:
+        str: 生成的檔案路徑，失敗則返回None
+    """
+    return DatabaseManager.create_report_excel(data, template_file, output_file)
+
+def _safe_filename(text):
+    """移除檔名中不允許的字元"""
+    return re.sub(r'[^\w.\-]+', '_', str(text)).strip('_') or 'UNKNOWN'
+
+class BatchReportJob:
+    """批次生成工作的狀態及進度（進度由背景執行緒更新，同時由請求執行緒讀取）"""
+
+    def __init__(self, requests):
+        """
+        初始化批次工作
+
+        Args:
+            requests (list): 批次請求列表
+        """
+        self.job_id = uuid.uuid4().hex
+        self.requests = list(requests)
+        self.total = len(self.requests)
+        self.done = 0
+        self.generated = 0
+        self.errors = []
+        self.status = 'pending'  # pending / running / completed / failed
+        self.zip_file = None
+        self.created_at = datetime.now()
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def add_error(self, index, message):
+        """記錄單一項目的錯誤"""
+        with self._lock:
+            self.errors.append({
+                'index': index,
+                'request': self.requests[index],
+                'error': message
+            })
+
+    def advance(self, generated=False):
+        """
+        完成一個項目
+
+        Args:
+            generated (bool): 報告是否已生成
+        """
+        with self._lock:
+            self.done += 1
+            if generated:
+                self.generated += 1
+
+    def mark_running(self):
+        """開始執行工作"""
+        with self._lock:
+            self.status = 'running'
+
+    def finish(self, status, zip_file=None):
+        """
+        結束工作（狀態、壓縮檔及完成時間在同一次加鎖中更新，讀取狀態時不會只看到其中一部分）
+
+        Args:
+            status (str): 'completed' 或 'failed'
+            zip_file (str): 壓縮檔路徑
+        """
+        with self._lock:
+            self.errors.sort(key=lambda error: error['index'])
+            self.zip_file = zip_file
+            self.status = status
+            self.finished_at = datetime.now()
+
+    @classmethod
+    def from_status(cls, status):
+        """
+        從狀態檔還原工作（其他工作程序建立的工作，只用於查詢進度及下載）
+
+        Args:
+            status (dict): to_dict的結果加上zip_file
+
+        Returns:
+            BatchReportJob: 工作
+        """
+        job = cls([])
+        job.job_id = status['job_id']
+        job.total = status['total']
+        job.done = status['done']
+        job.generated = status['generated']
+        job.errors = status['errors']
+        job.status = status['status']
+        job.zip_file = status.get('zip_file')
+        job.created_at = datetime.fromisoformat(status['created_at'])
+        job.finished_at = datetime.fromisoformat(status['finished_at']) if status.get('finished_at') else None
+        return job
+
+    def to_dict(self):
+        """
+        獲取可序列化的工作狀態
+
+        Returns:
+            dict: 工作狀態
+        """
+        with self._lock:
+            return {
+                'job_id': self.job_id,
+                'status': self.status,
+                'total': self.total,
+                'done': self.done,
+                'generated': self.generated,
+                'progress': round(self.done / self.total * 100) if self.total else 100,
+                'errors': list(self.errors),
+                'created_at': self.created_at.isoformat(),
+                'finished_at': self.finished_at.isoformat() if self.finished_at else None
+            }
+
+class BatchReportGenerator:
+    """
+    批次報告生成器
+    在主程序中解析每個請求的歷史記錄，再交由程序池並行填寫模板；
+    程序池在第一個工作時建立並由之後的工作共用，以spawn（或forkserver）啟動工作程序，
+    不會fork含有伺服器執行緒及鎖的程序
+    """
+
+    # 已完成的工作保留時間
+    JOB_RETENTION = timedelta(hours=1)
+
+    def __init__(self, db_manager, template_file, max_workers=None, janitor=None):
+        """
+        初始化批次報告生成器
+
+        Args:
+            db_manager (DatabaseManager): 資料庫管理器
+            template_file (str): 報告模板路徑
+            max_workers (int): 工作程序數量，None則使用CPU核心數
+            janitor (Janitor): 臨時檔案清理器，提供時zip檔案在工作保留時間後刪除
+        """
+        self.db_manager = db_manager
+        self.template_file = template_file
+        self.max_workers = max_workers
+        self.janitor = janitor
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        if hasattr(os, 'register_at_fork'):
+            # 程序池屬於建立它的程序，fork出的子程序需要建立自己的程序池
+            os.register_at_fork(after_in_child=self._reset_executor)
+
+    def _reset_executor(self):
+        """fork之後捨棄父程序的程序池"""
+        self._executor = None
+
+    def _get_executor(self):
+        """獲取共用的程序池（第一次使用時建立）"""
+        with self._lock:
+            if self._executor is None:
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+            return self._executor
+
+    def _discard_executor(self, executor):
+        """捨棄已損壞的程序池（工作程序異常結束時），下一個工作重新建立"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def shutdown(self):
+        """關閉程序池（程式結束時）"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def resolve(self, request, defaults=None):
+        """
+        將批次請求轉換為報告數據
+
+        Args:
+            request (dict): 批次請求，以下兩種格式之一
+                - ois_no + lot_no: 該OIS編號及批號的所有歷史記錄
+                - record_ids: 歷史搜尋結果中選擇的記錄ID
+                可選 order_no, shipment_size, location
+            defaults (dict): 請求未提供時使用的額外資訊
+
+        Returns:
+            dict: 報告數據
+
+        Raises:
+            ValueError: 請求格式錯誤或找不到歷史記錄
+        """
+        options = dict(defaults or {})
+        options.update({k: v for k, v in request.items() if v not in (None, '')})
+
+        if request.get('record_ids'):
+            records = self.db_manager.get_history_records(request['record_ids'])
+        elif request.get('ois_no') and request.get('lot_no'):
+            ois_no = str(request['ois_no'])
+            lot_no = str(request['lot_no'])
+            records = [
+                record for record in self.db_manager.search_history_data({'lot_no': lot_no})
+                if str(record.get('OIS No.')) == ois_no and str(record.get('Lot No.')) == lot_no
+            ]
+        else:
+            raise ValueError('Request must contain ois_no and lot_no, or record_ids')
+
+        if not records:
+            raise ValueError('No history records found')
+
+        return self.db_manager.build_history_report_data(
+            records,
+            options.get('order_no', ''),
+            options.get('shipment_size', ''),
+            options.get('location', '')
+        )
+
+    def run(self, job, defaults=None, progress_callback=None):
+        """
+        執行批次工作（阻塞直到所有報告完成）
+
+        Args:
+            job (BatchReportJob): 批次工作
+            defaults (dict): 所有請求共用的額外資訊
+            progress_callback (callable): 每完成一個項目時呼叫 progress_callback(job)
+
+        Returns:
+            BatchReportJob: 完成後的工作
+        """
+        job.mark_running()
+        status, zip_file = 'failed', None
+        work_dir = tempfile.mkdtemp(prefix='oir_batch_')
+
+        def advance(generated=False):
+            job.advance(generated)
+            if progress_callback:
+                progress_callback(job)
+
+        try:
+            # 先在主程序解析所有請求，工作程序只負責生成檔案
+            tasks = []
+            for index, request in enumerate(job.requests):
+                try:
+                    data = self.resolve(request, defaults)
+                except Exception as e:
+                    job.add_error(index, str(e))
+                    advance()
+                    continue
+
+                filename = (f"{index + 1:03d}_OIR_{_safe_filename(data['date'])}_"
+                            f"{_safe_filename(data['model_no'])}_{_safe_filename(data['ois_no'])}_"
+                            f"{_safe_filename(data['lot_no'])}.xlsx")
+                tasks.append((index, data, os.path.join(work_dir, filename)))
+
+            outputs = []
+            if tasks:
+                executor = self._get_executor()
+                try:
+                    futures = {
+                        executor.submit(_render_report, data, self.template_file, output_file): index
+                        for index, data, output_file in tasks
+                    }
+                except BrokenProcessPool:
+                    self._discard_executor(executor)
+                    raise
+                broken = False
+                for future in as_completed(futures):
+                    index = futures[future]
+                    try:
+                        output_file = future.result()
+                        if output_file and os.path.exists(output_file):
+                            outputs.append((index, output_file))
+                            advance(generated=True)
+                            continue
+                        job.add_error(index, 'Excel file generation failed')
+                    except BrokenProcessPool as e:
+                        broken = True
+                        job.add_error(index, str(e) or 'Worker process terminated')
+                    except Exception as e:
+                        job.add_error(index, str(e))
+                    advance()
+                if broken:
+                    self._discard_executor(executor)
+
+            if outputs:
+                zip_file = os.path.join(tempfile.gettempdir(), f"OIR_batch_{job.job_id}.zip")
+                with zipfile.ZipFile(zip_file, 'w', zipfile.ZIP_DEFLATED) as zf:
+                    for _, output_file in sorted(outputs):
+                        zf.write(output_file, os.path.basename(output_file))
+                if self.janitor:
+                    self.janitor.schedule(zip_file, self.JOB_RETENTION.total_seconds(), 'batch')
+                status = 'completed'
+
+        except Exception as e:
+            logger.error("Error running batch report job: %s", e)
+            status, zip_file = 'failed', None
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            job.finish(status, zip_file)
+
+        return job
+
+    def start(self, requests, defaults=None, progress_callback=None):
+        """
+        在背景執行緒中開始批次工作
+
+        Args:
+            requests (list): 批次請求列表
+            defaults (dict): 所有請求共用的額外資訊
+            progress_callback (callable): 進度回呼（每完成一個項目及工作結束時呼叫）
+
+        Returns:
+            BatchReportJob: 新建立的工作
+        """
+        job = BatchReportJob(requests)
+        with self._lock:
+            self._prune_jobs()
+            self._jobs[job.job_id] = job
+        self._save_status(job)
+
+        def publish(job):
+            self._save_status(job)
+            if progress_callback:
+                progress_callback(job)
+
+        def run():
+            self.run(job, defaults, publish)
+            self._save_status(job)
+            if progress_callback:
+                progress_callback(job)
+            if self.janitor:
+                self.janitor.schedule(self._status_file(job.job_id), self.JOB_RETENTION.total_seconds(), 'batch')
+
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+        return job
+
+    def get_job(self, job_id):
+        """
+        獲取批次工作（本程序沒有此工作時讀取其他工作程序保存的狀態檔）
+
+        Returns:
+            BatchReportJob: 批次工作，找不到則返回None
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None or not _JOB_ID_PATTERN.match(job_id):
+            return job
+
+        try:
+            with open(self._status_file(job_id), 'r', encoding='utf-8') as f:
+                return BatchReportJob.from_status(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    @staticmethod
+    def _status_file(job_id):
+        """工作狀態檔路徑（與zip檔案一樣放在系統臨時目錄，所有工作程序共用）"""
+        return os.path.join(tempfile.gettempdir(), f"OIR_batch_{job_id}.json")
+
+    def _save_status(self, job):
+        """保存工作狀態到狀態檔（先寫臨時檔再原子替換）"""
+        status = job.to_dict()
+        # zip_file與finished_at同時設定，與to_dict的內容保持一致
+        status['zip_file'] = job.zip_file if status['finished_at'] else None
+        fd, temp_file = tempfile.mkstemp(dir=tempfile.gettempdir(), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(status, f, ensure_ascii=False, default=str)
+            os.replace(temp_file, self._status_file(job.job_id))
+        except Exception as e:
+            logger.error("Error saving batch job status: %s", e)
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+    def _prune_jobs(self):
+        """移除過期的已完成工作"""
+        cutoff = datetime.now() - self.JOB_RETENTION
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at and job.finished_at < cutoff:
+                del self._jobs[job_id]
+
+def _read_requests(args):
+    """從命令列參數及CSV檔案讀取批次請求"""
+    requests = []
+    for lot in args.lot or []:
+        ois_no, sep, lot_no = lot.partition(':')
+        if not sep:
+            raise SystemExit(f"Invalid --lot value (expected OIS_NO:LOT_NO): {lot}")
+        requests.append({'ois_no': ois_no, 'lot_no': lot_no})
+
+    if args.input:
+        with open(args.input, newline='', encoding='utf-8-sig') as f:
+            for row in csv.DictReader(f):
+                requests.append({k.strip(): (v or '').strip() for k, v in row.items() if k})
+
+    return requests
+
+def main(argv=None):
+    """命令列入口"""
+    parser = argparse.ArgumentParser(description='Generate OIR reports for many lots in one run.')
+    parser.add_argument('--base-path', default=os.path.dirname(os.path.abspath(__file__)),
+                        help='Directory containing OIR_database.xlsx and the report template')
+    parser.add_argument('--backend', default='sqlite', choices=['excel', 'sqlite'], help='Storage backend')
+    parser.add_argument('--lot', action='append', metavar='OIS_NO:LOT_NO', help='Lot to generate (repeatable)')
+    parser.add_argument('--input', help='CSV file with ois_no, lot_no columns')
+    parser.add_argument('--order-no', default='', help='Default order number')
+    parser.add_argument('--shipment-size', default='', help='Default shipment size')
+    parser.add_argument('--location', default='', help='Default location')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes')
+    parser.add_argument('-o', '--output', default=None, help='Output zip file')
+    parser.add_argument('--log-level', default='WARNING', help='Logging level')
+    args = parser.parse_args(argv)
+    setup_logging(level=args.log_level.upper())
+
+    requests = _read_requests(args)
+    if not requests:
+        parser.error('no lots given (use --lot or --input)')
+
+    db_manager = DatabaseManager(args.base_path, backend=args.backend)
+    template_file = os.path.join(args.base_path, 'OIR_Report_Sample_v2.xlsx')
+    generator = BatchReportGenerator(db_manager, template_file, max_workers=args.workers)
+
+    defaults = {
+        'order_no': args.order_no,
+        'shipment_size': args.shipment_size,
+        'location': args.location
+    }
+
+    def report_progress(job):
+        print(f"[{job.done}/{job.total}] generated={job.generated} errors={len(job.errors)}")
+
+    try:
+        job = generator.run(BatchReportJob(requests), defaults, report_progress)
+    finally:
+        generator.shutdown()
+
+    for error in job.errors:
+        print(f"Error in item {error['index'] + 1} {error['request']}: {error['error']}", file=sys.stderr)
+
+    if not job.zip_file:
+        print('No reports were generated', file=sys.stderr)
+        return 1
+
+    output = args.output or os.path.basename(job.zip_file)
+    shutil.move(job.zip_file, output)
+    print(f"Wrote {job.generated} report(s) to {output}")
+    return 0 if not job.errors else 2
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+報告模板快取基準測試
+比較舊的 複製模板 + load_workbook + 填寫 + 保存 流程與模板快取的每份報告延遲
+
+用法:
+    python bench/bench_report_template.py -n 200 --items 5
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openpyxl import load_workbook
+from openpyxl.cell.cell import MergedCell
+
+from report_template import ReportTemplate, report_cells
+
+TEMPLATE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'OIR_Report_Sample_v2.xlsx')
+
+def sample_report(items):
+    """建立測試用的報告數據"""
+    return {
+        'model_no': '1999-11301110',
+        'order_no': 'ORD-0001',
+        'shipment_size': '500',
+        'lot_no': 'LOT-0001',
+        'inspector': 'Aaron',
+        'location': 'GZ',
+        'ois_no': 'DCCDC-IS-11301110',
+        'items': [
+            {'item': i + 1, 'datapoints': [10.0 + i + j * 0.01 for j in range(10)]}
+            for i in range(items)
+        ]
+    }
+
+def legacy_render(data, template_file, output_file):
+    """舊流程：每份報告都複製並重新解析模板"""
+    shutil.copy2(template_file, output_file)
+    wb = load_workbook(output_file)
+    ws = wb['Sheet1'] if 'Sheet1' in wb.sheetnames else wb.active
+    for ref, value in report_cells(data).items():
+        if value is not None and not isinstance(ws[ref], MergedCell):
+            ws[ref] = value
+    wb.save(output_file)
+
+def cached_render(template, data, output_file):
+    """新流程：從記憶體中的模板生成報告"""
+    with open(output_file, 'wb') as f:
+        f.write(template.render(data))
+
+def measure(func, iterations):
+    """
+    執行多次並返回每次的平均延遲（毫秒）
+    """
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1000
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark report generation with and without the template cache.')
+    parser.add_argument('-n', '--iterations', type=int, default=100)
+    parser.add_argument('--items', type=int, default=5)
+    parser.add_argument('--template', default=TEMPLATE_FILE)
+    args = parser.parse_args(argv)
+
+    data = sample_report(args.items)
+    output_file = os.path.join(tempfile.mkdtemp(prefix='oir_bench_'), 'report.xlsx')
+
+    try:
+        build_ms = measure(lambda: ReportTemplate(args.template), 10)
+        template = ReportTemplate(args.template)
+        legacy_ms = measure(lambda: legacy_render(data, args.template, output_file), args.iterations)
+        cached_ms = measure(lambda: cached_render(template, data, output_file), args.iterations)
+    finally:
+        shutil.rmtree(os.path.dirname(output_file), ignore_errors=True)
+
+    print(f"items per report:          {args.items}")
+    print(f"template parse (once):     {build_ms:8.2f} ms")
+    print(f"legacy copy+load+save:     {legacy_ms:8.2f} ms/report")
+    print(f"cached template render:    {cached_ms:8.2f} ms/report")
+    print(f"speedup:                   {legacy_ms / cached_ms:8.1f}x")
+
+if __name__ == '__main__':
+    main()
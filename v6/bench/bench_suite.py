@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+"""
+主要流程基準測試
+以合成的OIR_database.xlsx（bench/synthetic.py）量測 get_ois_data、常見條件組合的search_history_data、
+save_inspection_data、create_report_excel，以及Flask測試客戶端的完整報告流程
+（/new_report/step1 → /data_input/submit → /confirm_data/submit → /generate_report），
+結果寫入JSON檔，可與其他版本的結果比較
+
+每個儲存後端在獨立的程序中執行（create_app每個程序只初始化一次）
+
+用法:
+    python bench/bench_suite.py --days 5 --reports-per-day 1600 -o results.json
+    python bench/bench_suite.py --backend sqlite --compare previous.json
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, APP_DIR)
+
+from synthetic import OPERATORS, create_database, generate_reports, generate_standards
+
+TEMPLATE_FILE = os.path.join(APP_DIR, 'OIR_Report_Sample_v2.xlsx')
+
+# 比較結果時，平均值變慢超過此比例則標記
+REGRESSION_THRESHOLD = 1.2
+
+def summarize(samples, **extra):
+    """
+    將每次的秒數轉換為統計值（毫秒）
+
+    Returns:
+        dict: n、mean_ms、p50_ms、p95_ms、min_ms、max_ms及額外的欄位
+    """
+    ordered = sorted(samples)
+    result = {
+        'n': len(ordered),
+        'mean_ms': statistics.fmean(ordered) * 1000,
+        'p50_ms': ordered[len(ordered) // 2] * 1000,
+        'p95_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        'min_ms': ordered[0] * 1000,
+        'max_ms': ordered[-1] * 1000,
+    }
+    result.update(extra)
+    return result
+
+def timed(func, iterations):
+    """
+    執行多次並記錄每次的秒數
+
+    Returns:
+        tuple: (秒數列表, 最後一次的返回值)
+    """
+    samples = []
+    result = None
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - start)
+    return samples, result
+
+def search_filters(standards, days):
+    """
+    常見的歷史搜尋條件組合（依合成數據的日期及熱門型號）
+
+    Returns:
+        dict: 名稱 -> 搜尋條件
+    """
+    last = date.today() - timedelta(days=1)
+    first = date.today() - timedelta(days=days)
+    week_start = max(first, last - timedelta(days=6))
+    popular = standards[0]
+    return {
+        'date_day': {'date_from': last.isoformat(), 'date_to': last.isoformat()},
+        'date_week': {'date_from': week_start.isoformat(), 'date_to': last.isoformat()},
+        'model_partial': {'model_no': popular['model_code'][-6:]},
+        'lot_partial': {'lot_no': f"L{last.strftime('%Y%m%d')}-00"},
+        'operator_week': {'operator': OPERATORS[0], 'date_from': week_start.isoformat(), 'date_to': last.isoformat()},
+        'model_day': {'model_no': popular['model_code'], 'date_from': last.isoformat(), 'date_to': last.isoformat()},
+        'all': {},
+    }
+
+def report_data(standard, report):
+    """組成create_report_excel使用的報告數據"""
+    return {
+        'model_no': report['model_no'],
+        'order_no': 'ORD-0001',
+        'shipment_size': '500',
+        'lot_no': report['lot_no'],
+        'inspector': report['operator'],
+        'location': 'GZ',
+        'ois_no': report['ois_no'],
+        'date': report['date'],
+        'items': [
+            dict(item_data, description=item['description'], min_limit=item['min'],
+                 max_limit=item['max'], unit=item['unit'])
+            for item, item_data in zip(standard['items'], report['items'])
+        ],
+    }
+
+def bench_database(base_path, backend, standards, args):
+    """
+    量測DatabaseManager的主要方法
+
+    Returns:
+        dict: 名稱 -> 統計值
+    """
+    from database import DatabaseManager
+
+    results = {}
+    start = time.perf_counter()
+    DatabaseManager(base_path, backend=backend)
+    results['startup_cold'] = summarize([time.perf_counter() - start])
+
+    start = time.perf_counter()
+    db = DatabaseManager(base_path, backend=backend)
+    results['startup_warm'] = summarize([time.perf_counter() - start], history_records=len(db.history_index))
+
+    rng = random.Random(args.seed)
+    ois_numbers = [standard['ois_no'] for standard in standards]
+    samples, _ = timed(lambda: db.get_ois_data(rng.choice(ois_numbers)), args.lookups)
+    results['get_ois_data'] = summarize(samples)
+
+    for name, filters in search_filters(standards, args.days).items():
+        iterations = max(1, args.searches // 10) if not filters else args.searches
+        samples, rows = timed(lambda: db.search_history_data(filters), iterations)
+        results[f'search_history_data[{name}]'] = summarize(samples, rows=len(rows))
+
+    by_ois = {standard['ois_no']: standard for standard in standards}
+    new_reports = list(generate_reports(standards, days=1, reports_per_day=max(args.saves, args.reports),
+                                        start=date.today(), seed=args.seed + 7))
+
+    saves = iter(new_reports[:args.saves])
+    samples, _ = timed(lambda: db.save_inspection_data(next(saves)), args.saves)
+    results['save_inspection_data'] = summarize(samples)
+
+    template_file = os.path.join(base_path, 'OIR_Report_Sample_v2.xlsx')
+    output_file = os.path.join(base_path, 'bench_report.xlsx')
+    reports = iter([report_data(by_ois[report['ois_no']], report) for report in new_reports[:args.reports]])
+    samples, _ = timed(lambda: db.create_report_excel(next(reports), template_file, output_file), args.reports)
+    results['create_report_excel'] = summarize(samples)
+    return results
+
+def bench_flask(base_path, backend, standards, args):
+    """
+    以Flask測試客戶端量測完整的新增報告流程
+
+    Returns:
+        dict: 每個步驟及整個流程的統計值，以及generate_report的區段拆分
+    """
+    import app as appmod
+    from metrics import metrics
+
+    # 提交數據的路由會逐項記錄INFO日誌
+    logging.getLogger(appmod.__name__).setLevel(logging.WARNING)
+    app = appmod.create_app({'BASE_PATH': base_path, 'STORAGE_BACKEND': backend, 'TESTING': True})
+    metrics.reset()
+
+    rng = random.Random(args.seed + 13)
+    weights = [1.0 / (rank + 1) for rank in range(len(standards))]
+    steps = {'step1': [], 'data_input_submit': [], 'confirm_data_submit': [], 'generate_report': [], 'flow': []}
+
+    def step(name, func):
+        start = time.perf_counter()
+        response = func()
+        steps[name].append(time.perf_counter() - start)
+        return response
+
+    for flow in range(args.flows):
+        client = app.test_client()
+        standard = rng.choices(standards, weights=weights)[0]
+        flow_start = time.perf_counter()
+
+        response = step('step1', lambda: client.post('/new_report/step1', data={
+            'model_no': standard['model_code'], 'ois_no': standard['ois_no'], 'inspector': rng.choice(OPERATORS[:3]),
+        }))
+        if response.status_code != 302 or not response.headers['Location'].endswith('/data_input'):
+            raise RuntimeError(f"step1 failed for {standard['ois_no']}: {response.status_code}")
+
+        for item in standard['items']:
+            values = [round(rng.gauss(item['median'], (item['max'] - item['min']) / 8), 3) for _ in range(10)]
+            response = step('data_input_submit', lambda: client.post('/data_input/submit', data={
+                f'datapoint_{i}': str(value) for i, value in enumerate(values, 1)
+            }))
+            if not response.get_json().get('success'):
+                raise RuntimeError(f"data_input/submit failed: {response.get_json()}")
+
+        response = step('confirm_data_submit', lambda: client.post('/confirm_data/submit', data={
+            'order_no': f'ORD-{flow:04d}', 'shipment_size': '500', 'lot_no': f'BENCH-{flow:04d}', 'location': 'GZ',
+        }))
+        if not response.get_json().get('success'):
+            raise RuntimeError(f"confirm_data/submit failed: {response.get_json()}")
+
+        response = step('generate_report', lambda: client.get('/generate_report'))
+        if response.status_code != 200 or response.mimetype != appmod.XLSX_MIMETYPE:
+            raise RuntimeError(f"generate_report failed: {response.status_code}")
+        steps['flow'].append(time.perf_counter() - flow_start)
+
+    results = {f'flask[{name}]': summarize(samples) for name, samples in steps.items()}
+    results['flask[generate_report_spans]'] = {
+        row['span']: row['per_request'] * 1000
+        for row in metrics.summary()['spans'] if row['route'] == 'generate_report'
+    }
+    return results
+
+def run_backend(backend, base_path, database_file, standards, args):
+    """
+    在獨立的工作目錄中量測一個儲存後端（於子程序中執行）
+    工作目錄由主程序在子程序結束後刪除（子程序結束時仍會保存索引快照）
+
+    Returns:
+        dict: 名稱 -> 統計值
+    """
+    os.makedirs(base_path)
+    shutil.copy2(database_file, os.path.join(base_path, 'OIR_database.xlsx'))
+    shutil.copy2(TEMPLATE_FILE, os.path.join(base_path, 'OIR_Report_Sample_v2.xlsx'))
+    results = bench_database(base_path, backend, standards, args)
+    if args.flows:
+        results.update(bench_flask(base_path, backend, standards, args))
+    return results
+
+def git_revision():
+    """目前的git版本（無法取得則返回None）"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_results(results):
+    """列印每個後端的結果"""
+    for backend, entries in results.items():
+        print(f"\n[{backend}]")
+        print(f"  {'benchmark':<42} {'n':>5} {'mean ms':>10} {'p50 ms':>10} {'p95 ms':>10}")
+        for name, stats in entries.items():
+            if 'mean_ms' not in stats:
+                print(f"  {name:<42} " + ', '.join(f'{span} {ms:.1f}' for span, ms in stats.items()))
+                continue
+            print(f"  {name:<42} {stats['n']:>5} {stats['mean_ms']:>10.2f} {stats['p50_ms']:>10.2f} {stats['p95_ms']:>10.2f}")
+
+def compare(previous, results):
+    """
+    與先前的結果比較平均值
+
+    Returns:
+        int: 變慢超過REGRESSION_THRESHOLD的項目數
+    """
+    regressions = 0
+    print(f"\nComparison with {previous['meta'].get('revision') or 'previous run'}:")
+    for backend, entries in results.items():
+        old_entries = previous['results'].get(backend, {})
+        for name, stats in entries.items():
+            old = old_entries.get(name)
+            if not old or 'mean_ms' not in stats or 'mean_ms' not in old or not old['mean_ms']:
+                continue
+            ratio = stats['mean_ms'] / old['mean_ms']
+            flag = '  SLOWER' if ratio > REGRESSION_THRESHOLD else ''
+            regressions += bool(flag)
+            print(f"  {backend:<7} {name:<42} {old['mean_ms']:>10.2f} -> {stats['mean_ms']:>10.2f} ms ({ratio:5.2f}x){flag}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the main OIR paths against synthetic data.')
+    parser.add_argument('--backend', nargs='+', default=['excel', 'sqlite'], choices=['excel', 'sqlite'])
+    parser.add_argument('--ois', type=int, default=300, help='number of OIS numbers')
+    parser.add_argument('--days', type=int, default=5)
+    parser.add_argument('--reports-per-day', type=int, default=1600)
+    parser.add_argument('--lookups', type=int, default=1000, help='get_ois_data calls')
+    parser.add_argument('--searches', type=int, default=50, help='calls per search filter mix')
+    parser.add_argument('--saves', type=int, default=10, help='save_inspection_data calls')
+    parser.add_argument('--reports', type=int, default=50, help='create_report_excel calls')
+    parser.add_argument('--flows', type=int, default=20, help='end-to-end Flask flows (0 to skip)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', default='bench_results.json')
+    parser.add_argument('--compare', help='previous results JSON to compare against')
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp(prefix='oir_bench_')
+    try:
+        database_file = os.path.join(directory, 'OIR_database.xlsx')
+        standards = generate_standards(args.ois, seed=args.seed)
+        start = time.perf_counter()
+        rows = create_database(database_file, standards,
+                               generate_reports(standards, args.days, args.reports_per_day, seed=args.seed))
+        print(f"Generated {len(standards)} OIS numbers and {rows} history rows in {time.perf_counter() - start:.1f} s")
+
+        results = {}
+        for backend in args.backend:
+            print(f"Running {backend} backend...")
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+                results[backend] = pool.submit(
+                    run_backend, backend, os.path.join(directory, backend), database_file, standards, args
+                ).result()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    output = {
+        'meta': {
+            'revision': git_revision(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'history_rows': rows,
+            'params': vars(args),
+        },
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(output, f, indent=2)
+
+    print_results(results)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            return 1 if compare(json.load(f), results) else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+工作表讀取基準測試
+以不同行數的database工作表比較 openpyxl完整載入、openpyxl唯讀模式 及 xlsx_reader 的解析時間及記憶體峰值
+
+用法:
+    python bench/bench_xlsx_reader.py --rows 10000 50000 200000
+"""
+
+import argparse
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openpyxl import Workbook, load_workbook
+
+from storage import HISTORY_HEADERS, OIS_HEADERS
+from xlsx_reader import iter_sheet_rows
+
+def create_database(path, rows):
+    """建立測試用的資料庫檔案（以write_only模式生成，避免生成本身佔用大量記憶體）"""
+    wb = Workbook(write_only=True)
+    ws_ois = wb.create_sheet('OIS')
+    ws_ois.append(OIS_HEADERS)
+    for item in range(1, 21):
+        ws_ois.append(['OIS-0001', 'MODEL-0001', 'Model', 'A', item, '', f'dimension_{item}',
+                       1.0, 2.0, 1.5, 'mm', 10, 'A', 'Caliper'])
+
+    ws = wb.create_sheet('database')
+    ws.append(HISTORY_HEADERS)
+    for row in range(rows):
+        day = row // 400
+        ws.append(
+            [f'2025-{day // 28 % 12 + 1:02d}-{day % 28 + 1:02d}', f'MODEL-{row % 7:04d}', 'Model',
+             'OIS-0001', f'LOT-{row // 20:05d}', row % 20 + 1]
+            + [1.5 + ((row * 7 + j) % 13 - 6) * 0.01 for j in range(10)]
+            + [f'Operator{row % 5}']
+        )
+    wb.save(path)
+
+def read_full(path):
+    """openpyxl完整載入（search_history_data原本的做法）"""
+    wb = load_workbook(path)
+    rows = [row for row in wb['database'].iter_rows(min_row=2, values_only=True) if row and row[0]]
+    wb.close()
+    return len(rows)
+
+def read_openpyxl_read_only(path):
+    """openpyxl唯讀模式"""
+    wb = load_workbook(path, read_only=True)
+    try:
+        rows = [row for row in wb['database'].iter_rows(min_row=2, values_only=True) if row and row[0]]
+    finally:
+        wb.close()
+    return len(rows)
+
+def read_xlsx_reader(path):
+    """xlsx_reader（只讀取HISTORY_HEADERS的欄位）"""
+    rows = [row for _, row in iter_sheet_rows(path, 'database', columns=len(HISTORY_HEADERS), min_row=2)
+            if row and row[0]]
+    return len(rows)
+
+def measure(func, path):
+    """
+    返回 (秒數, Python記憶體峰值MB, 行數)
+    時間及記憶體分兩次執行（tracemalloc會大幅拖慢解析）；mmap映射的檔案頁面不計入tracemalloc
+    """
+    gc.collect()
+    start = time.perf_counter()
+    count = func(path)
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    tracemalloc.start()
+    func(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024, count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark worksheet parsing with openpyxl and xlsx_reader.')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 50000, 200000])
+    parser.add_argument('--full-max', type=int, default=50000,
+                        help='skip the full openpyxl load above this many rows')
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp(prefix='oir_bench_')
+    readers = [
+        ('openpyxl full load', read_full),
+        ('openpyxl read_only', read_openpyxl_read_only),
+        ('xlsx_reader', read_xlsx_reader),
+    ]
+
+    try:
+        print(f"{'rows':>8}  {'reader':<20} {'time (s)':>9} {'peak (MB)':>10}")
+        for rows in args.rows:
+            path = os.path.join(directory, f'database_{rows}.xlsx')
+            create_database(path, rows)
+            for name, func in readers:
+                if func is read_full and rows > args.full_max:
+                    print(f"{rows:>8}  {name:<20} {'skipped':>9}")
+                    continue
+                elapsed, peak, count = measure(func, path)
+                assert count == rows, (name, count)
+                print(f"{rows:>8}  {name:<20} {elapsed:9.2f} {peak:10.1f}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+合成測試數據生成器
+以接近實際規模的OIS標準（數百個OIS編號）及每日報告量生成OIR_database.xlsx，
+供基準測試使用；相同的seed生成相同的內容
+
+用法:
+    python bench/synthetic.py -o /tmp/OIR_database.xlsx --ois 300 --days 5 --reports-per-day 1600
+"""
+
+import argparse
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openpyxl import Workbook
+
+from storage import HISTORY_HEADERS, OIS_HEADERS
+
+OPERATORS = ['Aaron', 'Alan', 'Brain', 'Cathy', 'David', 'Eva', 'Frank', 'Grace', 'Henry', 'Ivy', 'Jack', 'Kelly']
+DESCRIPTIONS = ['Overall length', 'Shaft diameter', 'Flange thickness', 'Hole position', 'Slot width',
+                'Concentricity', 'Flatness', 'Resistance', 'No-load speed', 'Terminal height']
+EQUIPMENT = ['Caliper', 'Micrometer', 'Height gauge', 'CMM', 'Multimeter', 'Tachometer']
+
+def generate_standards(ois_count=300, min_items=3, max_items=8, seed=0):
+    """
+    生成OIS標準
+
+    Args:
+        ois_count (int): OIS編號數量
+        min_items (int): 每個OIS的最少項目數
+        max_items (int): 每個OIS的最多項目數
+        seed (int): 隨機種子
+
+    Returns:
+        list: [{'ois_no', 'model_code', 'model_desc', 'items': [{'item', 'description', 'min', 'max', 'median', 'unit'}]}]
+    """
+    rng = random.Random(seed)
+    standards = []
+    for n in range(ois_count):
+        items = []
+        for item in range(1, rng.randint(min_items, max_items) + 1):
+            median = round(rng.uniform(1.0, 80.0), 3)
+            tolerance = round(median * rng.uniform(0.005, 0.03), 3)
+            items.append({
+                'item': item,
+                'description': rng.choice(DESCRIPTIONS),
+                'min': round(median - tolerance, 3),
+                'max': round(median + tolerance, 3),
+                'median': median,
+                'unit': 'mm',
+            })
+        standards.append({
+            'ois_no': f'DCCDC-IS-{11300000 + n:08d}',
+            'model_code': f'1999-{11300000 + n:08d}',
+            'model_desc': f'DC motor type {n % 40:02d}',
+            'items': items,
+        })
+    return standards
+
+def generate_datapoints(rng, item, out_of_spec=0.01):
+    """
+    生成一個項目的10個數據點（常態分布，少數超出規格）
+
+    Args:
+        rng (random.Random): 隨機數生成器
+        item (dict): OIS項目（generate_standards的格式）
+        out_of_spec (float): 數據點超出規格的比例
+
+    Returns:
+        list: 10個數據點
+    """
+    sigma = (item['max'] - item['min']) / 8
+    values = []
+    for _ in range(10):
+        value = rng.gauss(item['median'], sigma)
+        if rng.random() < out_of_spec:
+            value = item['max'] + sigma * rng.uniform(0.1, 2.0)
+        values.append(round(value, 3))
+    return values
+
+def generate_reports(standards, days=5, reports_per_day=1600, start=None, seed=0):
+    """
+    依日期順序生成檢驗報告（熱門型號的報告較多）
+
+    Args:
+        standards (list): generate_standards的結果
+        days (int): 天數
+        reports_per_day (int): 每日報告數
+        start (date): 第一天，預設為今天往前days天
+        seed (int): 隨機種子
+
+    Yields:
+        dict: 檢驗數據（save_inspection_data的格式）
+    """
+    rng = random.Random(seed + 1)
+    start = start or date.today() - timedelta(days=days)
+    weights = [1.0 / (rank + 1) for rank in range(len(standards))]
+    for day in range(days):
+        report_date = (start + timedelta(days=day)).strftime('%Y-%m-%d')
+        chosen = rng.choices(standards, weights=weights, k=reports_per_day)
+        for number, standard in enumerate(chosen):
+            yield {
+                'date': report_date,
+                'model_no': standard['model_code'],
+                'model_desc': standard['model_desc'],
+                'ois_no': standard['ois_no'],
+                'lot_no': f'L{report_date.replace("-", "")}-{number:04d}',
+                'operator': rng.choice(OPERATORS),
+                'items': [
+                    {'item': item['item'], 'datapoints': generate_datapoints(rng, item)}
+                    for item in standard['items']
+                ],
+            }
+
+def create_database(path, standards, reports):
+    """
+    寫入OIR_database.xlsx（write_only模式，生成大型檔案時記憶體用量固定）
+
+    Args:
+        path (str): 輸出路徑
+        standards (list): generate_standards的結果
+        reports (iterable): generate_reports的結果
+
+    Returns:
+        int: database工作表的數據行數
+    """
+    wb = Workbook(write_only=True)
+    ws_ois = wb.create_sheet('OIS')
+    ws_ois.append(OIS_HEADERS)
+    for standard in standards:
+        for item in standard['items']:
+            ws_ois.append([
+                standard['ois_no'], standard['model_code'], standard['model_desc'], 'A',
+                item['item'], '', item['description'], item['min'], item['max'], item['median'],
+                item['unit'], 10, 'Variable', EQUIPMENT[item['item'] % len(EQUIPMENT)],
+            ])
+
+    ws = wb.create_sheet('database')
+    ws.append(HISTORY_HEADERS)
+    rows = 0
+    for report in reports:
+        for item_data in report['items']:
+            ws.append(
+                [report['date'], report['model_no'], report['model_desc'], report['ois_no'],
+                 report['lot_no'], item_data['item']]
+                + item_data['datapoints']
+                + [report['operator']]
+            )
+            rows += 1
+    wb.save(path)
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a synthetic OIR_database.xlsx.')
+    parser.add_argument('-o', '--output', default='OIR_database.xlsx')
+    parser.add_argument('--ois', type=int, default=300, help='number of OIS numbers')
+    parser.add_argument('--days', type=int, default=5)
+    parser.add_argument('--reports-per-day', type=int, default=1600)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    standards = generate_standards(args.ois, seed=args.seed)
+    rows = create_database(args.output, standards,
+                           generate_reports(standards, args.days, args.reports_per_day, seed=args.seed))
+    print(f"{args.output}: {len(standards)} OIS numbers, {rows} history rows")
+
+if __name__ == '__main__':
+    main()
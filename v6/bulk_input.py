@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+批量數據輸入模組
+一次提交整份報告（或任意部分項目）的數據點：JSON項目列表，或從量測設備匯出的CSV／剪貼簿貼上的表格。
+所有項目先一次驗證（數字格式、數量）並以inspection_stats向量化計算規格判定，
+全部有效才寫入report_data，由呼叫者只保存一次session及臨時備份
+
+表格格式（每行一個項目，分隔符號為Tab、逗號、分號或空白）:
+    1, 10.01, 10.02, 10.00          第一欄為項目編號（有標題列 "Item" 或一行超過10個值時）
+    10.01  10.02  10.00             沒有項目編號時依序填入目前項目之後的項目
+"""
+
+import csv
+import io
+
+from inspection_stats import DATAPOINT_COUNT, item_statistics
+
+# 與data_input.html的前端驗證相同的數值範圍
+VALUE_LIMIT = 999999
+
+# 標題列第一欄為這些值時，第一欄為項目編號
+_ITEM_HEADERS = {'item', 'item no', 'item no.', 'no', 'no.', '#', '項目', '项目'}
+
+# 返回的統計欄位
+_STATISTIC_KEYS = ('count', 'mean', 'min', 'max', 'out_of_spec', 'cpk', 'judged', 'accept')
+
+def parse_datapoint(value):
+    """
+    轉換單一數據點（表單欄位或表格儲存格）
+
+    Args:
+        value: 輸入值
+
+    Returns:
+        float: 數字；空值返回None；不是數字則返回去除空白的原始字串
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return str(value)
+    if isinstance(value, (int, float)):
+        return float(value)
+    value = str(value).strip()
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+def make_item_data(ois_item, index, datapoints):
+    """
+    建立items_data中一個項目的數據（所有值都是可序列化的基本類型）
+
+    Args:
+        ois_item (dict): report_data['ois_items']中的OIS項目
+        index (int): 項目在ois_items中的位置
+        datapoints (list): 10個數據點
+
+    Returns:
+        dict: item, description, min_limit, max_limit, unit, datapoints
+    """
+    return {
+        'item': int(ois_item['Item']) if ois_item['Item'] is not None else index + 1,
+        'description': str(ois_item['Description']) if ois_item['Description'] is not None else '',
+        'min_limit': float(ois_item['Minimum Limit']) if ois_item['Minimum Limit'] is not None else 0.0,
+        'max_limit': float(ois_item['Maximum Limit']) if ois_item['Maximum Limit'] is not None else 0.0,
+        'unit': str(ois_item['Unit']) if ois_item['Unit'] is not None else '',
+        'datapoints': datapoints
+    }
+
+def _item_key(value):
+    """項目編號的比較鍵（1、'1'、1.0及'001'視為相同）"""
+    if value is None:
+        return None
+    text = str(value).strip()
+    try:
+        number = float(text)
+    except ValueError:
+        return text
+    return str(int(number)) if number.is_integer() else text
+
+def _is_number(text):
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
+
+def parse_table(text):
+    """
+    解析CSV或剪貼簿貼上的表格
+
+    Args:
+        text (str): 表格文字
+
+    Returns:
+        list: [{'line': 行號, 'item': 項目編號或None, 'datapoints': [字串]}]
+    """
+    lines = [(number, line) for number, line in enumerate(text.splitlines(), 1) if line.strip()]
+    if not lines:
+        return []
+
+    sample = lines[0][1] if len(lines) == 1 else lines[1][1]
+    delimiter = next((d for d in ('\t', ';', ',') if d in sample), None)
+    # 分號分隔的歐式匯出以逗號為小數點
+    decimal_comma = delimiter == ';'
+
+    entries = []
+    item_column = False
+    for position, (number, line) in enumerate(lines):
+        if delimiter:
+            cells = next(csv.reader(io.StringIO(line), delimiter=delimiter))
+        else:
+            cells = line.split()
+        cells = [cell.strip() for cell in cells]
+        if decimal_comma:
+            cells = [cell.replace(',', '.') for cell in cells]
+        # 去除行尾的空儲存格（試算表複製時常見）
+        while cells and not cells[-1]:
+            cells.pop()
+
+        if position == 0 and not any(_is_number(cell) for cell in cells):
+            item_column = bool(cells) and cells[0].lower() in _ITEM_HEADERS
+            continue
+
+        if item_column or len(cells) > DATAPOINT_COUNT:
+            entries.append({'line': number, 'item': cells[0] if cells else None, 'datapoints': cells[1:]})
+        else:
+            entries.append({'line': number, 'item': None, 'datapoints': cells})
+    return entries
+
+def apply_bulk_items(report_data, entries, start_item=None):
+    """
+    驗證並套用批量數據
+    有項目編號的項目依編號寫入，沒有編號的項目從start_item（預設為目前項目）或上一個項目之後依序寫入。
+    任何項目無效時不修改report_data
+
+    Args:
+        report_data (dict): session['report_data']
+        entries (list): [{'item': 項目編號或None, 'datapoints': [...], 'line': 行號(可選)}]
+        start_item: 沒有項目編號時的第一個項目（OIS項目編號）
+
+    Returns:
+        dict:
+            - errors: [{'line', 'item', 'message'}]，有錯誤時沒有寫入任何項目
+            - updated: 已寫入的項目位置
+            - items: 已寫入項目的規格判定 [{'item', 'count', 'mean', 'min', 'max', 'out_of_spec', 'cpk', 'judged', 'accept'}]
+            - current_item: 第一個尚未輸入的項目位置（全部完成時等於項目數）
+    """
+    ois_items = report_data['ois_items']
+    positions = {_item_key(ois_item.get('Item')): index for index, ois_item in enumerate(ois_items)}
+    updates = {}
+    errors = []
+
+    if start_item is None or str(start_item).strip() == '':
+        position = report_data.get('current_item', 0)
+    else:
+        position = positions.get(_item_key(start_item))
+        if position is None:
+            errors.append({'line': None, 'item': start_item,
+                           'message': f'Item {start_item} is not in OIS {report_data.get("ois_no")}'})
+            entries = []
+
+    def error(entry, message):
+        errors.append({'line': entry.get('line'), 'item': entry.get('item'), 'message': message})
+
+    for entry in entries:
+        if not isinstance(entry, dict):
+            errors.append({'line': None, 'item': None, 'message': 'Each item must be an object with datapoints'})
+            continue
+
+        item = entry.get('item')
+        if item is not None and str(item).strip() != '':
+            index = positions.get(_item_key(item))
+            if index is None:
+                error(entry, f'Item {item} is not in OIS {report_data.get("ois_no")}')
+                continue
+        else:
+            index = position
+            if index >= len(ois_items):
+                error(entry, f'More rows than OIS items ({len(ois_items)})')
+                continue
+        position = index + 1
+
+        raw = entry.get('datapoints')
+        if not isinstance(raw, (list, tuple)):
+            error(entry, 'datapoints must be a list')
+            continue
+        if len(raw) > DATAPOINT_COUNT:
+            error(entry, f'At most {DATAPOINT_COUNT} datapoints per item ({len(raw)} given)')
+            continue
+
+        datapoints = [parse_datapoint(value) for value in raw]
+        datapoints += [None] * (DATAPOINT_COUNT - len(datapoints))
+        invalid = [value for value in datapoints if isinstance(value, str)]
+        if invalid:
+            error(entry, f'Invalid number: {invalid[0]}')
+            continue
+        if any(value is not None and (value != value or abs(value) > VALUE_LIMIT) for value in datapoints):
+            error(entry, f'Number out of range (-{VALUE_LIMIT} to {VALUE_LIMIT})')
+            continue
+        if all(value is None for value in datapoints):
+            error(entry, 'At least one datapoint is required')
+            continue
+        if index in updates:
+            error(entry, f'Item {ois_items[index].get("Item")} appears more than once')
+            continue
+
+        updates[index] = make_item_data(ois_items[index], index, datapoints)
+
+    if errors or not updates:
+        if not errors:
+            errors.append({'line': None, 'item': None, 'message': 'No datapoints given'})
+        return {'errors': errors, 'updated': [], 'items': [], 'current_item': report_data.get('current_item', 0)}
+
+    for index, item_data in updates.items():
+        report_data['items_data'][str(index)] = item_data
+    report_data['current_item'] = next(
+        (index for index in range(len(ois_items)) if str(index) not in report_data['items_data']),
+        len(ois_items)
+    )
+
+    updated = sorted(updates)
+    statistics = item_statistics([updates[index] for index in updated])
+    return {
+        'errors': [],
+        'updated': updated,
+        'items': [
+            dict({'item': updates[index]['item']}, **{key: stats[key] for key in _STATISTIC_KEYS})
+            for index, stats in zip(updated, statistics)
+        ],
+        'current_item': report_data['current_item'],
+    }
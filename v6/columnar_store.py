@@ -0,0 +1,423 @@
+# -*- coding: utf-8 -*-
+"""
+欄式數據點存放模組
+歷史記錄以欄位方式保存為可記憶體映射(mmap)的NumPy檔案：
+數據點為float64陣列、型號/批號/操作員/OIS編號/項目以字典編碼為int32代碼、日期為int32日數，
+趨勢分析只需切片及歸約運算，不需解析工作簿
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+from datetime import date, datetime
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from file_lock import FileLock
+
+logger = logging.getLogger(__name__)
+
+# 每個項目的數據點數量
+DATAPOINT_COUNT = 10
+
+# 字典編碼的欄位 -> 歷史記錄中的鍵
+CODED_COLUMNS = {
+    'model': 'Model No.',
+    'ois': 'OIS No.',
+    'lot': 'Lot No.',
+    'operator': 'Operator',
+    'item': 'Item',
+}
+
+# 陣列檔案：名稱 -> (dtype, 每行的形狀)
+ARRAY_COLUMNS = {
+    'values': ('float64', (DATAPOINT_COUNT,)),
+    'day': ('int32', ()),
+    'record_id': ('int64', ()),
+    'model': ('int32', ()),
+    'ois': ('int32', ()),
+    'lot': ('int32', ()),
+    'operator': ('int32', ()),
+    'item': ('int32', ()),
+}
+
+# 日期無法解析時的日數
+NO_DAY = -1
+
+_EPOCH = date(1970, 1, 1).toordinal()
+
+def to_day(value):
+    """
+    將日期轉換為1970-01-01起算的日數
+
+    Returns:
+        int: 日數，無法解析則返回NO_DAY
+    """
+    if isinstance(value, datetime):
+        return value.date().toordinal() - _EPOCH
+    if isinstance(value, date):
+        return value.toordinal() - _EPOCH
+    try:
+        return datetime.strptime(str(value)[:10], '%Y-%m-%d').toordinal() - _EPOCH
+    except (TypeError, ValueError):
+        return NO_DAY
+
+def from_day(day):
+    """將日數轉換為YYYY-MM-DD字串"""
+    return date.fromordinal(int(day) + _EPOCH).strftime('%Y-%m-%d')
+
+def _to_float(value):
+    """將數據點轉換為浮點數，空值或非數字為NaN"""
+    if value is None or value == '' or isinstance(value, bool):
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+class ColumnarStore:
+    """
+    欄式數據點存放區
+    每個欄位保存為一個.npy檔案，預留容量以便附加時不需重寫整個檔案；
+    容量不足時寫入加倍容量的新一代(generation)檔案，而不是替換仍被mmap開啟的檔案（Windows不允許）。
+    meta.json記錄資料來源、目前的檔案世代、有效行數、字典及最後的記錄ID，
+    寫入數據後才原子替換meta.json，因此中途當機只會遺失未完成的附加。
+    多個工作程序共用同一目錄時，附加在鎖檔內進行，其他程序在meta.json被替換後重新載入
+    """
+
+    def __init__(self, directory, source=None, initial_capacity=4096):
+        """
+        初始化欄式存放區（已存在則以mmap方式開啟）
+
+        Args:
+            directory (str): 存放目錄
+            source (str): 資料來源（儲存後端名稱）；記錄ID只在同一來源內遞增，來源不同時重新建立
+            initial_capacity (int): 新建時預留的行數
+        """
+        self.directory = directory
+        self.source = source
+        self.initial_capacity = initial_capacity
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+
+        self.count = 0
+        self.last_id = None
+        self.generation = 0
+        self.dictionaries = {name: [] for name in CODED_COLUMNS}
+        self._codes = {name: {} for name in CODED_COLUMNS}
+        self._arrays = {}
+        self._meta_version = None  # 已載入的meta.json版本（inode及修改時間）
+        self._file_lock = FileLock(os.path.join(directory, 'store.lock'))
+        with self._file_lock:
+            self._load()
+
+    def _meta_file(self):
+        return os.path.join(self.directory, 'meta.json')
+
+    def _array_file(self, name, generation):
+        return os.path.join(self.directory, f"{name}.{generation}.npy")
+
+    def _disk_version(self):
+        """meta.json目前的版本，檔案不存在則返回None"""
+        try:
+            stat = os.stat(self._meta_file())
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _read(self):
+        """
+        讀取meta.json並以mmap開啟所有欄位檔案
+
+        Returns:
+            tuple: (meta, 欄位陣列字典, meta.json版本)
+        """
+        version = self._disk_version()
+        with open(self._meta_file(), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        arrays = {name: np.load(self._array_file(name, meta['generation']), mmap_mode='r+')
+                  for name in ARRAY_COLUMNS}
+        if any(len(array) < meta['count'] for array in arrays.values()):
+            raise ValueError('column files shorter than recorded count')
+        return meta, arrays, version
+
+    def _load(self):
+        """載入存放區，檔案不完整時重新建立（呼叫者持有鎖檔）"""
+        try:
+            meta, arrays, version = self._read()
+        except (OSError, ValueError, KeyError) as e:
+            if os.path.exists(self._meta_file()):
+                logger.error("Error loading columnar store, rebuilding: %s", e)
+            self._create(self.initial_capacity)
+        else:
+            if meta.get('source') == self.source:
+                self._apply(meta, arrays, version)
+            else:
+                # 另一個儲存後端的記錄ID不能用於略過重複的記錄
+                logger.info("Columnar store was built from %s, rebuilding for %s", meta.get('source'), self.source)
+                del arrays
+                self._create(self.initial_capacity, meta['generation'] + 1)
+        self._remove_stale_files()
+
+    def _refresh(self):
+        """其他程序替換meta.json後重新載入（讀取失敗時保留目前的內容）"""
+        if self._disk_version() == self._meta_version:
+            return
+        try:
+            meta, arrays, version = self._read()
+        except (OSError, ValueError, KeyError) as e:
+            logger.error("Error reloading columnar store: %s", e)
+            return
+        self._apply(meta, arrays, version)
+
+    def _apply(self, meta, arrays, version):
+        """使用已讀取的meta.json及欄位陣列"""
+        self.count = meta['count']
+        self.last_id = meta.get('last_id')
+        self.generation = meta['generation']
+        self.dictionaries = {name: list(meta['dictionaries'].get(name, [])) for name in CODED_COLUMNS}
+        self._codes = {name: {value: code for code, value in enumerate(values)}
+                       for name, values in self.dictionaries.items()}
+        self._arrays = arrays
+        self._meta_version = version
+
+    def _create(self, capacity, generation=0):
+        """建立空的欄位檔案"""
+        self.count = 0
+        self.last_id = None
+        self.generation = generation
+        self.dictionaries = {name: [] for name in CODED_COLUMNS}
+        self._codes = {name: {} for name in CODED_COLUMNS}
+        self._arrays = {
+            name: open_memmap(self._array_file(name, generation), mode='w+', dtype=dtype, shape=(capacity,) + shape)
+            for name, (dtype, shape) in ARRAY_COLUMNS.items()
+        }
+        self._write_meta()
+
+    def _remove_stale_files(self):
+        """
+        刪除其他世代的欄位檔案（呼叫者持有鎖檔）
+        其他程序仍以mmap開啟時Windows無法刪除，留待下次再刪除
+        """
+        current = {os.path.basename(self._array_file(name, self.generation)) for name in ARRAY_COLUMNS}
+        for filename in os.listdir(self.directory):
+            if filename.endswith('.npy') and filename not in current:
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except OSError:
+                    pass
+
+    def _write_meta(self):
+        """原子替換meta.json"""
+        meta = {
+            'version': 1,
+            'source': self.source,
+            'generation': self.generation,
+            'count': self.count,
+            'last_id': self.last_id,
+            'dictionaries': self.dictionaries,
+        }
+        fd, temp_file = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False, default=str)
+            os.replace(temp_file, self._meta_file())
+            self._meta_version = self._disk_version()
+        except Exception:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise
+
+    def _grow(self, required):
+        """
+        容量不足時將欄位複製到加倍容量的下一世代檔案
+        meta.json在附加完成後才指向新世代，舊世代的檔案由_remove_stale_files刪除
+        """
+        capacity = len(self._arrays['day'])
+        if required <= capacity:
+            return
+        while capacity < required:
+            capacity *= 2
+
+        generation = self.generation + 1
+        arrays = {}
+        for name, (dtype, shape) in ARRAY_COLUMNS.items():
+            array = open_memmap(self._array_file(name, generation), mode='w+', dtype=dtype, shape=(capacity,) + shape)
+            array[:self.count] = self._arrays[name][:self.count]
+            arrays[name] = array
+        self._arrays = arrays
+        self.generation = generation
+
+    def _encode(self, name, value):
+        """字典編碼（新值加入字典）"""
+        key = '' if value is None else str(value)
+        code = self._codes[name].get(key)
+        if code is None:
+            code = self._codes[name][key] = len(self.dictionaries[name])
+            self.dictionaries[name].append(key)
+        return code
+
+    def append(self, records):
+        """
+        附加歷史記錄（記錄ID不大於已保存的最後ID時略過，重複同步不會重複加入）
+
+        Args:
+            records (list): 歷史記錄列表（依記錄ID遞增排列）
+
+        Returns:
+            int: 實際附加的記錄數
+        """
+        with self._file_lock, self._lock:
+            # 其他程序可能已附加相同的記錄
+            self._refresh()
+            if self.last_id is not None:
+                records = [record for record in records
+                           if record.get('ID') is None or record['ID'] > self.last_id]
+            if not records:
+                return 0
+
+            start = self.count
+            end = start + len(records)
+            generation = self.generation
+            self._grow(end)
+
+            days = {}
+            keys = [f'Datapoint_{j}' for j in range(1, DATAPOINT_COUNT + 1)]
+            rows = [[record.get(key) for key in keys] for record in records]
+            try:
+                # NumPy直接將None轉換為NaN；含有非數字字串時才逐一轉換
+                values = np.array(rows, dtype=float)
+            except (TypeError, ValueError):
+                values = np.array([[_to_float(value) for value in row] for row in rows], dtype=float)
+            self._arrays['values'][start:end] = values
+            # 同一日期通常有很多記錄，每個日期只解析一次
+            for record in records:
+                if record.get('Date') not in days:
+                    days[record.get('Date')] = to_day(record.get('Date'))
+            self._arrays['day'][start:end] = [days[record.get('Date')] for record in records]
+            self._arrays['record_id'][start:end] = [
+                record['ID'] if record.get('ID') is not None else -1 for record in records
+            ]
+            for name, key in CODED_COLUMNS.items():
+                self._arrays[name][start:end] = [self._encode(name, record.get(key)) for record in records]
+
+            for array in self._arrays.values():
+                array.flush()
+
+            # 數據已寫入後才更新有效行數
+            self.count = end
+            ids = [record['ID'] for record in records if record.get('ID') is not None]
+            if ids:
+                self.last_id = max(ids + ([self.last_id] if self.last_id is not None else []))
+            self._write_meta()
+            if self.generation != generation:
+                self._remove_stale_files()
+            return len(records)
+
+    def column(self, name):
+        """
+        獲取欄位的唯讀視圖（只包含有效行）
+
+        Args:
+            name (str): 欄位名稱（見ARRAY_COLUMNS）
+
+        Returns:
+            ndarray: 欄位陣列
+        """
+        with self._lock:
+            self._refresh()
+            array = self._arrays[name][:self.count]
+        view = array.view()
+        view.flags.writeable = False
+        return view
+
+    def code(self, name, value):
+        """
+        獲取值的字典代碼
+
+        Returns:
+            int: 代碼，字典中沒有此值則返回None
+        """
+        return self._codes[name].get('' if value is None else str(value))
+
+    def select(self, model_no=None, item=None, ois_no=None, date_from=None, date_to=None):
+        """
+        選擇符合條件的行（完全匹配）
+
+        Returns:
+            ndarray: 符合條件的行號（遞增）
+        """
+        with self._lock:
+            self._refresh()
+            count = self.count
+            mask = np.ones(count, dtype=bool)
+            for name, value in (('model', model_no), ('item', item), ('ois', ois_no)):
+                if value is None:
+                    continue
+                code = self.code(name, value)
+                if code is None:
+                    return np.empty(0, dtype=np.int64)
+                mask &= self._arrays[name][:count] == code
+
+            if date_from or date_to:
+                day = self._arrays['day'][:count]
+                mask &= day != NO_DAY
+                if date_from:
+                    mask &= day >= to_day(date_from)
+                if date_to:
+                    mask &= day <= to_day(date_to)
+
+            return np.flatnonzero(mask)
+
+    def daily_trend(self, model_no, item=None, date_from=None, date_to=None):
+        """
+        型號（及項目）每日的數據點統計
+
+        Args:
+            model_no (str): 型號
+            item: 項目編號，None表示所有項目
+            date_from (str): 起始日期 YYYY-MM-DD
+            date_to (str): 結束日期 YYYY-MM-DD
+
+        Returns:
+            list: 每日統計 [{'date', 'count', 'mean', 'min', 'max'}]，依日期排列
+        """
+        with self._lock:
+            rows = self.select(model_no=model_no, item=item, date_from=date_from, date_to=date_to)
+            days = self._arrays['day'][rows]
+            values = self._arrays['values'][rows]
+
+        keep = days != NO_DAY
+        days = days[keep]
+        values = values[keep]
+        if not len(days):
+            return []
+
+        unique_days, inverse = np.unique(days, return_inverse=True)
+        flat_days = np.repeat(inverse, DATAPOINT_COUNT)
+        flat_values = values.ravel()
+        valid = ~np.isnan(flat_values)
+        flat_days = flat_days[valid]
+        flat_values = flat_values[valid]
+
+        counts = np.bincount(flat_days, minlength=len(unique_days))
+        sums = np.bincount(flat_days, weights=flat_values, minlength=len(unique_days))
+        minimums = np.full(len(unique_days), np.inf)
+        maximums = np.full(len(unique_days), -np.inf)
+        np.minimum.at(minimums, flat_days, flat_values)
+        np.maximum.at(maximums, flat_days, flat_values)
+
+        return [
+            {
+                'date': from_day(day),
+                'count': int(count),
+                'mean': float(total / count),
+                'min': float(minimum),
+                'max': float(maximum),
+            }
+            for day, count, total, minimum, maximum in zip(unique_days, counts, sums, minimums, maximums)
+            if count
+        ]
@@ -1,143 +1,141 @@
 # -*- coding: utf-8 -*-
 """
 資料庫操作模組
-處理Excel檔案的讀寫操作
+透過儲存後端存取數據，並處理Excel報告的生成
 """
 
+import io
+import logging
 import os
 from datetime import datetime
-import shutil
-from openpyxl import Workbook, load_workbook
+from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment, Border, Side
 import tempfile
+from storage import ExcelBackend, SQLiteBackend
+from history_index import HistorySearchIndex
+from columnar_store import ColumnarStore
+from spc import SPCAggregates
+from snapshot import IndexSnapshot, source_key
+from report_template import get_report_template
+from inspection_stats import history_statistics, with_results
+from metrics import span, SPAN_DATABASE_WRITE, SPAN_REPORT_RENDER
+
+logger = logging.getLogger(__name__)
 
 class DatabaseManager:
-    def __init__(self, base_path):
+    def __init__(self, base_path, backend='excel'):
         """
         初始化資料庫管理器
         
         Args:
             base_path (str): 基礎路徑
+            backend (str): 儲存後端 ('excel' 或 'sqlite')
         """
         self.base_path = base_path
         self.database_file = os.path.join(base_path, 'OIR_database.xlsx')
         self.sample_file = os.path.join(base_path, '..', 'OIR_Report_Sample.xlsx')
+        self.sqlite_file = os.path.join(base_path, 'OIR_database.sqlite3')
+        self.columnar_dir = os.path.join(base_path, 'columnar')
+        self.snapshot_file = os.path.join(base_path, 'OIR_index.snapshot')
         
-        # 確保資料庫檔案存在
-        self._ensure_database_exists()
-    
-    def _ensure_database_exists(self):
-        """確保資料庫檔案存在，如果不存在則創建"""
-        if not os.path.exists(self.database_file):
-            self._create_database()
-    
-    def _create_database(self):
-        """創建新的資料庫檔案"""
-        wb = Workbook()
-        
-        # 創建OIS工作表
-        ws_ois = wb.active
-        ws_ois.title = "OIS"
-        
-        # OIS工作表標題
-        ois_headers = [
-            'OIS No.', 'Model Code', 'Model Desc.', 'Model Version', 
-            'Item', 'SC Symbol', 'Description', 'Minimum Limit', 
-            'Maximum Limit', 'Median', 'Unit', 'A.QAL(%) of Sample Size', 
-            'Type of Data', 'Measurement Equipment'
-        ]
-        
-        for col, header in enumerate(ois_headers, 1):
-            ws_ois.cell(row=1, column=col, value=header)
-        
-        # 嘗試從OIR_Report_Sample.xlsx匯入Standards數據
-        sample_file = os.path.join(self.base_path, '..', 'OIR_Report_Sample.xlsx')
-        if os.path.exists(sample_file):
-            try:
-                self._import_standards_from_sample(ws_ois, sample_file)
-            except Exception as e:
-                print(f"Warning: Could not import standards from sample file: {e}")
-                # 如果匯入失敗，使用預設示例數據
-                self._add_default_sample_data(ws_ois)
-        else:
-            # 如果樣本檔案不存在，使用預設示例數據
-            self._add_default_sample_data(ws_ois)
-        
-        # 創建database工作表
-        ws_db = wb.create_sheet("database")
-        
-        # database工作表標題
-        db_headers = [
-            'Date', 'Model No.', 'Model Description', 'OIS No.', 'Lot No.', 
-            'Item', 'Datapoint_1', 'Datapoint_2', 'Datapoint_3', 'Datapoint_4', 
-            'Datapoint_5', 'Datapoint_6', 'Datapoint_7', 'Datapoint_8', 
-            'Datapoint_9', 'Datapoint_10', 'Operator'
-        ]
-        
-        for col, header in enumerate(db_headers, 1):
-            ws_db.cell(row=1, column=col, value=header)
-        
-        # 保存檔案
-        wb.save(self.database_file)
+        self.backend = self._create_backend(backend)
+        
+        # 歷史搜尋索引（啟動時從快照恢復或建立，之後增量更新）
+        self.history_index = HistorySearchIndex()
+        
+        # 欄式數據點存放區（趨勢分析用），與搜尋索引從同一個同步流程取得新記錄
+        self.columnar_store = ColumnarStore(self.columnar_dir, source=backend)
+        
+        # 每個(型號, 項目, 日期)的SPC累計值，隨同步增量更新
+        self.spc = SPCAggregates()
+        
+        # 來源檔案未變更時從快照恢復索引，不需解析工作簿
+        self.snapshot = IndexSnapshot(self.snapshot_file)
+        self._snapshot_sources = None  # 目前快照的來源鍵
+        self.warm_start()
     
-    def _import_standards_from_sample(self, ws_ois, sample_file):
-        """從OIR_Report_Sample.xlsx匯入Standards數據"""
-        from openpyxl import load_workbook
+    def _create_backend(self, backend):
+        """
+        建立儲存後端
         
-        # 載入樣本檔案
-        sample_wb = load_workbook(sample_file)
-        if 'Standards' not in sample_wb.sheetnames:
-            raise Exception("Standards sheet not found in sample file")
+        Args:
+            backend (str): 儲存後端名稱
         
-        sample_ws = sample_wb['Standards']
+        Returns:
+            StorageBackend: 儲存後端實例
+        """
+        if backend == 'excel':
+            # OIS索引由warm_start從快照恢復或建立
+            return ExcelBackend(self.database_file, self.sample_file, preload_index=False)
+        if backend == 'sqlite':
+            # OIS標準仍由Excel工作簿維護，不需預先建立Excel端的索引
+            excel_backend = ExcelBackend(self.database_file, self.sample_file, preload_index=False)
+            return SQLiteBackend(self.sqlite_file, excel_backend)
+        raise ValueError(f"Unknown storage backend: {backend}")
+    
+    def warm_start(self):
+        """
+        從索引快照恢復OIS索引、歷史搜尋索引及SPC累計值
+        快照不存在或來源檔案的雜湊值不同時，解析來源檔案建立索引並保存新的快照
         
-        # 轉換Standards格式到OIS格式
-        # Standards格式: Item, OIS No., Model Desc, OIS Rev., Model Revision, SC Symbol, Description, Minimum Limit, Maximum Limit, Median, Unit, A.QAL(%) of Sample Size, Type of Data, Measurement Equipment
-        # OIS格式: OIS No., Model Code, Model Desc., Model Version, Item, SC Symbol, Description, Minimum Limit, Maximum Limit, Median, Unit, A.QAL(%) of Sample Size, Type of Data, Measurement Equipment
+        Returns:
+            bool: 從快照恢復返回True，重新建立返回False
+        """
+        try:
+            sources = source_key(self.backend.snapshot_sources())
+            state = self.snapshot.load(sources)
+        except Exception as e:
+            logger.error("Error reading index snapshot: %s", e)
+            state = None
         
-        row_num = 2  # 從第2行開始寫入數據
+        if state is not None:
+            try:
+                history_index, spc = state['history_index'], state['spc']
+                self.backend.restore_index_state(state['backend'])
+            except Exception as e:
+                logger.error("Error restoring index snapshot, rebuilding: %s", e)
+            else:
+                self.history_index = history_index
+                self.spc = spc
+                self._snapshot_sources = sources
+                try:
+                    # 欄式存放區被刪除或落後時，從已恢復的記錄補回
+                    if self.columnar_store.count != len(self.history_index):
+                        self.columnar_store.append(self.history_index.records)
+                    # SQLite後端在快照之後可能有新的報告（以讀取位置增量載入）
+                    self._sync_history_index()
+                except Exception as e:
+                    logger.error("Error updating history index: %s", e)
+                return True
         
-        for row in sample_ws.iter_rows(min_row=2, values_only=True):
-            if row[0] is None:  # 跳過空行
-                continue
-                
-            # 轉換數據格式
-            ois_row = [
-                row[1],   # OIS No.
-                row[2],   # Model Code (Model Desc)
-                row[2],   # Model Desc.
-                row[4],   # Model Version (Model Revision)
-                row[0],   # Item
-                row[5],   # SC Symbol
-                row[6],   # Description
-                row[7],   # Minimum Limit
-                row[8],   # Maximum Limit
-                row[9],   # Median
-                row[10],  # Unit
-                row[11],  # A.QAL(%) of Sample Size
-                row[12],  # Type of Data
-                row[13]   # Measurement Equipment
-            ]
-            
-            # 寫入OIS工作表
-            for col, value in enumerate(ois_row, 1):
-                ws_ois.cell(row=row_num, column=col, value=value)
-            
-            row_num += 1
+        self.save_snapshot()
+        return False
     
-    def _add_default_sample_data(self, ws_ois):
-        """添加預設示例數據"""
-        sample_data = [
-            ['DCCDC-IS-11301110', '1999-1130111', 'DCJ72(4)MLG-1130111', 'E', 1, '', 'dimension_1', 10.0, 15.0, 12.5, 'mm', 10, 'A', 'Caliper'],
-            ['DCCDC-IS-11301110', '1999-1130111', 'DCJ72(4)MLG-1130111', 'E', 2, '', 'dimension_2', 5.0, 8.0, 6.5, 'mm', 10, 'A', 'Caliper'],
-            ['DCCDC-IS-11301110', '1999-1130111', 'DCJ72(4)MLG-1130111', 'E', 3, '', 'dimension_3', 2.0, 4.0, 3.0, 'mm', 10, 'A', 'Height indicator'],
-            ['DCCDC-IS-11301110', '1999-1130111', 'DCJ72(4)MLG-1130111', 'E', 4, '', 'dimension_4', 1.0, 2.5, 1.75, 'mm', 10, 'A', 'Projector'],
-            ['DCCDC-IS-11301110', '1999-1130111', 'DCJ72(4)MLG-1130111', 'E', 5, '', 'dimension_5', 0.5, 1.0, 0.75, 'mm', 10, 'A', 'Projector']
-        ]
-        
-        for row, data in enumerate(sample_data, 2):
-            for col, value in enumerate(data, 1):
-                ws_ois.cell(row=row, column=col, value=value)
+    def save_snapshot(self):
+        """
+        同步索引並保存快照
+        來源檔案的雜湊值在匯出索引之前計算，保存期間如有新的寫入，快照只會在下次啟動時失效
+        
+        Returns:
+            bool: 保存成功返回True
+        """
+        try:
+            sources = source_key(self.backend.snapshot_sources())
+            if sources == self._snapshot_sources:
+                return True  # 來源檔案未變更，現有快照仍然有效
+            self._sync_history_index()
+            state = {
+                'backend': self.backend.export_index_state(),
+                'history_index': self.history_index,
+                'spc': self.spc,
+            }
+            if not self.snapshot.save(sources, state):
+                return False
+            self._snapshot_sources = sources
+            return True
+        except Exception as e:
+            logger.error("Error saving index snapshot: %s", e)
+            return False
     
     def get_ois_data(self, ois_no):
         """
@@ -149,33 +147,16 @@ class DatabaseManager:
         Returns:
             list: OIS數據列表，如果找不到則返回空列表
         """
-        try:
-            wb = load_workbook(self.database_file)
-            ws = wb['OIS']
-            
-            # 獲取標題行
-            headers = []
-            for cell in ws[1]:
-                headers.append(cell.value)
-            
-            # 查找匹配的OIS編號
-            ois_data = []
-            for row in ws.iter_rows(min_row=2, values_only=True):
-                if row[0] == ois_no:  # OIS No. 在第一欄
-                    row_dict = {}
-                    for i, header in enumerate(headers):
-                        if i < len(row):
-                            row_dict[header] = row[i]
-                        else:
-                            row_dict[header] = None
-                    ois_data.append(row_dict)
-            
-            wb.close()
-            return ois_data
-            
-        except Exception as e:
-            print(f"Error reading OIS data: {e}")
-            return []
+        return self.backend.get_ois_data(ois_no)
+    
+    def get_ois_numbers(self):
+        """
+        獲取所有可用的OIS編號
+        
+        Returns:
+            list: 排序後的OIS編號列表
+        """
+        return self.backend.get_ois_numbers()
     
     def get_model_description(self, model_code):
         """
@@ -187,31 +168,7 @@ class DatabaseManager:
         Returns:
             str: 型號描述
         """
-        try:
-            wb = load_workbook(self.database_file)
-            ws = wb['OIS']
-            
-            # 查找Model Code欄位的索引
-            headers = []
-            for cell in ws[1]:
-                headers.append(cell.value)
-            
-            model_code_col = headers.index('Model Code') if 'Model Code' in headers else 1
-            model_desc_col = headers.index('Model Desc.') if 'Model Desc.' in headers else 2
-            
-            # 查找匹配的型號代碼
-            for row in ws.iter_rows(min_row=2, values_only=True):
-                if len(row) > model_code_col and row[model_code_col] == model_code:
-                    if len(row) > model_desc_col and row[model_desc_col]:
-                        wb.close()
-                        return row[model_desc_col]
-            
-            wb.close()
-            return model_code
-            
-        except Exception as e:
-            print(f"Error getting model description: {e}")
-            return model_code
+        return self.backend.get_model_description(model_code)
     
     def save_inspection_data(self, data):
         """
@@ -230,43 +187,30 @@ class DatabaseManager:
         Returns:
             bool: 保存成功返回True，失敗返回False
         """
-        try:
-            wb = load_workbook(self.database_file)
-            ws = wb['database']
-            
-            # 獲取下一行的行號
-            next_row = ws.max_row + 1
-            
-            # 為每個項目添加記錄
-            for item_data in data['items']:
-                # 基本資料
-                ws.cell(row=next_row, column=1, value=data['date'])          # Date
-                ws.cell(row=next_row, column=2, value=data['model_no'])      # Model No.
-                ws.cell(row=next_row, column=3, value=data['model_desc'])    # Model Description
-                ws.cell(row=next_row, column=4, value=data['ois_no'])        # OIS No.
-                ws.cell(row=next_row, column=5, value=data['lot_no'])        # Lot No.
-                ws.cell(row=next_row, column=6, value=item_data['item'])     # Item
-                
-                # 添加10個數據點 (columns 7-16)
-                datapoints = item_data.get('datapoints', [])
-                for i in range(10):
-                    col = 7 + i  # Datapoint_1 to Datapoint_10
-                    value = datapoints[i] if i < len(datapoints) else None
-                    ws.cell(row=next_row, column=col, value=value)
-                
-                ws.cell(row=next_row, column=17, value=data['operator'])     # Operator
-                
-                next_row += 1
-            
-            # 保存檔案
-            wb.save(self.database_file)
-            wb.close()
-            
-            return True
-            
-        except Exception as e:
-            print(f"Error saving inspection data: {e}")
-            return False
+        # 包含在寫入佇列中等待群組提交的時間
+        with span(SPAN_DATABASE_WRITE):
+            saved = self.submit_inspection_data(data).result()
+        if saved:
+            # 在呼叫者的執行緒同步搜尋索引，寫入執行緒只負責群組提交
+            try:
+                self._sync_history_index()
+            except Exception as e:
+                logger.error("Error updating history index: %s", e)
+        return saved
+    
+    def submit_inspection_data(self, data):
+        """
+        提交檢驗數據，不等待寫入完成
+        Excel後端由單一寫入執行緒群組提交，並行的保存不會互相覆蓋；
+        搜尋索引在下次查詢時同步
+        
+        Args:
+            data (dict): 檢驗數據（格式同save_inspection_data）
+        
+        Returns:
+            Future: 結果為bool，保存成功為True
+        """
+        return self.backend.submit_inspection_data(data)
     
     def search_history_data(self, filters):
         """
@@ -284,256 +228,342 @@ class DatabaseManager:
             list: 搜尋結果列表
         """
         try:
-            wb = load_workbook(self.database_file)
-            ws = wb['database']
-            
-            # 獲取標題行
-            headers = []
-            for cell in ws[1]:
-                headers.append(cell.value)
-            
-            # 獲取所有數據
-            results = []
-            for row in ws.iter_rows(min_row=2, values_only=True):
-                if not row or not row[0]:  # 跳過空行
-                    continue
-                
-                # 建立記錄字典
-                record = {}
-                for i, header in enumerate(headers):
-                    if i < len(row):
-                        value = row[i]
-                        # 特別處理日期欄位，確保格式一致
-                        if header == 'Date' and value:
-                            if isinstance(value, datetime):
-                                record[header] = value.strftime('%Y-%m-%d')
-                            else:
-                                record[header] = str(value)
-                        else:
-                            record[header] = value
-                    else:
-                        record[header] = None
-                
-                # 應用篩選條件
-                match = True
-                
-                # 日期篩選
-                if filters.get('date_from') or filters.get('date_to'):
-                    try:
-                        record_date = datetime.strptime(str(record['Date']), '%Y-%m-%d') if record.get('Date') else None
-                        if record_date:
-                            if filters.get('date_from'):
-                                filter_date_from = datetime.strptime(filters['date_from'], '%Y-%m-%d')
-                                if record_date < filter_date_from:
-                                    match = False
-                            if filters.get('date_to'):
-                                filter_date_to = datetime.strptime(filters['date_to'], '%Y-%m-%d')
-                                if record_date > filter_date_to:
-                                    match = False
-                    except:
-                        pass
-                
-                # 型號篩選
-                if filters.get('model_no') and match:
-                    model_no = str(record.get('Model No.', ''))
-                    if filters['model_no'].lower() not in model_no.lower():
-                        match = False
-                
-                # 批號篩選
-                if filters.get('lot_no') and match:
-                    lot_no = str(record.get('Lot No.', ''))
-                    if filters['lot_no'].lower() not in lot_no.lower():
-                        match = False
-                
-                # 操作員篩選
-                if filters.get('operator') and match:
-                    if record.get('Operator') != filters['operator']:
-                        match = False
-                
-                if match:
-                    results.append(record)
-            
-            wb.close()
-            return results
+            self._sync_history_index()
+            return self.history_index.search(filters)
             
         except Exception as e:
-            print(f"Error searching history data: {e}")
+            logger.error("Error searching history data: %s", e)
             return []
     
-    def create_report_excel(self, data, template_file=None):
+    def search_history_page(self, filters, offset=0, limit=50):
         """
-        創建報告Excel檔案，基於OIR_Report_Sample.xlsx的確切結構
+        分頁搜尋歷史數據
+        
+        Args:
+            filters (dict): 搜尋條件（同search_history_data）
+            offset (int): 起始位置
+            limit (int): 每頁記錄數
+        
+        Returns:
+            dict: 分頁結果
+                - total: 符合條件的總數
+                - offset: 起始位置
+                - limit: 每頁記錄數
+                - next_offset: 下一頁的起始位置，沒有下一頁則為None
+                - records: 目前頁面的記錄列表
+        """
+        offset = max(int(offset), 0)
+        limit = max(int(limit), 1)
+        try:
+            self._sync_history_index()
+            total, records = self.history_index.search_page(filters, offset, limit)
+        except Exception as e:
+            logger.error("Error searching history data: %s", e)
+            total, records = 0, []
+        
+        return {
+            'total': total,
+            'offset': offset,
+            'limit': limit,
+            'next_offset': offset + limit if offset + limit < total else None,
+            'records': records
+        }
+    
+    def get_history_records(self, record_ids):
+        """
+        根據記錄ID獲取歷史記錄
         
+        Args:
+            record_ids (list): 記錄ID列表
+        
+        Returns:
+            list: 歷史記錄列表，依傳入順序排列
+        """
+        try:
+            self._sync_history_index()
+            return self.history_index.get_records(record_ids)
+        except Exception as e:
+            logger.error("Error reading history records: %s", e)
+            return []
+    
+    def _sync_history_index(self):
+        """同步其他程序新增的記錄（沒有新記錄時成本很低）"""
+        records = self.history_index.sync(self.backend)
+        if records:
+            self.columnar_store.append(records)
+            self.spc.add(records)
+    
+    def get_spc_chart(self, model_no, item, date_from=None, date_to=None, limit=None):
+        """
+        獲取X-bar/S管制圖（從累計值計算，不需掃描歷史記錄）
+        
+        Args:
+            model_no (str): 型號
+            item: 項目編號
+            date_from (str): 起始日期 YYYY-MM-DD
+            date_to (str): 結束日期 YYYY-MM-DD
+            limit (int): 只使用最近的子組（日）數量
+        
+        Returns:
+            dict: 子組平均值/標準差、管制界限及違規點，失敗則返回None
+        """
+        try:
+            self._sync_history_index()
+            return self.spc.xbar_s_chart(model_no, item, date_from, date_to, limit)
+        except Exception as e:
+            logger.error("Error computing SPC chart: %s", e)
+            return None
+    
+    def get_daily_trend(self, model_no, item=None, date_from=None, date_to=None):
+        """
+        獲取型號（及項目）每日的數據點趨勢，從欄式存放區計算，不需讀取工作簿
+        
+        Args:
+            model_no (str): 型號
+            item: 項目編號，None表示所有項目
+            date_from (str): 起始日期 YYYY-MM-DD
+            date_to (str): 結束日期 YYYY-MM-DD
+        
+        Returns:
+            list: 每日統計 [{'date', 'count', 'mean', 'min', 'max'}]
+        """
+        try:
+            self._sync_history_index()
+            return self.columnar_store.daily_trend(model_no, item, date_from, date_to)
+        except Exception as e:
+            logger.error("Error computing daily trend: %s", e)
+            return []
+    
+    def build_history_report_data(self, records, order_no='', shipment_size='', location=''):
+        """
+        根據歷史記錄準備Excel報告數據
+        
+        Args:
+            records (list): 歷史記錄列表（第一筆記錄提供報告的基本資訊）
+            order_no (str): 訂單編號
+            shipment_size (str): 出貨數量
+            location (str): 位置
+        
+        Returns:
+            dict: create_report_excel使用的報告數據
+        """
+        first_record = records[0] if records else {}
+        limits = self.get_item_limits(records)
+        
+        # 重建items數據結構，處理所有選中的記錄
+        items_data = []
+        for record_index, record in enumerate(records):
+            datapoints = []
+            for j in range(1, 11):  # 10個數據點
+                key = f'Datapoint_{j}'
+                if key in record and record[key] is not None:
+                    datapoints.append(record[key])
+                else:
+                    datapoints.append(None)
+            
+            # 如果有任何非空數據點，添加這個項目
+            if any(dp is not None for dp in datapoints):
+                # 使用OIS標準的規格界限，找不到則不判定接受/拒收
+                min_limit, max_limit = limits.get((str(record.get('OIS No.')), str(record.get('Item'))), (None, None))
+                items_data.append({
+                    'item': record.get('Item', record_index + 1),
+                    'description': f'Item {record.get("Item", record_index + 1)}',
+                    'min_limit': min_limit,
+                    'max_limit': max_limit,
+                    'unit': '',
+                    'datapoints': datapoints
+                })
+        
+        return {
+            'model_no': first_record.get('Model No.', ''),
+            'order_no': order_no,
+            'shipment_size': shipment_size,
+            'lot_no': first_record.get('Lot No.', ''),
+            'inspector': first_record.get('Operator', ''),
+            'location': location,
+            'ois_no': first_record.get('OIS No.', ''),
+            'date': first_record.get('Date', ''),
+            'items': items_data
+        }
+    
+    def get_item_limits(self, records):
+        """
+        獲取歷史記錄對應的OIS規格界限
+        
+        Args:
+            records (list): 歷史記錄列表
+        
+        Returns:
+            dict: (OIS編號, 項目) -> (下限, 上限)
+        """
+        limits = {}
+        for ois_no in {str(record.get('OIS No.')) for record in records if record.get('OIS No.')}:
+            for item in self.get_ois_data(ois_no):
+                limits[(ois_no, str(item.get('Item')))] = (item.get('Minimum Limit'), item.get('Maximum Limit'))
+        return limits
+    
+    def get_history_statistics(self, records):
+        """
+        計算歷史記錄的統計值（平均值、標準差、超出規格數量、Cp/Cpk、接受/拒收）
+        
+        Args:
+            records (list): search_history_data返回的記錄列表
+        
+        Returns:
+            list: 每筆記錄的統計字典，依傳入順序排列
+        """
+        return history_statistics(records, self.get_item_limits(records))
+    
+    @staticmethod
+    def report_filename(data):
+        """
+        獲取報告的下載檔名
+
         Args:
             data (dict): 報告數據
-            template_file (str): 模板檔案路徑，如果為None則使用預設模板
+
+        Returns:
+            str: 依日期/型號/OIS編號組成的檔名
+        """
+        return f"OIR_{datetime.now().strftime('%Y%m%d')}_{data.get('model_no', 'UNKNOWN')}_{data.get('ois_no', 'UNKNOWN')}.xlsx"
+
+    @staticmethod
+    def render_report(data, template_file=None):
+        """
+        在記憶體中生成報告，不寫入任何檔案
+        
+        Args:
+            data (dict): 報告數據（格式同create_report_excel）
+            template_file (str): 模板檔案路徑，如果為None或不存在則創建基本報告
         
         Returns:
-            str: 創建的臨時檔案路徑，如果失敗則返回None
+            bytes: xlsx檔案內容，如果失敗則返回None
         """
+        with span(SPAN_REPORT_RENDER):
+            return DatabaseManager._render_report(data, template_file)
+
+    @staticmethod
+    def _render_report(data, template_file):
+        """生成報告（render_report的實作）"""
         try:
+            # 根據規格界限填寫Result欄位(M/N)
+            data = dict(data, items=with_results(data.get('items', [])))
+            
             # 使用模板檔案
             if template_file and os.path.exists(template_file):
-                # 複製模板檔案到臨時位置
-                temp_dir = tempfile.gettempdir()
-                report_filename = f"OIR_{datetime.now().strftime('%Y%m%d')}_{data.get('model_no', 'UNKNOWN')}_{data.get('ois_no', 'UNKNOWN')}.xlsx"
-                temp_file = os.path.join(temp_dir, report_filename)
-                
-                print(f"Creating report: {report_filename}")
-                print(f"Template file: {template_file}")
-                print(f"Temp file: {temp_file}")
-                
-                # 確保目標目錄存在
-                os.makedirs(os.path.dirname(temp_file), exist_ok=True)
-                shutil.copy2(template_file, temp_file)
-                
-                # 載入並填充數據到Dimension_Inspection_Report工作表
-                wb = load_workbook(temp_file)
-                
-                # 選擇Sheet1工作表（新模板的工作表名稱）
-                if 'Sheet1' in wb.sheetnames:
-                    ws = wb['Sheet1']
-                else:
-                    ws = wb.active
-                
-                # 確保只有一個工作表（新模板本來就只有一個）
-                print(f"Available sheets: {wb.sheetnames}")
-                print(f"Using sheet: {ws.title}")
-                
-                # 填充基本資訊 - 根據確切的儲存格位置
-                ws['D3'] = data.get('model_no', '')          # Model No.
-                ws['D4'] = data.get('order_no', '')          # Order No.
-                ws['D5'] = data.get('shipment_size', '')     # Shipment Size
-                ws['D6'] = data.get('lot_no', '')            # Lot No.
-                ws['K3'] = datetime.now().strftime('%Y-%m-%d')  # Today's Date
-                ws['K4'] = data.get('inspector', '')         # Inspected By
-                ws['K5'] = data.get('location', '')          # Location
-                ws['K6'] = data.get('ois_no', '')            # OIS No.
-                
-                # 日期使用Excel公式 =TODAY() (已經在模板中)
-                # ws['K3'] 應該已經有 =TODAY() 公式
-                
-                # 填充檢驗數據 - 從A9開始，數據從C9到L9
-                items_data = data.get('items', [])
-                for i, item_data in enumerate(items_data):
-                    row = 9 + i  # 從第9行開始
-                    
-                    # Item No. (A欄)
-                    ws[f'A{row}'] = item_data.get('item', i + 1)
-                    
-                    # Standard欄位(B欄) - 留空
-                    ws[f'B{row}'] = ''
-                    
-                    # 填充10個測量數值 (C9到L9)
-                    datapoints = item_data.get('datapoints', [])
-                    for j, datapoint in enumerate(datapoints):
-                        if j < 10:  # 最多10個數據點
-                            col_letter = chr(ord('C') + j)  # C, D, E, F, G, H, I, J, K, L
-                            if datapoint is not None:
-                                ws[f'{col_letter}{row}'] = datapoint
-                    
-                    # Result欄位(M, N欄) - 留空
-                    ws[f'M{row}'] = ''  # Accept
-                    ws[f'N{row}'] = ''  # Reject
-                
-                wb.save(temp_file)
-                return temp_file
-                
-            else:
-                # 如果沒有模板檔案，創建基本報告
-                temp_dir = tempfile.gettempdir()
-                report_filename = f"OIR_{datetime.now().strftime('%Y%m%d')}_{data['model_no']}_{data['ois_no']}.xlsx"
-                temp_file = os.path.join(temp_dir, report_filename)
-                
-                wb = Workbook()
-                ws = wb.active
-                ws.title = "Dimension_Inspection_Report"
-                
-                # 創建基本的報告結構（模仿OIR_Report_Sample.xlsx）
-                ws['A1'] = 'Dimension Inspection Report'
-                ws['A1'].font = Font(size=16, bold=True)
-                ws['A2'] = '尺寸檢驗報告'
-                
-                # 基本資訊標籤
-                ws['A3'] = 'Model No.產品型號:'
-                ws['A4'] = 'Order No. 訂單編號:'
-                ws['A5'] = 'Shipment Size 出貨數量:'
-                ws['A6'] = 'Lot No. 批號:'
-                ws['I3'] = 'Date 日期:'
-                ws['I4'] = 'Inspected By 測量人:'
-                ws['I5'] = 'Location 位置:'
-                ws['I6'] = 'OIS No. OIS 編號:'
-                
-                # 填充數據
-                ws['C3'] = data.get('model_no', '')
-                ws['C4'] = data.get('order_no', '')
-                ws['C5'] = data.get('shipment_size', '')
-                ws['C6'] = data.get('lot_no', '')
-                ws['K3'] = '=TODAY()'
-                ws['K4'] = data.get('inspector', '')
-                ws['K5'] = data.get('location', '')
-                ws['K6'] = data.get('ois_no', '')
-                
-                # 表格標題
-                ws['A7'] = 'Item No.\n序號'
-                ws['B7'] = 'Standard\n標準'
-                ws['C7'] = 'Readings of 10 Measurements 10個測量數值'
-                ws['M7'] = 'Result 結果'
-                
-                # 數字標題 1-10
-                for i in range(10):
-                    col_letter = chr(ord('C') + i)
-                    ws[f'{col_letter}8'] = i + 1
-                
-                ws['M8'] = 'Accept\n接受'
-                ws['N8'] = 'Reject\n拒收'
-                
-                # 清除數據驗證區域的所有驗證規則（C9:L18範圍）
-                for row in range(9, 19):  # 假設最多10個項目
-                    for col in range(ord('C'), ord('M')):  # C到L列
-                        cell = ws[chr(col) + str(row)]
-                        if cell.data_validation:
+                # 從記憶體中已解析的模板生成報告，不需複製或重新解析模板檔案
+                return get_report_template(template_file).render(data)
+
+            # 如果沒有模板檔案，創建基本報告
+            wb = Workbook()
+            ws = wb.active
+            ws.title = "Dimension_Inspection_Report"
+            
+            # 創建基本的報告結構（模仿OIR_Report_Sample.xlsx）
+            ws['A1'] = 'Dimension Inspection Report'
+            ws['A1'].font = Font(size=16, bold=True)
+            ws['A2'] = '尺寸檢驗報告'
+            
+            # 基本資訊標籤
+            ws['A3'] = 'Model No.產品型號:'
+            ws['A4'] = 'Order No. 訂單編號:'
+            ws['A5'] = 'Shipment Size 出貨數量:'
+            ws['A6'] = 'Lot No. 批號:'
+            ws['I3'] = 'Date 日期:'
+            ws['I4'] = 'Inspected By 測量人:'
+            ws['I5'] = 'Location 位置:'
+            ws['I6'] = 'OIS No. OIS 編號:'
+            
+            # 填充數據
+            ws['C3'] = data.get('model_no', '')
+            ws['C4'] = data.get('order_no', '')
+            ws['C5'] = data.get('shipment_size', '')
+            ws['C6'] = data.get('lot_no', '')
+            ws['K3'] = '=TODAY()'
+            ws['K4'] = data.get('inspector', '')
+            ws['K5'] = data.get('location', '')
+            ws['K6'] = data.get('ois_no', '')
+            
+            # 表格標題
+            ws['A7'] = 'Item No.\n序號'
+            ws['B7'] = 'Standard\n標準'
+            ws['C7'] = 'Readings of 10 Measurements 10個測量數值'
+            ws['M7'] = 'Result 結果'
+            
+            # 數字標題 1-10
+            for i in range(10):
+                col_letter = chr(ord('C') + i)
+                ws[f'{col_letter}8'] = i + 1
+            
+            ws['M8'] = 'Accept\n接受'
+            ws['N8'] = 'Reject\n拒收'
+            
+            # 清除數據驗證區域的所有驗證規則（C9:L18範圍）
+            for row in range(9, 19):  # 假設最多10個項目
+                for col in range(ord('C'), ord('M')):  # C到L列
+                    cell = ws[chr(col) + str(row)]
+                    if cell.data_validation:
+                        cell.data_validation = None
+            
+            # 填充檢驗數據 - 填充Item No.和實際數據點
+            items_data = data.get('items', [])
+            for i, item_data in enumerate(items_data):
+                row = 9 + i
+                ws[f'A{row}'] = item_data.get('item', i + 1)
+            
+                # 填入實際數據點到C-L列，保持模板格式
+                datapoints = item_data.get('datapoints', [])
+                for j, datapoint in enumerate(datapoints):
+                    if j < 10:  # 只填入前10個數據點
+                        col_letter = chr(ord('C') + j)  # C, D, E, ..., L
+                        if datapoint is not None:
+                            cell = ws[f'{col_letter}{row}']
+                            cell.value = float(datapoint) if isinstance(datapoint, (int, float, str)) and str(datapoint).replace('.', '').replace('-', '').isdigit() else datapoint
+                            # 清除數據驗證規則以避免紅色顯示
                             cell.data_validation = None
                 
-                # 填充檢驗數據 - 填充Item No.和實際數據點
-                items_data = data.get('items', [])
-                for i, item_data in enumerate(items_data):
-                    row = 9 + i
-                    ws[f'A{row}'] = item_data.get('item', i + 1)
-                    
-                    # 填入實際數據點到C-L列，保持模板格式
-                    datapoints = item_data.get('datapoints', [])
-                    for j, datapoint in enumerate(datapoints):
-                        if j < 10:  # 只填入前10個數據點
-                            col_letter = chr(ord('C') + j)  # C, D, E, ..., L
-                            if datapoint is not None:
-                                cell = ws[f'{col_letter}{row}']
-                                cell.value = float(datapoint) if isinstance(datapoint, (int, float, str)) and str(datapoint).replace('.', '').replace('-', '').isdigit() else datapoint
-                                # 清除數據驗證規則以避免紅色顯示
-                                cell.data_validation = None
-                
-                wb.save(temp_file)
-                
-                # 設置臨時文件5分鐘後自動清理
-                import threading
-                def cleanup_after_delay():
-                    import time
-                    time.sleep(300)  # 5分鐘 = 300秒
-                    try:
-                        if os.path.exists(temp_file):
-                            os.remove(temp_file)
-                            print(f"Temporary file cleaned up: {temp_file}")
-                    except Exception as e:
-                        print(f"Error cleaning up temp file: {e}")
-                
-                cleanup_thread = threading.Thread(target=cleanup_after_delay)
-                cleanup_thread.daemon = True
-                cleanup_thread.start()
-                
-                return temp_file
+                # Result欄位(M, N欄)
+                ws[f'M{row}'] = item_data.get('accept')
+                ws[f'N{row}'] = item_data.get('reject')
+            
+            output = io.BytesIO()
+            wb.save(output)
+            return output.getvalue()
+            
+        except Exception as e:
+            logger.error("Error rendering report: %s", e)
+            return None
+
+    @staticmethod
+    def create_report_excel(data, template_file=None, output_file=None):
+        """
+        創建報告Excel檔案，基於OIR_Report_Sample.xlsx的確切結構
+        不依賴資料庫狀態，可在批次生成的工作程序中直接呼叫
+        
+        Args:
+            data (dict): 報告數據
+            template_file (str): 模板檔案路徑，如果為None則使用預設模板
+            output_file (str): 輸出檔案路徑，如果為None則依日期/型號/OIS編號保存到臨時目錄
+        
+        Returns:
+            str: 創建的檔案路徑，如果失敗則返回None
+        """
+        try:
+            report_bytes = DatabaseManager.render_report(data, template_file)
+            if report_bytes is None:
+                return None
+
+            temp_file = output_file or os.path.join(tempfile.gettempdir(), DatabaseManager.report_filename(data))
+            logger.debug("Creating report: %s", temp_file)
+
+            # 確保目標目錄存在
+            os.makedirs(os.path.dirname(temp_file), exist_ok=True)
+            with open(temp_file, 'wb') as f:
+                f.write(report_bytes)
+            return temp_file
             
         except Exception as e:
-            print(f"Error creating report Excel: {e}")
+            logger.error("Error creating report Excel: %s", e)
             return None
     
     def cleanup_temp_files(self, file_path):
@@ -547,5 +577,5 @@ class DatabaseManager:
             if os.path.exists(file_path):
                 os.remove(file_path)
         except Exception as e:
-            print(f"Error cleaning up temp file: {e}")
+            logger.error("Error cleaning up temp file: %s", e)
 
@@ -0,0 +1,490 @@
+# -*- coding: utf-8 -*-
+"""
+伺服器推送事件(Server-Sent Events)模組
+EventBroker把事件分派到訂閱的頻道，每個訂閱者有固定長度的佇列（慢的客戶端只會遺失最舊的事件，
+不會阻塞發布者）；訂閱者總數有上限，每個串流定時送出心跳並在最長時間後結束，由瀏覽器的EventSource自動重新連線。
+多工作程序部署時以SQLiteEventRelay在程序之間轉送事件，重新連線的瀏覽器以Last-Event-ID補回期間的事件
+
+用法:
+    broker.publish('jobs', 'job_completed', {'job_id': ...})
+    return event_stream_response(broker, ['jobs'])
+"""
+
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from flask import Response, jsonify, request
+
+logger = logging.getLogger(__name__)
+
+class Subscription:
+    """
+    一個串流連線的事件佇列
+    """
+
+    def __init__(self, channels, queue_size):
+        self.channels = tuple(channels)
+        self.events = deque(maxlen=queue_size)
+        self.condition = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+        self.active = False  # 由EventBroker在持有鎖時設定
+
+    def put(self, event):
+        """放入事件（佇列已滿時捨棄最舊的事件）"""
+        with self.condition:
+            if len(self.events) == self.events.maxlen:
+                self.dropped += 1
+            self.events.append(event)
+            self.condition.notify()
+
+    def get(self, timeout):
+        """
+        取出所有待送出的事件
+
+        Args:
+            timeout (float): 沒有事件時最多等待的秒數
+
+        Returns:
+            list: 事件列表（逾時為空列表）
+        """
+        with self.condition:
+            if not self.events and not self.closed:
+                self.condition.wait(timeout)
+            events = list(self.events)
+            self.events.clear()
+            return events
+
+    def close(self):
+        """結束串流（伺服器關閉或訂閱被移除時）"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+
+class SQLiteEventRelay:
+    """
+    跨程序的事件轉送
+    發布的事件寫入所有工作程序共用的SQLite資料庫，以自動遞增的ID作為全域的事件ID；
+    每個程序記錄自己訂閱中的頻道（定時更新，程序異常結束後其記錄會過期），
+    發布者只在有任何程序訂閱時才寫入事件。事件保留一段時間供重新連線時補回
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            channel TEXT NOT NULL,
+            event TEXT NOT NULL,
+            data TEXT NOT NULL,
+            origin INTEGER NOT NULL,
+            created REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_events_created ON events(created);
+        CREATE TABLE IF NOT EXISTS channels (
+            channel TEXT NOT NULL,
+            pid INTEGER NOT NULL,
+            seen REAL NOT NULL,
+            PRIMARY KEY (channel, pid)
+        );
+    """
+
+    # 程序的頻道記錄超過此秒數未更新即視為已結束
+    CHANNEL_TTL = 30.0
+
+    def __init__(self, db_file, retention=120.0):
+        """
+        初始化事件轉送
+
+        Args:
+            db_file (str): 資料庫檔案路徑
+            retention (float): 事件保留的秒數（重新連線時可補回的範圍）
+        """
+        self.db_file = db_file
+        self.retention = retention
+        self._local = threading.local()
+        self._connect().executescript(self.SCHEMA)
+        # fork之後子程序不可沿用父程序的連線
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_connections)
+
+    def _reset_connections(self):
+        """捨棄所有執行緒的資料庫連線（下次使用時重新連接）"""
+        self._local = threading.local()
+
+    def _connect(self):
+        """獲取目前執行緒的資料庫連線"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def append(self, channel, event, data):
+        """
+        寫入事件
+
+        Args:
+            channel (str): 頻道名稱
+            event (str): 事件名稱
+            data (str): JSON格式的事件內容
+
+        Returns:
+            int: 事件ID
+        """
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                'INSERT INTO events (channel, event, data, origin, created) VALUES (?, ?, ?, ?, ?)',
+                (channel, event, data, os.getpid(), time.time())
+            )
+        return cursor.lastrowid
+
+    def latest_id(self):
+        """最後一個事件的ID（沒有事件時為0）"""
+        row = self._connect().execute('SELECT MAX(id) FROM events').fetchone()
+        return row[0] or 0
+
+    def since(self, last_id, channels=None, exclude_origin=None):
+        """
+        獲取指定ID之後的事件
+
+        Args:
+            last_id (int): 已收到的最後一個事件ID
+            channels (iterable): 只返回這些頻道的事件，None則為所有頻道
+            exclude_origin (int): 略過此程序ID發布的事件（已在該程序內直接分派）
+
+        Returns:
+            list: [(事件ID, 頻道, 事件名稱, JSON內容)]，依ID排列
+        """
+        sql = 'SELECT id, channel, event, data, origin FROM events WHERE id > ?'
+        params = [last_id]
+        if channels is not None:
+            channels = list(channels)
+            sql += f" AND channel IN ({', '.join('?' * len(channels))})"
+            params += channels
+        rows = self._connect().execute(sql + ' ORDER BY id', params).fetchall()
+        return [row[:4] for row in rows if row[4] != exclude_origin]
+
+    def set_channels(self, channels):
+        """
+        更新本程序訂閱中的頻道
+
+        Args:
+            channels (iterable): 本程序目前訂閱中的所有頻道
+        """
+        pid = os.getpid()
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM channels WHERE pid = ? OR seen < ?', (pid, now - self.CHANNEL_TTL))
+            conn.executemany(
+                'INSERT INTO channels (channel, pid, seen) VALUES (?, ?, ?)',
+                [(channel, pid, now) for channel in channels]
+            )
+
+    def subscribed_channels(self):
+        """
+        獲取所有程序訂閱中的頻道
+
+        Returns:
+            set: 頻道名稱集合
+        """
+        rows = self._connect().execute(
+            'SELECT DISTINCT channel FROM channels WHERE seen >= ?', (time.time() - self.CHANNEL_TTL,)
+        ).fetchall()
+        return {row[0] for row in rows}
+
+    def purge(self):
+        """刪除超過保留時間的事件"""
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM events WHERE created < ?', (time.time() - self.retention,))
+
+class EventBroker:
+    """
+    事件分派器
+    事件只送給目前連線的訂閱者；提供relay時事件同時寫入共用資料庫，
+    由每個工作程序的背景執行緒輪詢其他程序發布的事件並分派給本程序的訂閱者
+    """
+
+    # 背景執行緒更新頻道記錄及刪除過期事件的間隔（秒）
+    MAINTENANCE_INTERVAL = 5.0
+
+    def __init__(self, max_subscribers=64, queue_size=100, heartbeat=15.0, max_duration=300.0,
+                 relay=None, poll_interval=0.25):
+        """
+        初始化事件分派器
+
+        Args:
+            max_subscribers (int): 同時連線的串流數上限（每個串流佔用一個伺服器執行緒）
+            queue_size (int): 每個訂閱者最多保留的未送出事件數
+            heartbeat (float): 沒有事件時送出心跳註解的間隔（秒），避免代理伺服器關閉閒置連線
+            max_duration (float): 串流的最長時間（秒），之後由瀏覽器重新連線並釋放執行緒
+            relay (SQLiteEventRelay): 跨程序的事件轉送，None則只在程序內分派
+            poll_interval (float): 輪詢其他程序事件的間隔（秒）
+        """
+        self.max_subscribers = max_subscribers
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.max_duration = max_duration
+        self.relay = relay
+        self.poll_interval = poll_interval
+        self._channels = {}  # 頻道 -> 訂閱者集合
+        self._subscriber_count = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._stats = {'published': 0, 'delivered': 0, 'rejected': 0, 'relayed': 0}
+        self._relay_channels = set()  # 所有程序訂閱中的頻道（輪詢時更新）
+        self._relay_dirty = threading.Event()  # 本程序的訂閱頻道已變更
+        self._poller_started = False
+        self._stopped = threading.Event()
+        if relay is not None and hasattr(os, 'register_at_fork'):
+            # 輪詢執行緒屬於啟動它的程序，fork出的工作程序各自啟動
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._poller_started = False
+        self._lock = threading.Lock()
+        self._relay_dirty = threading.Event()
+
+    def _start_poller(self):
+        """啟動輪詢其他程序事件的背景執行緒（只啟動一次）"""
+        if self.relay is None or self._poller_started:
+            return
+        with self._lock:
+            if self._poller_started:
+                return
+            self._poller_started = True
+        try:
+            last_id = self.relay.latest_id()
+            self._relay_channels = self.relay.subscribed_channels()
+        except sqlite3.Error as e:
+            logger.error("Error reading event relay: %s", e)
+            last_id = 0
+        threading.Thread(target=self._poll, args=(last_id,), name='event-relay', daemon=True).start()
+
+    def _poll(self, last_id):
+        """背景執行緒：分派其他程序發布的事件，定時更新頻道記錄及刪除過期事件"""
+        pid = os.getpid()
+        next_maintenance = 0.0
+        while not self._stopped.wait(self.poll_interval):
+            try:
+                now = time.monotonic()
+                if self._relay_dirty.is_set() or now >= next_maintenance:
+                    self._relay_dirty.clear()
+                    with self._lock:
+                        channels = list(self._channels)
+                    self.relay.set_channels(channels)
+                    if now >= next_maintenance:
+                        self.relay.purge()
+                        next_maintenance = now + self.MAINTENANCE_INTERVAL
+                self._relay_channels = self.relay.subscribed_channels()
+
+                for event_id, channel, event, data in self.relay.since(last_id, exclude_origin=pid):
+                    last_id = event_id
+                    self._deliver(channel, (event_id, event, data))
+            except sqlite3.Error as e:
+                logger.error("Error polling event relay: %s", e)
+                self._stopped.wait(self.MAINTENANCE_INTERVAL)
+
+    def _deliver(self, channel, message):
+        """將事件放入本程序訂閱者的佇列"""
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+            self._stats['delivered'] += len(subscribers)
+        for subscription in subscribers:
+            subscription.put(message)
+        return len(subscribers)
+
+    def subscribe(self, channels):
+        """
+        訂閱頻道
+
+        Args:
+            channels (list): 頻道名稱列表
+
+        Returns:
+            Subscription: 訂閱，已達上限時返回None
+        """
+        self._start_poller()
+        subscription = Subscription(channels, self.queue_size)
+        with self._lock:
+            if self._subscriber_count >= self.max_subscribers:
+                self._stats['rejected'] += 1
+                return None
+            self._subscriber_count += 1
+            subscription.active = True
+            for channel in subscription.channels:
+                self._channels.setdefault(channel, set()).add(subscription)
+        self._relay_dirty.set()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """取消訂閱"""
+        with self._lock:
+            if subscription.active:
+                subscription.active = False
+                self._subscriber_count -= 1
+                for channel in subscription.channels:
+                    subscribers = self._channels.get(channel)
+                    if subscribers is not None:
+                        subscribers.discard(subscription)
+                        if not subscribers:
+                            del self._channels[channel]
+                            self._relay_dirty.set()
+        subscription.close()
+
+    def has_subscribers(self, channel):
+        """任何程序的頻道是否有訂閱者（沒有時發布者可略過建立事件內容）"""
+        if channel in self._channels:
+            return True
+        if self.relay is None:
+            return False
+        self._start_poller()
+        return channel in self._relay_channels
+
+    def publish(self, channel, event, data=None):
+        """
+        發布事件
+
+        Args:
+            channel (str): 頻道名稱
+            event (str): 事件名稱（EventSource的addEventListener名稱）
+            data: 可JSON序列化的事件內容
+
+        Returns:
+            int: 收到事件的訂閱者數量
+        """
+        with self._lock:
+            self._stats['published'] += 1
+            local = channel in self._channels
+
+        if self.relay is None:
+            if not local:
+                return 0
+            return self._deliver(channel, (next(self._ids), event, json.dumps(data, ensure_ascii=False, default=str)))
+
+        self._start_poller()
+        if not local and channel not in self._relay_channels:
+            return 0
+        payload = json.dumps(data, ensure_ascii=False, default=str)
+        try:
+            # 共用資料庫的ID作為事件ID，重新連線到其他工作程序時也能以Last-Event-ID補回
+            event_id = self.relay.append(channel, event, payload)
+            with self._lock:
+                self._stats['relayed'] += 1
+        except sqlite3.Error as e:
+            logger.error("Error relaying event: %s", e)
+            event_id = None
+        return self._deliver(channel, (event_id, event, payload)) if local else 0
+
+    def stream(self, subscription, last_event_id=None):
+        """
+        產生text/event-stream的內容（結束或客戶端斷線時取消訂閱）
+
+        Args:
+            subscription (Subscription): subscribe返回的訂閱
+            last_event_id (int): 重新連線時瀏覽器送出的Last-Event-ID，有relay時先補回之後的事件
+
+        Yields:
+            str: SSE格式的事件
+        """
+        deadline = time.monotonic() + self.max_duration
+        if self.relay is None:
+            last_event_id = None  # 程序內的事件ID在每個程序各自編號，無法補回
+        try:
+            # 重新連線的等待時間，及讓代理伺服器立即送出回應標頭
+            yield 'retry: 3000\n: connected\n\n'
+            if last_event_id is not None:
+                try:
+                    missed = self.relay.since(last_event_id, subscription.channels)
+                except sqlite3.Error as e:
+                    logger.error("Error replaying events: %s", e)
+                    missed = []
+                if missed:
+                    # 訂閱之後已放入佇列的相同事件不再送出
+                    last_event_id = missed[-1][0]
+                    yield _format_events((event_id, event, data) for event_id, _, event, data in missed)
+            while not subscription.closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                events = subscription.get(min(self.heartbeat, remaining))
+                if last_event_id is not None:
+                    events = [event for event in events if event[0] is None or event[0] > last_event_id]
+                if not events:
+                    yield ': heartbeat\n\n'
+                    continue
+                yield _format_events(events)
+        finally:
+            self.unsubscribe(subscription)
+
+    def close_all(self):
+        """結束所有串流及輪詢執行緒（程式結束時）"""
+        self._stopped.set()
+        with self._lock:
+            subscriptions = {s for subscribers in self._channels.values() for s in subscribers}
+        for subscription in subscriptions:
+            self.unsubscribe(subscription)
+
+    def get_stats(self):
+        """
+        獲取統計
+
+        Returns:
+            dict: 訂閱者數量、各類頻道的訂閱者數量及發布統計
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['subscribers'] = self._subscriber_count
+            stats['max_subscribers'] = self.max_subscribers
+            stats['relay'] = self.relay is not None
+            # 只依頻道類別（':'之前的部分）統計，不列出session ID
+            channels = {}
+            for channel, subscribers in self._channels.items():
+                kind = channel.split(':', 1)[0]
+                channels[kind] = channels.get(kind, 0) + len(subscribers)
+            stats['channels'] = channels
+        return stats
+
+def _format_events(events):
+    """將 (事件ID, 事件名稱, JSON內容) 轉換為SSE格式（沒有ID的事件不送出id欄位）"""
+    return ''.join(
+        (f'id: {event_id}\n' if event_id is not None else '') + f'event: {event}\ndata: {data}\n\n'
+        for event_id, event, data in events
+    )
+
+def event_stream_response(broker, channels):
+    """
+    建立SSE回應（在請求上下文中呼叫，重新連線的Last-Event-ID從請求標頭讀取）
+
+    Args:
+        broker (EventBroker): 事件分派器
+        channels (list): 訂閱的頻道
+
+    Returns:
+        Response: text/event-stream串流，連線數已達上限時返回503
+    """
+    subscription = broker.subscribe(channels)
+    if subscription is None:
+        logger.warning("Event stream rejected, %d subscribers connected", broker.max_subscribers)
+        response = jsonify({'success': False, 'message': 'Too many event streams'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    response = Response(broker.stream(subscription, last_event_id), mimetype='text/event-stream')
+    # 串流尚未開始就斷線時產生器的finally不會執行，由回應關閉時取消訂閱
+    response.call_on_close(lambda: broker.unsubscribe(subscription))
+    response.headers['Cache-Control'] = 'no-cache'
+    # 停用nginx等反向代理的緩衝，事件才能即時送出
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
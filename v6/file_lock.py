@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+檔案鎖模組
+多個工作程序（Gunicorn等）共用同一個資料目錄時，以鎖檔協調工作簿及欄式存放區的寫入；
+同一程序內的執行緒以RLock排隊，只有最外層持有者鎖定檔案
+"""
+
+import os
+import threading
+
+if os.name == 'nt':
+    import msvcrt
+
+    def _lock_file(fd):
+        os.lseek(fd, 0, os.SEEK_SET)
+        while True:
+            try:
+                # LK_LOCK重試約10秒後放棄，繼續等待直到取得鎖
+                msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                continue
+
+    def _try_lock_file(fd):
+        os.lseek(fd, 0, os.SEEK_SET)
+        try:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def _unlock_file(fd):
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _lock_file(fd):
+        fcntl.flock(fd, fcntl.LOCK_EX)
+
+    def _try_lock_file(fd):
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def _unlock_file(fd):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+class FileLock:
+    """
+    跨程序的獨佔檔案鎖（可重入）
+    用法: with FileLock(path): ...
+    """
+
+    def __init__(self, path):
+        """
+        初始化檔案鎖
+
+        Args:
+            path (str): 鎖檔路徑（不存在則自動建立，內容不使用）
+        """
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def acquire(self):
+        """取得鎖（阻塞直到其他執行緒及程序釋放）"""
+        self._lock.acquire()
+        if self._depth == 0:
+            try:
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    _lock_file(fd)
+                except BaseException:
+                    os.close(fd)
+                    raise
+            except BaseException:
+                self._lock.release()
+                raise
+            self._fd = fd
+        self._depth += 1
+
+    def try_acquire(self):
+        """
+        嘗試取得鎖，不等待其他程序
+
+        Returns:
+            bool: 取得鎖返回True（之後需要release），其他程序持有時返回False
+        """
+        self._lock.acquire()
+        if self._depth == 0:
+            try:
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    locked = _try_lock_file(fd)
+                except BaseException:
+                    os.close(fd)
+                    raise
+            except BaseException:
+                self._lock.release()
+                raise
+            if not locked:
+                os.close(fd)
+                self._lock.release()
+                return False
+            self._fd = fd
+        self._depth += 1
+        return True
+
+    def release(self):
+        """釋放鎖"""
+        self._depth -= 1
+        if self._depth == 0:
+            fd, self._fd = self._fd, None
+            try:
+                _unlock_file(fd)
+            finally:
+                os.close(fd)
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
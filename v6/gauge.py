@@ -0,0 +1,447 @@
+# -*- coding: utf-8 -*-
+"""
+量測設備讀數輸入模組
+從序列埠（USB轉序列的卡尺、高度規等，需要pyserial）或TCP連線（設備伺服器或模擬設備）接收讀數，
+依工作站(station)送到綁定該工作站的session目前的項目；讀數先暫存為批次（所有工作程序共用的SQLite資料庫），
+在該session的下一個請求中一次合併到report_data['items_data']，並以伺服器推送事件即時顯示在數據輸入頁面
+
+USB-HID（鍵盤模擬）的量測設備直接輸入到瀏覽器中游標所在的欄位，不需要此模組。
+
+讀數格式（每行一個）:
+    12.345                  數值（前後可有單位等文字）
+    01A+00012.345           Mitutoyo Digimatic / SPC輸出
+    caliper-1 12.345        TCP連線中以工作站名稱開頭
+    STATION caliper-1       TCP連線中設定之後讀數的工作站
+
+模擬設備:
+    python gauge.py --port 5055 --station caliper-1 --count 30 --median 10.0 --sigma 0.01
+"""
+
+import argparse
+import logging
+import os
+import random
+import re
+import socket
+import socketserver
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from file_lock import FileLock
+from inspection_stats import DATAPOINT_COUNT
+from logging_setup import fields
+
+logger = logging.getLogger(__name__)
+
+# 完整的浮點數（含正負號及指數），讀數為行中最後一個數值；
+# 前面的日期、Digimatic標頭(01A)等數字不會被當作讀數，指數的負號也不會被單獨取出
+_NUMBER = re.compile(r'[-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?')
+
+def parse_reading(line):
+    """
+    解析一行設備輸出
+
+    Args:
+        line (str): 設備輸出的一行
+
+    Returns:
+        float: 讀數，沒有數值時返回None
+
+    >>> parse_reading('01A+00012.345')
+    12.345
+    >>> parse_reading('-0.005 mm')
+    -0.005
+    >>> parse_reading('1.5e-3')
+    0.0015
+    >>> parse_reading('1e-05')
+    1e-05
+    >>> parse_reading('2024-01-01 12.5')
+    12.5
+    >>> parse_reading('12,345')
+    12.345
+    >>> parse_reading('ERR') is None
+    True
+    """
+    numbers = _NUMBER.findall(line.strip().replace(',', '.'))
+    return float(numbers[-1]) if numbers else None
+
+def _is_number(text):
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
+
+class GaugeIngestor:
+    """
+    讀數路由器
+    每個工作站綁定一個session，讀數依序填入目前項目的數據點，填滿後自動移到下一個項目。
+    綁定、尚未合併的讀數及統計保存在所有工作程序共用的SQLite資料庫；
+    TCP監聽及序列埠只由取得監聽鎖的一個程序開啟，該程序結束後由其他工作程序接手，
+    讀數事件經EventBroker（多工作程序時由事件轉送）送到任何工作程序的串流
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS gauge_bindings (
+            station TEXT PRIMARY KEY,
+            sid TEXT NOT NULL,
+            item_index INTEGER NOT NULL,
+            item_count INTEGER NOT NULL,
+            slot INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_gauge_bindings_sid ON gauge_bindings(sid);
+        CREATE TABLE IF NOT EXISTS gauge_readings (
+            sid TEXT NOT NULL,
+            item_index INTEGER NOT NULL,
+            slot INTEGER NOT NULL,
+            value REAL NOT NULL,
+            PRIMARY KEY (sid, item_index, slot)
+        );
+        CREATE TABLE IF NOT EXISTS gauge_stats (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS gauge_listener (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            pid INTEGER NOT NULL,
+            tcp_address TEXT,
+            started REAL NOT NULL
+        );
+    """
+
+    # 沒有取得監聽鎖的程序每隔此秒數重試（監聽的程序結束時接手）
+    LISTENER_RETRY = 10.0
+
+    def __init__(self, broker, db_file, tcp_address=None, serial_ports=None, baudrate=9600):
+        """
+        初始化讀數路由器
+
+        Args:
+            broker (EventBroker): 推送讀數事件的事件分派器
+            db_file (str): 共用的SQLite資料庫路徑（監聽鎖為同名的.lock檔案）
+            tcp_address (str): TCP監聽位址 'HOST:PORT'，None則不監聽
+            serial_ports (dict): 工作站 -> 序列埠，例如 {'caliper-1': '/dev/ttyUSB0'}
+            baudrate (int): 序列埠速率
+        """
+        self.broker = broker
+        self.db_file = db_file
+        self.tcp_address = tcp_address
+        self.serial_ports = dict(serial_ports or {})
+        self.baudrate = baudrate
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._listener_lock = FileLock(db_file + '.lock')
+        self._listening = False
+        self._next_attempt = 0.0
+        self._stopped = threading.Event()
+        self._tcp_server = None
+        self._connect().executescript(self.SCHEMA)
+        # fork之後子程序不可沿用父程序的連線，監聽由工作程序自行取得
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._listener_lock = FileLock(self.db_file + '.lock')
+        self._listening = False
+        self._next_attempt = 0.0
+
+    def _connect(self):
+        """獲取目前執行緒的資料庫連線（自動提交模式，交易由_transaction明確開始）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """寫入交易（BEGIN IMMEDIATE，讀取綁定到更新位置之間其他程序不能寫入）"""
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    @staticmethod
+    def _count(conn, name):
+        """統計計數加一（在呼叫者的交易中）"""
+        conn.execute(
+            'INSERT INTO gauge_stats (name, value) VALUES (?, 1) ON CONFLICT(name) DO UPDATE SET value = value + 1',
+            (name,)
+        )
+
+    @staticmethod
+    def channel(sid):
+        """session的讀數事件頻道"""
+        return f'gauge:{sid}'
+
+    def bind(self, station, sid, item_index, item_count, slot=0):
+        """
+        將工作站綁定到session（同一session原有的其他工作站解除綁定）
+
+        Args:
+            station (str): 工作站名稱
+            sid (str): session ID
+            item_index (int): 目前項目位置
+            item_count (int): 報告的項目數
+            slot (int): 下一個讀數的數據點位置
+        """
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM gauge_bindings WHERE sid = ?', (sid,))
+            conn.execute(
+                'INSERT OR REPLACE INTO gauge_bindings (station, sid, item_index, item_count, slot) VALUES (?, ?, ?, ?, ?)',
+                (station, sid, item_index, item_count, slot)
+            )
+        logger.info("Gauge station %s bound", station, extra=fields(item=item_index, slot=slot))
+
+    def unbind(self, sid):
+        """解除session的工作站綁定"""
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM gauge_bindings WHERE sid = ?', (sid,))
+
+    def add_reading(self, station, value):
+        """
+        將讀數送到綁定的session
+
+        Args:
+            station (str): 工作站名稱
+            value (float): 讀數
+
+        Returns:
+            dict: 讀數事件內容，沒有綁定或報告已填滿時返回None
+        """
+        with self._transaction() as conn:
+            self._count(conn, 'readings')
+            row = conn.execute(
+                'SELECT sid, item_index, item_count, slot FROM gauge_bindings WHERE station = ?', (station,)
+            ).fetchone()
+            if row is None:
+                self._count(conn, 'unrouted')
+                return None
+            sid, item_index, item_count, slot = row
+            if item_index >= item_count:
+                self._count(conn, 'dropped')
+                return None
+
+            conn.execute(
+                'INSERT OR REPLACE INTO gauge_readings (sid, item_index, slot, value) VALUES (?, ?, ?, ?)',
+                (sid, item_index, slot, value)
+            )
+            self._count(conn, 'routed')
+            event = {'station': station, 'item_index': item_index, 'slot': slot, 'value': value}
+            slot += 1
+            event['complete'] = slot >= DATAPOINT_COUNT
+            if event['complete']:
+                item_index += 1
+                slot = 0
+            conn.execute(
+                'UPDATE gauge_bindings SET item_index = ?, slot = ? WHERE station = ?', (item_index, slot, station)
+            )
+            event['next_item'] = item_index
+            event['report_complete'] = item_index >= item_count
+
+        self.broker.publish(self.channel(sid), 'reading', event)
+        if event['complete']:
+            self.broker.publish(self.channel(sid), 'item_complete', event)
+        return event
+
+    def feed_line(self, line, station):
+        """
+        處理一行設備輸出（可以工作站名稱開頭）
+
+        Args:
+            line (str): 設備輸出
+            station (str): 沒有工作站名稱時使用的工作站
+
+        Returns:
+            dict: add_reading的結果
+        """
+        parts = re.split(r'[\s,;]+', line.strip(), maxsplit=1)
+        if len(parts) == 2 and not _is_number(parts[0]):
+            station, line = parts
+        value = parse_reading(line)
+        if value is None:
+            logger.debug("Ignored gauge output %r", line)
+            return None
+        return self.add_reading(station, value)
+
+    def has_pending(self, sid):
+        """session是否有尚未合併的讀數"""
+        row = self._connect().execute('SELECT 1 FROM gauge_readings WHERE sid = ? LIMIT 1', (sid,)).fetchone()
+        return row is not None
+
+    def take_pending(self, sid):
+        """
+        取出session尚未合併的讀數
+
+        Returns:
+            dict: {項目位置: {數據點位置: 讀數}}
+        """
+        with self._transaction() as conn:
+            rows = conn.execute(
+                'SELECT item_index, slot, value FROM gauge_readings WHERE sid = ?', (sid,)
+            ).fetchall()
+            conn.execute('DELETE FROM gauge_readings WHERE sid = ?', (sid,))
+        pending = {}
+        for item_index, slot, value in rows:
+            pending.setdefault(item_index, {})[slot] = value
+        return pending
+
+    def start(self):
+        """
+        取得監聽鎖時啟動TCP監聽及序列埠讀取執行緒（在處理請求的程序中呼叫）
+        其他程序已在監聽時每LISTENER_RETRY秒重試一次
+        """
+        if self._listening or time.monotonic() < self._next_attempt or self._stopped.is_set():
+            return
+        with self._lock:
+            if self._listening or time.monotonic() < self._next_attempt:
+                return
+            if not self._listener_lock.try_acquire():
+                self._next_attempt = time.monotonic() + self.LISTENER_RETRY
+                return
+            self._listening = True
+
+        if self.tcp_address:
+            host, _, port = self.tcp_address.rpartition(':')
+            try:
+                self._tcp_server = _GaugeTCPServer((host or '127.0.0.1', int(port)), self)
+            except OSError as e:
+                logger.error("Cannot listen for gauges on %s: %s", self.tcp_address, e)
+            else:
+                threading.Thread(target=self._tcp_server.serve_forever, name='gauge-tcp', daemon=True).start()
+                logger.info("Listening for gauge readings on %s", self.tcp_address)
+
+        for station, port in self.serial_ports.items():
+            threading.Thread(target=self._read_serial, args=(station, port),
+                             name=f'gauge-{station}', daemon=True).start()
+
+        with self._transaction() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO gauge_listener (id, pid, tcp_address, started) VALUES (1, ?, ?, ?)',
+                (os.getpid(), self.tcp_address if self._tcp_server is not None else None, time.time())
+            )
+
+    def stop(self):
+        """停止所有讀取執行緒並釋放監聽鎖"""
+        self._stopped.set()
+        if self._tcp_server is not None:
+            self._tcp_server.shutdown()
+            self._tcp_server.server_close()
+        if self._listening:
+            self._listening = False
+            self._listener_lock.release()
+
+    def _read_serial(self, station, port):
+        """讀取序列埠（設備斷線時每5秒重新開啟）"""
+        try:
+            import serial
+        except ImportError:
+            logger.error("pyserial is required to read gauge %s on %s (pip install pyserial)", station, port)
+            return
+
+        while not self._stopped.is_set():
+            try:
+                with serial.Serial(port, self.baudrate, timeout=1) as device:
+                    logger.info("Reading gauge %s on %s", station, port)
+                    while not self._stopped.is_set():
+                        raw = device.readline()
+                        if raw:
+                            value = parse_reading(raw.decode('ascii', errors='replace'))
+                            if value is not None:
+                                self.add_reading(station, value)
+            except (OSError, serial.SerialException) as e:
+                logger.warning("Gauge %s on %s unavailable: %s", station, port, e)
+                self._stopped.wait(5)
+
+    def get_status(self):
+        """
+        獲取綁定及讀數統計（所有工作程序合計）
+
+        Returns:
+            dict: stations（工作站、項目位置、數據點位置、項目數）、讀數統計及監聽的程序
+        """
+        conn = self._connect()
+        status = {'readings': 0, 'routed': 0, 'unrouted': 0, 'dropped': 0}
+        status.update(conn.execute('SELECT name, value FROM gauge_stats').fetchall())
+        status['stations'] = [
+            {'station': station, 'item_index': item_index, 'slot': slot, 'item_count': item_count}
+            for station, item_index, slot, item_count in conn.execute(
+                'SELECT station, item_index, slot, item_count FROM gauge_bindings ORDER BY station'
+            )
+        ]
+        status['pending_sessions'] = conn.execute('SELECT COUNT(DISTINCT sid) FROM gauge_readings').fetchone()[0]
+        listener = conn.execute('SELECT pid, tcp_address FROM gauge_listener WHERE id = 1').fetchone()
+        status['listener_pid'] = listener[0] if listener else None
+        status['tcp_address'] = listener[1] if listener else None
+        status['listening'] = self._listening
+        status['serial_ports'] = self.serial_ports
+        return status
+
+class _GaugeTCPHandler(socketserver.StreamRequestHandler):
+    """一個設備連線：每行一個讀數，STATION行設定之後讀數的工作站"""
+
+    def handle(self):
+        station = 'tcp'
+        for raw in self.rfile:
+            line = raw.decode('ascii', errors='replace').strip()
+            if not line:
+                continue
+            if line.upper().startswith('STATION '):
+                station = line[8:].strip()
+                continue
+            self.server.ingestor.feed_line(line, station)
+
+class _GaugeTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, ingestor):
+        self.ingestor = ingestor
+        super().__init__(address, _GaugeTCPHandler)
+
+def simulate(host, port, station, count=DATAPOINT_COUNT, median=10.0, sigma=0.01, interval=0.5, seed=None):
+    """
+    模擬量測設備：連線到TCP監聽位址並送出常態分布的讀數
+
+    Args:
+        host (str): 主機
+        port (int): 埠號
+        station (str): 工作站名稱
+        count (int): 讀數數量
+        median (float): 平均值
+        sigma (float): 標準差
+        interval (float): 讀數間隔（秒）
+        seed (int): 隨機種子
+    """
+    rng = random.Random(seed)
+    with socket.create_connection((host, port)) as connection:
+        connection.sendall(f'STATION {station}\n'.encode('ascii'))
+        for _ in range(count):
+            connection.sendall(f'{rng.gauss(median, sigma):+.3f}\n'.encode('ascii'))
+            time.sleep(interval)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Simulate a gauge sending readings to the OIR gauge listener.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--station', default='caliper-1')
+    parser.add_argument('--count', type=int, default=DATAPOINT_COUNT)
+    parser.add_argument('--median', type=float, default=10.0)
+    parser.add_argument('--sigma', type=float, default=0.01)
+    parser.add_argument('--interval', type=float, default=0.5, help='seconds between readings')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args(argv)
+    simulate(args.host, args.port, args.station, args.count, args.median, args.sigma, args.interval, args.seed)
+
+if __name__ == '__main__':
+    main()
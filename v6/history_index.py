@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+歷史數據搜尋索引模組
+以排序日期索引及欄位索引回答歷史查詢，避免每次搜尋都逐行掃描
+"""
+
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+def _trigrams(text):
+    """獲取字串的所有三字元片段"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def _parse_date(value):
+    """
+    將日期值轉換為YYYY-MM-DD字串
+
+    Returns:
+        str: 日期字串，無法解析則返回None
+    """
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d')
+    try:
+        return datetime.strptime(str(value), '%Y-%m-%d').strftime('%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None
+
+class SubstringColumn:
+    """
+    部分匹配欄位索引
+    每個不同的值只保存一次小寫形式，並以三字元片段(trigram)索引，
+    查詢時只需檢查候選值而不是每一行
+    """
+
+    def __init__(self):
+        self.postings = {}  # 小寫值 -> 行號列表
+        self.grams = {}     # trigram -> 小寫值集合
+
+    def add(self, row_id, value):
+        """
+        加入一行的欄位值
+
+        Args:
+            row_id (int): 行號
+            value: 欄位值
+        """
+        lower_value = str(value).lower()
+        rows = self.postings.get(lower_value)
+        if rows is None:
+            rows = self.postings[lower_value] = []
+            for gram in _trigrams(lower_value):
+                self.grams.setdefault(gram, set()).add(lower_value)
+        rows.append(row_id)
+
+    def copy(self):
+        """複製欄位索引（行號列表及trigram集合都會複製）"""
+        column = SubstringColumn()
+        column.postings = {value: list(rows) for value, rows in self.postings.items()}
+        column.grams = {gram: set(values) for gram, values in self.grams.items()}
+        return column
+
+    def match(self, text):
+        """
+        查詢包含指定文字（不分大小寫）的行
+
+        Args:
+            text (str): 搜尋文字
+
+        Returns:
+            set: 符合的行號集合
+        """
+        query = text.lower()
+        if len(query) >= 3:
+            gram_sets = sorted((self.grams.get(gram, set()) for gram in _trigrams(query)), key=len)
+            candidates = set(gram_sets[0]).intersection(*gram_sets[1:])
+        else:
+            candidates = self.postings.keys()
+
+        result = set()
+        for lower_value in candidates:
+            if query in lower_value:
+                result.update(self.postings[lower_value])
+        return result
+
+class HistorySearchIndex:
+    """
+    歷史數據搜尋索引
+    記錄依加入順序編號，日期範圍以二分搜尋回答，型號及批號以trigram索引作部分匹配，
+    操作員為完全匹配。儲存後端新增記錄時以sync()增量更新。
+    """
+
+    def __init__(self):
+        self.records = []
+        self.cursor = None  # 儲存後端的讀取位置
+        self._dates = []      # 排序的日期字串
+        self._date_rows = []  # 與_dates對應的行號
+        self._undated = []    # 日期無法解析的行（不受日期條件限制）
+        self._model = SubstringColumn()
+        self._lot = SubstringColumn()
+        self._operator = {}
+        self._by_id = {}  # 記錄ID -> 行號
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getstate__(self):
+        """索引快照的狀態（在鎖內複製，避免保存時與同步互相影響）"""
+        with self._lock:
+            return {
+                'records': list(self.records),
+                'cursor': self.cursor,
+                'dates': list(self._dates),
+                'date_rows': list(self._date_rows),
+                'undated': list(self._undated),
+                'model': self._model.copy(),
+                'lot': self._lot.copy(),
+                'operator': {key: list(rows) for key, rows in self._operator.items()},
+                'by_id': dict(self._by_id),
+            }
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.records = state['records']
+        self.cursor = state['cursor']
+        self._dates = state['dates']
+        self._date_rows = state['date_rows']
+        self._undated = state['undated']
+        self._model = state['model']
+        self._lot = state['lot']
+        self._operator = state['operator']
+        self._by_id = state['by_id']
+
+    def add(self, record):
+        """
+        加入一筆歷史記錄
+
+        Args:
+            record (dict): 歷史記錄（鍵值與database工作表標題相同）
+        """
+        with self._lock:
+            row_id = len(self.records)
+            self.records.append(record)
+
+            date = _parse_date(record.get('Date'))
+            if date is None:
+                self._undated.append(row_id)
+            elif not self._dates or date >= self._dates[-1]:
+                # 新記錄通常是最新日期，直接附加
+                self._dates.append(date)
+                self._date_rows.append(row_id)
+            else:
+                position = bisect_right(self._dates, date)
+                self._dates.insert(position, date)
+                self._date_rows.insert(position, row_id)
+
+            self._model.add(row_id, record.get('Model No.', ''))
+            self._lot.add(row_id, record.get('Lot No.', ''))
+            self._operator.setdefault(record.get('Operator'), []).append(row_id)
+            if record.get('ID') is not None:
+                self._by_id[record['ID']] = row_id
+
+    def sync(self, backend):
+        """
+        從儲存後端載入上次同步後新增的記錄
+
+        Args:
+            backend (StorageBackend): 儲存後端
+        
+        Returns:
+            list: 新增的記錄列表
+        """
+        with self._lock:
+            records, self.cursor = backend.load_history(self.cursor)
+            for record in records:
+                self.add(record)
+            return records
+
+    def _date_range(self, date_from, date_to):
+        """
+        以二分搜尋獲取日期範圍內的行號
+
+        Returns:
+            set: 行號集合，沒有日期條件則返回None
+        """
+        date_from = _parse_date(date_from) if date_from else None
+        date_to = _parse_date(date_to) if date_to else None
+        if date_from is None and date_to is None:
+            return None
+
+        start = bisect_left(self._dates, date_from) if date_from else 0
+        end = bisect_right(self._dates, date_to) if date_to else len(self._dates)
+        rows = set(self._date_rows[start:end])
+        rows.update(self._undated)
+        return rows
+
+    def _match_rows(self, filters):
+        """
+        獲取符合搜尋條件的行號
+
+        Returns:
+            list: 排序後的行號列表，沒有任何條件則返回None（表示全部）
+        """
+        candidates = []
+
+        date_rows = self._date_range(filters.get('date_from'), filters.get('date_to'))
+        if date_rows is not None:
+            candidates.append(date_rows)
+        if filters.get('model_no'):
+            candidates.append(self._model.match(filters['model_no']))
+        if filters.get('lot_no'):
+            candidates.append(self._lot.match(filters['lot_no']))
+        if filters.get('operator'):
+            candidates.append(set(self._operator.get(filters['operator'], [])))
+
+        if not candidates:
+            return None
+
+        # 從最小的候選集合開始取交集
+        candidates.sort(key=len)
+        return sorted(candidates[0].intersection(*candidates[1:]))
+
+    def search(self, filters):
+        """
+        搜尋歷史數據
+
+        Args:
+            filters (dict): 搜尋條件
+                - date_from: 起始日期
+                - date_to: 結束日期
+                - model_no: 型號（部分匹配）
+                - lot_no: 批號（部分匹配）
+                - operator: 操作員（完全匹配）
+
+        Returns:
+            list: 搜尋結果列表，依記錄加入順序排列
+        """
+        with self._lock:
+            rows = self._match_rows(filters)
+            if rows is None:
+                return [dict(record) for record in self.records]
+            return [dict(self.records[row_id]) for row_id in rows]
+
+    def search_page(self, filters, offset=0, limit=50):
+        """
+        分頁搜尋歷史數據，只複製目前頁面的記錄
+        結果依記錄加入順序由新到舊排列，第一頁為最新的記錄
+
+        Args:
+            filters (dict): 搜尋條件（同search）
+            offset (int): 起始位置（由最新的記錄算起）
+            limit (int): 每頁記錄數
+
+        Returns:
+            tuple: (符合條件的總數, 目前頁面的記錄列表)
+        """
+        with self._lock:
+            rows = self._match_rows(filters)
+            total = len(self.records) if rows is None else len(rows)
+            end = max(total - offset, 0)
+            start = max(end - limit, 0)
+            page = range(start, end) if rows is None else rows[start:end]
+            return total, [dict(self.records[row_id]) for row_id in reversed(page)]
+
+    def get_records(self, record_ids):
+        """
+        根據記錄ID獲取記錄
+
+        Args:
+            record_ids (list): 記錄ID列表
+
+        Returns:
+            list: 記錄列表，依傳入順序排列，找不到的ID會被略過
+        """
+        with self._lock:
+            return [
+                dict(self.records[self._by_id[record_id]])
+                for record_id in record_ids if record_id in self._by_id
+            ]
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+檢驗數據統計模組
+將報告項目或歷史記錄轉換為二維NumPy陣列（缺少的數據點為NaN），
+一次向量化計算每個項目的平均值、最小/最大值、標準差、超出規格數量、Cp/Cpk及接受/拒收判定
+"""
+
+import warnings
+
+import numpy as np
+
+# 每個項目的數據點數量
+DATAPOINT_COUNT = 10
+
+# Excel報告Result欄位使用的標記
+RESULT_MARK = '✓'
+
+def _to_float(value):
+    """
+    將數據點或規格值轉換為浮點數
+
+    Returns:
+        float: 數值，空值或非數字則返回NaN
+    """
+    if value is None or value == '' or isinstance(value, bool):
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+def datapoint_matrix(items):
+    """
+    將報告項目轉換為數據點陣列及規格界限
+
+    Args:
+        items (list): 項目列表，每個項目包含 datapoints, min_limit, max_limit
+
+    Returns:
+        tuple: (數據點陣列 shape=(項目數, 10), 下限陣列, 上限陣列)
+    """
+    values = np.full((len(items), DATAPOINT_COUNT), np.nan)
+    lower = np.full(len(items), np.nan)
+    upper = np.full(len(items), np.nan)
+
+    for row, item in enumerate(items):
+        datapoints = item.get('datapoints') or []
+        values[row, :len(datapoints[:DATAPOINT_COUNT])] = [_to_float(dp) for dp in datapoints[:DATAPOINT_COUNT]]
+        lower[row] = _to_float(item.get('min_limit'))
+        upper[row] = _to_float(item.get('max_limit'))
+
+    return values, lower, upper
+
+def history_matrix(records, limits=None):
+    """
+    將歷史記錄轉換為數據點陣列及規格界限
+
+    Args:
+        records (list): search_history_data返回的記錄（Datapoint_1 ~ Datapoint_10）
+        limits (dict): (OIS編號, 項目) -> (下限, 上限)，找不到的項目不判定
+
+    Returns:
+        tuple: (數據點陣列 shape=(記錄數, 10), 下限陣列, 上限陣列)
+    """
+    limits = limits or {}
+    keys = [f'Datapoint_{j}' for j in range(1, DATAPOINT_COUNT + 1)]
+    rows = [[record.get(key) for key in keys] for record in records]
+    try:
+        # NumPy直接將None轉換為NaN；含有非數字字串時才逐一轉換
+        values = np.array(rows, dtype=float)
+    except (TypeError, ValueError):
+        values = np.array([[_to_float(value) for value in row] for row in rows], dtype=float)
+    values = values.reshape(len(records), DATAPOINT_COUNT)
+
+    bounds = [limits.get((str(record.get('OIS No.')), str(record.get('Item'))), (None, None)) for record in records]
+    lower = np.array([_to_float(low) for low, _ in bounds], dtype=float)
+    upper = np.array([_to_float(high) for _, high in bounds], dtype=float)
+    return values, lower, upper
+
+def compute_statistics(values, lower, upper):
+    """
+    向量化計算每一行的統計值
+
+    Args:
+        values (ndarray): 數據點陣列 shape=(n, k)，缺少的數據點為NaN
+        lower (ndarray): 每一行的規格下限，NaN表示沒有下限
+        upper (ndarray): 每一行的規格上限，NaN表示沒有上限
+
+    Returns:
+        dict: 每個鍵對應長度為n的陣列
+            - count: 有效數據點數量
+            - mean, min, max, range, std: 統計值（std為樣本標準差，少於2點為NaN）
+            - below, above, out_of_spec: 低於下限、高於上限及超出規格的數量
+            - cp, cpk: 製程能力指數（缺少界限或標準差為0時為NaN）
+            - judged: 是否可以判定（有數據且至少有一個規格界限）
+            - accept: 可判定且沒有超出規格的數據點
+    """
+    values = np.asarray(values, dtype=float)
+    lower = np.asarray(lower, dtype=float)
+    upper = np.asarray(upper, dtype=float)
+
+    valid = ~np.isnan(values)
+    count = valid.sum(axis=1)
+
+    # 沒有數據的行會產生 "Mean of empty slice" 等警告，結果為NaN即可
+    with warnings.catch_warnings(), np.errstate(invalid='ignore', divide='ignore'):
+        warnings.simplefilter('ignore', RuntimeWarning)
+        mean = np.nanmean(values, axis=1)
+        minimum = np.nanmin(values, axis=1)
+        maximum = np.nanmax(values, axis=1)
+        std = np.where(count >= 2, np.nanstd(values, axis=1, ddof=1), np.nan)
+
+        below = (values < lower[:, None]).sum(axis=1)
+        above = (values > upper[:, None]).sum(axis=1)
+
+        cp = (upper - lower) / (6 * std)
+        cpu = (upper - mean) / (3 * std)
+        cpl = (mean - lower) / (3 * std)
+        # 單邊規格時Cpk只使用存在的一邊
+        cpk = np.fmin(cpu, cpl)
+        cp = np.where(np.isfinite(cp), cp, np.nan)
+        cpk = np.where(np.isfinite(cpk), cpk, np.nan)
+
+    out_of_spec = below + above
+    judged = (count > 0) & ~(np.isnan(lower) & np.isnan(upper))
+
+    return {
+        'count': count,
+        'mean': mean,
+        'min': minimum,
+        'max': maximum,
+        'range': maximum - minimum,
+        'std': std,
+        'below': below,
+        'above': above,
+        'out_of_spec': out_of_spec,
+        'cp': cp,
+        'cpk': cpk,
+        'judged': judged,
+        'accept': judged & (out_of_spec == 0),
+    }
+
+def statistics_rows(stats):
+    """
+    將compute_statistics的結果轉換為每行一個字典（Python數值，NaN為None）
+
+    Args:
+        stats (dict): compute_statistics的結果
+
+    Returns:
+        list: 每行的統計字典
+    """
+    keys = list(stats.keys())
+    # tolist()已轉換為Python數值，只需將NaN（不等於自身）轉換為None
+    columns = [stats[key].tolist() for key in keys]
+    return [
+        {key: None if value != value else value for key, value in zip(keys, row)}
+        for row in zip(*columns)
+    ]
+
+def item_statistics(items):
+    """
+    計算報告項目的統計值
+
+    Args:
+        items (list): 項目列表（report_data['items_data']的值）
+
+    Returns:
+        list: 每個項目的統計字典，依傳入順序排列
+    """
+    return statistics_rows(compute_statistics(*datapoint_matrix(items)))
+
+def history_statistics(records, limits=None):
+    """
+    計算歷史記錄的統計值（可一次處理數千個批次的記錄）
+
+    Args:
+        records (list): 歷史記錄列表
+        limits (dict): (OIS編號, 項目) -> (下限, 上限)
+
+    Returns:
+        list: 每筆記錄的統計字典，依傳入順序排列
+    """
+    return statistics_rows(compute_statistics(*history_matrix(records, limits)))
+
+def with_results(items):
+    """
+    為每個項目加上Excel報告Result欄位(M/N)的值
+
+    Args:
+        items (list): 項目列表
+
+    Returns:
+        list: 新的項目列表，每個項目加上 accept / reject（已有判定的項目保持不變）
+    """
+    stats = compute_statistics(*datapoint_matrix(items))
+    results = []
+    for item, judged, accept in zip(items, stats['judged'].tolist(), stats['accept'].tolist()):
+        if 'accept' in item or 'reject' in item or not judged:
+            results.append(item)
+        else:
+            results.append(dict(item, accept=RESULT_MARK if accept else None, reject=None if accept else RESULT_MARK))
+    return results
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+臨時檔案清理模組
+以單一背景執行緒及到期時間堆積(heap)管理生成的報告及session備份檔案的過期刪除，
+取代每個檔案各自啟動一個等待中的執行緒
+"""
+
+import fnmatch
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class Janitor:
+    """
+    臨時檔案清理器
+    每個檔案以 (到期時間, 路徑) 放入堆積，執行緒只等待最早的到期時間；
+    到期時若檔案在期間被更新（修改時間較新），則依新的修改時間重新排程而不刪除
+    """
+
+    def __init__(self, rescan_interval=3600):
+        """
+        初始化清理器
+
+        Args:
+            rescan_interval (int): 重新掃描監看目錄的間隔（秒），用於發現其他程序建立的檔案
+        """
+        self.rescan_interval = rescan_interval
+        self._heap = []
+        self._scheduled = {}  # 路徑 -> 目前有效的到期時間
+        self._rules = []      # (目錄, 檔名模式, 保存時間, 類別, 是否包含子目錄)
+        self._stats = {}      # 類別 -> {'files_removed': 數量, 'bytes_reclaimed': 位元組}
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        self._next_rescan = None
+        # 預先載入的伺服器在fork之前建立清理器，子程序需要自己的執行緒
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        """fork之後在子程序中重新建立條件變數，並重新啟動原本在執行的背景執行緒"""
+        self._condition = threading.Condition()
+        running = self._thread is not None and not self._stopped
+        self._thread = None
+        if running:
+            self.start()
+
+    def watch(self, directory, pattern, ttl, category, recursive=False):
+        """
+        監看目錄中符合模式的檔案，檔案修改後超過保存時間即刪除
+
+        Args:
+            directory (str): 目錄路徑
+            pattern (str): 檔名模式（如 'session_*.json'）
+            ttl (float): 保存時間（秒）
+            category (str): 統計類別
+            recursive (bool): 是否包含子目錄
+        """
+        rule = (directory, pattern, ttl, category, recursive)
+        with self._condition:
+            self._rules.append(rule)
+            self._stats.setdefault(category, {'files_removed': 0, 'bytes_reclaimed': 0})
+        self._scan(rule)
+
+    def schedule(self, path, ttl, category):
+        """
+        排程刪除單一檔案
+
+        Args:
+            path (str): 檔案路徑
+            ttl (float): 從檔案最後修改時間起算的保存時間（秒）
+            category (str): 統計類別
+        """
+        try:
+            deadline = os.path.getmtime(path) + ttl
+        except OSError:
+            return
+
+        with self._condition:
+            self._stats.setdefault(category, {'files_removed': 0, 'bytes_reclaimed': 0})
+            current = self._scheduled.get(path)
+            # 已排程的檔案到期時會依修改時間重新排程，只有更早的到期時間需要加入
+            if current is not None and current <= deadline:
+                return
+            self._push(deadline, path, ttl, category)
+            self._condition.notify()
+
+    def _push(self, deadline, path, ttl, category):
+        """將檔案加入堆積（呼叫前需持有鎖）"""
+        self._scheduled[path] = deadline
+        heapq.heappush(self._heap, (deadline, next(self._counter), path, ttl, category))
+
+    def _scan(self, rule):
+        """掃描監看目錄並排程所有符合的檔案"""
+        directory, pattern, ttl, category, recursive = rule
+        if not os.path.isdir(directory):
+            return
+
+        try:
+            if recursive:
+                paths = [
+                    os.path.join(root, name)
+                    for root, _, files in os.walk(directory)
+                    for name in fnmatch.filter(files, pattern)
+                ]
+            else:
+                paths = [os.path.join(directory, name) for name in fnmatch.filter(os.listdir(directory), pattern)]
+        except OSError as e:
+            logger.error("Error scanning %s: %s", directory, e)
+            return
+
+        for path in paths:
+            self.schedule(path, ttl, category)
+
+    def run_pending(self, now=None):
+        """
+        處理所有已到期的檔案
+
+        Args:
+            now (float): 目前時間（預設為time.time()）
+
+        Returns:
+            int: 刪除的檔案數量
+        """
+        now = time.time() if now is None else now
+        removed = 0
+
+        while True:
+            with self._condition:
+                if not self._heap or self._heap[0][0] > now:
+                    break
+                deadline, _, path, ttl, category = heapq.heappop(self._heap)
+                if self._scheduled.get(path) != deadline:
+                    continue  # 已被較早的到期時間取代
+                del self._scheduled[path]
+
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue  # 檔案已被其他程式刪除
+
+                # 檔案在期間被更新，依新的修改時間重新排程
+                if stat.st_mtime + ttl > now:
+                    self._push(stat.st_mtime + ttl, path, ttl, category)
+                    continue
+
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.error("Error removing expired file %s: %s", path, e)
+                continue
+
+            with self._condition:
+                stats = self._stats[category]
+                stats['files_removed'] += 1
+                stats['bytes_reclaimed'] += stat.st_size
+            removed += 1
+
+        return removed
+
+    def _run(self):
+        """背景執行緒：等待最早的到期時間或下次重新掃描"""
+        self._next_rescan = time.time() + self.rescan_interval
+        while True:
+            with self._condition:
+                if self._stopped:
+                    return
+                wake_at = self._next_rescan
+                if self._heap:
+                    wake_at = min(wake_at, self._heap[0][0])
+                timeout = wake_at - time.time()
+                if timeout > 0:
+                    self._condition.wait(timeout)
+                if self._stopped:
+                    return
+
+            try:
+                self.run_pending()
+                if time.time() >= self._next_rescan:
+                    self._next_rescan = time.time() + self.rescan_interval
+                    with self._condition:
+                        rules = list(self._rules)
+                    for rule in rules:
+                        self._scan(rule)
+            except Exception as e:
+                logger.error("Error in janitor: %s", e)
+
+    def start(self):
+        """啟動背景執行緒（重複呼叫不會啟動多個執行緒）"""
+        with self._condition:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name='oir-janitor')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        """停止背景執行緒"""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def get_stats(self):
+        """
+        獲取清理統計
+
+        Returns:
+            dict: 排程中的檔案數量、下次到期時間，以及每個類別的刪除數量及釋放的位元組數
+        """
+        with self._condition:
+            categories = {category: dict(stats) for category, stats in self._stats.items()}
+            return {
+                'pending': len(self._scheduled),
+                'next_deadline': self._heap[0][0] if self._heap else None,
+                'files_removed': sum(stats['files_removed'] for stats in categories.values()),
+                'bytes_reclaimed': sum(stats['bytes_reclaimed'] for stats in categories.values()),
+                'categories': categories
+            }
@@ -207,6 +207,57 @@ LANGUAGES = {
     }
 }
 
+class TextTable(dict):
+    """
+    單一語言的文字表（已合併英文後備）
+    找不到的鍵返回鍵本身，模板可直接使用 table.__getitem__ 作為get_text
+    """
+
+    __slots__ = ()
+
+    def __missing__(self, key):
+        return key
+
+# 語言代碼 -> 名稱的文字鍵
+_LANGUAGE_NAME_KEYS = {
+    'en': 'english',
+    'zh-TW': 'traditional_chinese',
+    'zh-CN': 'simplified_chinese',
+}
+
+# 以下表格在載入模組時建立一次；修改LANGUAGES後需呼叫build_tables()
+TEXTS = {}
+LANGUAGE_NAMES = {}
+AVAILABLE_LANGUAGES = ()
+_TEMPLATE_CONTEXTS = {}
+
+def build_tables():
+    """
+    建立每個語言的合併文字表、語言名稱表及模板變數
+    （英文後備在此解析，查詢時只需一次字典查找）
+    """
+    global AVAILABLE_LANGUAGES
+
+    english = LANGUAGES['en']
+    TEXTS.clear()
+    TEXTS.update((lang, TextTable(english, **table)) for lang, table in LANGUAGES.items())
+    AVAILABLE_LANGUAGES = tuple(LANGUAGES)
+
+    LANGUAGE_NAMES.clear()
+    for lang, texts in TEXTS.items():
+        LANGUAGE_NAMES[lang] = TextTable(
+            (code, texts[key]) for code, key in _LANGUAGE_NAME_KEYS.items()
+        )
+
+    _TEMPLATE_CONTEXTS.clear()
+    for lang in AVAILABLE_LANGUAGES:
+        _TEMPLATE_CONTEXTS[lang] = {
+            'get_text': TEXTS[lang].__getitem__,
+            'current_lang': lang,
+            'available_languages': AVAILABLE_LANGUAGES,
+            'get_language_name': LANGUAGE_NAMES[lang].__getitem__,
+        }
+
 def get_text(key, lang='en'):
     """
     獲取指定語言的文字
@@ -218,21 +269,16 @@ def get_text(key, lang='en'):
     Returns:
         str: 對應語言的文字，如果找不到則返回英文版本
     """
-    if lang in LANGUAGES and key in LANGUAGES[lang]:
-        return LANGUAGES[lang][key]
-    elif key in LANGUAGES['en']:
-        return LANGUAGES['en'][key]
-    else:
-        return key
+    return TEXTS.get(lang, TEXTS['en'])[key]
 
 def get_available_languages():
     """
     獲取可用的語言列表
     
     Returns:
-        list: 語言代碼列表
+        tuple: 語言代碼
     """
-    return list(LANGUAGES.keys())
+    return AVAILABLE_LANGUAGES
 
 def get_language_name(lang_code, display_lang='en'):
     """
@@ -245,11 +291,18 @@ def get_language_name(lang_code, display_lang='en'):
     Returns:
         str: 語言顯示名稱
     """
-    lang_names = {
-        'en': get_text('english', display_lang),
-        'zh-TW': get_text('traditional_chinese', display_lang),
-        'zh-CN': get_text('simplified_chinese', display_lang)
-    }
+    return LANGUAGE_NAMES.get(display_lang, LANGUAGE_NAMES['en'])[lang_code]
+
+def get_template_context(lang='en'):
+    """
+    獲取模板變數（每個語言預先建立，請求之間共用，不可修改）
+    
+    Args:
+        lang (str): 語言代碼，不支援的語言使用英文
     
-    return lang_names.get(lang_code, lang_code)
+    Returns:
+        dict: get_text、current_lang、available_languages、get_language_name
+    """
+    return _TEMPLATE_CONTEXTS.get(lang) or _TEMPLATE_CONTEXTS['en']
 
+build_tables()
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+日誌設定模組
+請求執行緒只把日誌記錄放入佇列(QueueHandler)，由背景執行緒(QueueListener)格式化並寫入
+輪替的日誌檔案及標準錯誤輸出，日誌檔案的I/O延遲不會阻塞請求。
+
+記錄使用 %s 參數的延遲格式化，結構化欄位以 extra=fields(...) 傳入；
+被層級過濾的記錄（例如生產環境的DEBUG）不會格式化任何內容。各模組的層級可分別設定
+
+用法:
+    logger = logging.getLogger(__name__)
+    logger.info("Report generated: %s", filename, extra=fields(items=3, ois_no=ois_no))
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+
+TEXT_FORMAT = '%(asctime)s %(levelname)-7s %(name)s [%(threadName)s] %(message)s'
+
+_listener = None
+_queue_handler = None
+_lock = threading.Lock()
+
+def fields(**values):
+    """
+    結構化欄位（作為logging的extra參數）
+
+    Returns:
+        dict: {'fields': 欄位}
+    """
+    return {'fields': values}
+
+class StructuredFormatter(logging.Formatter):
+    """
+    結構化日誌格式
+    text: 一般格式後附加 key=value 欄位；json: 每行一個JSON物件
+    """
+
+    def __init__(self, style='text'):
+        super().__init__(TEXT_FORMAT)
+        self.json = style == 'json'
+
+    def format(self, record):
+        values = getattr(record, 'fields', None) or {}
+        if self.json:
+            entry = {
+                'time': self.formatTime(record),
+                'level': record.levelname,
+                'logger': record.name,
+                'thread': record.threadName,
+                'message': record.getMessage(),
+            }
+            entry.update(values)
+            if record.exc_info:
+                entry['exception'] = self.formatException(record.exc_info)
+            elif record.exc_text:
+                entry['exception'] = record.exc_text
+            return json.dumps(entry, ensure_ascii=False, default=str)
+
+        message = super().format(record)
+        if values:
+            message += ' ' + ' '.join(f'{key}={value!r}' for key, value in values.items())
+        return message
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    只在請求執行緒中合併訊息參數並複製欄位，格式化（時間、欄位、例外追蹤）由背景執行緒完成
+    """
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # 例外物件不能跨執行緒保留（traceback會引用請求的frame），先轉為文字
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        if getattr(record, 'fields', None):
+            record.fields = dict(record.fields)
+        return record
+
+def setup_logging(log_file=None, level='INFO', levels=None, max_bytes=10 * 1024 * 1024,
+                  backup_count=5, style='text', stream=True):
+    """
+    設定根日誌記錄器（同一程序只設定一次，之後呼叫只更新層級）
+
+    Args:
+        log_file (str): 輪替日誌檔案路徑，None則不寫入檔案
+        level (str): 根層級
+        levels (dict): 各模組的層級，例如 {'app': 'WARNING', 'storage': 'DEBUG'}
+        max_bytes (int): 日誌檔案輪替大小
+        backup_count (int): 保留的舊日誌檔案數量
+        style (str): 'text' 或 'json'
+        stream (bool): 是否同時輸出到標準錯誤
+
+    Returns:
+        QueueListener: 背景寫入器
+    """
+    global _listener, _queue_handler
+
+    with _lock:
+        root = logging.getLogger()
+        root.setLevel(level)
+        for name, module_level in (levels or {}).items():
+            logging.getLogger(name).setLevel(module_level)
+
+        if _listener is not None:
+            return _listener
+
+        formatter = StructuredFormatter(style)
+        handlers = []
+        if log_file:
+            os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+            file_handler = logging.handlers.RotatingFileHandler(
+                log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True
+            )
+            file_handler.setFormatter(formatter)
+            handlers.append(file_handler)
+        if stream:
+            stream_handler = logging.StreamHandler(sys.stderr)
+            stream_handler.setFormatter(formatter)
+            handlers.append(stream_handler)
+
+        # 取代basicConfig等先前設定的處理器，所有輸出都經過佇列
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        _queue_handler = _QueueHandler(queue.SimpleQueue())
+        root.addHandler(_queue_handler)
+
+        _listener = logging.handlers.QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_stop_listener)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=_restart_listener)
+        return _listener
+
+def _stop_listener():
+    """程式結束時寫出佇列中剩餘的記錄"""
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+def _restart_listener():
+    """fork後的子程序沒有背景寫入執行緒，以新的佇列重新啟動"""
+    if _listener is None:
+        return
+    new_queue = queue.SimpleQueue()
+    _queue_handler.queue = new_queue
+    _listener.queue = new_queue
+    _listener._thread = None
+    _listener.start()
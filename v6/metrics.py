@@ -0,0 +1,422 @@
+# -*- coding: utf-8 -*-
+"""
+效能量測模組
+記錄每個路由的延遲直方圖，並把請求時間拆分為工作簿載入/保存、報告生成、模板渲染、
+session序列化及臨時檔案I/O等區段(span)；可依比例抽樣以cProfile分析請求。
+結果以Prometheus文字格式（/metrics）及除錯頁面（/debug/metrics）呈現。
+
+統計值保存在各個程序的記憶體中，多工作程序部署時每個工作程序分別統計
+"""
+
+import cProfile
+import io
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# 直方圖上限（秒），最後一格為+Inf
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 區段名稱
+SPAN_WORKBOOK_LOAD = 'workbook_load'
+SPAN_WORKBOOK_SAVE = 'workbook_save'
+SPAN_REPORT_RENDER = 'report_render'
+SPAN_DATABASE_WRITE = 'database_write'
+SPAN_TEMPLATE_RENDER = 'template_render'
+SPAN_SESSION_LOAD = 'session_load'
+SPAN_SESSION_SAVE = 'session_save'
+SPAN_TEMP_IO = 'temp_io'
+
+# 請求以外（背景執行緒、命令列）的區段使用的路由標籤
+BACKGROUND_ROUTE = 'background'
+UNMATCHED_ROUTE = 'unmatched'
+
+class Histogram:
+    """固定上限的累計直方圖（Prometheus格式）"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        """
+        記錄一個觀測值
+
+        Args:
+            value (float): 秒數
+        """
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """
+        以直方圖估計分位數（格內線性內插，超過最後上限則返回最大值）
+
+        Args:
+            q (float): 0~1之間的分位
+
+        Returns:
+            float: 估計的秒數，沒有觀測值則返回None
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, self.counts):
+            if count and cumulative + count >= rank:
+                return min(lower + (bound - lower) * (rank - cumulative) / count, self.max)
+            cumulative += count
+            lower = bound
+        return self.max
+
+class _RequestState:
+    """目前請求的量測狀態（每個執行緒一份）"""
+
+    __slots__ = ('route', 'started', 'spans', 'profiler')
+
+    def __init__(self):
+        self.route = UNMATCHED_ROUTE
+        self.started = time.perf_counter()
+        self.spans = []  # (區段名稱, 秒數)，請求結束時才加上路由標籤
+        self.profiler = None
+
+class Metrics:
+    """
+    效能量測登錄區
+    請求的延遲以(路由, 方法)分組，區段以(路由, 區段名稱)分組；
+    請求內的區段先暫存，請求結束時以最終的路由標籤記錄
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, profile_rate=0.0, profile_keep=20):
+        """
+        初始化登錄區
+
+        Args:
+            buckets (tuple): 直方圖上限（秒）
+            profile_rate (float): 以cProfile分析的請求比例（0為停用）
+            profile_keep (int): 保留最近幾份分析結果
+        """
+        self.buckets = tuple(buckets)
+        self.profile_rate = profile_rate
+        self.started = time.time()
+        self._requests = {}  # (路由, 方法) -> Histogram
+        self._statuses = {}  # (路由, 方法, 狀態碼) -> 次數
+        self._spans = {}     # (路由, 區段名稱) -> Histogram
+        self._profiles = deque(maxlen=profile_keep)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # cProfile同一時間只分析一個請求
+        self._profile_lock = threading.Lock()
+
+    def begin_request(self):
+        """開始量測目前執行緒的請求（依抽樣比例啟動cProfile）"""
+        state = _RequestState()
+        if self.profile_rate and random.random() < self.profile_rate and self._profile_lock.acquire(blocking=False):
+            state.profiler = cProfile.Profile()
+            try:
+                state.profiler.enable()
+            except ValueError:
+                # 其他分析工具已在執行
+                state.profiler = None
+                self._profile_lock.release()
+        self._local.state = state
+
+    def set_route(self, route):
+        """設定目前請求的路由標籤（Flask的endpoint名稱）"""
+        state = getattr(self._local, 'state', None)
+        if state is not None and route:
+            state.route = route
+
+    def end_request(self, method, status):
+        """
+        結束目前請求的量測
+
+        Args:
+            method (str): HTTP方法
+            status (int): 回應狀態碼
+        """
+        state = getattr(self._local, 'state', None)
+        if state is None:
+            return
+        self._local.state = None
+        elapsed = time.perf_counter() - state.started
+
+        profile = None
+        if state.profiler is not None:
+            state.profiler.disable()
+            try:
+                profile = self._format_profile(state.profiler)
+            finally:
+                self._profile_lock.release()
+
+        with self._lock:
+            self._histogram(self._requests, (state.route, method)).observe(elapsed)
+            key = (state.route, method, status)
+            self._statuses[key] = self._statuses.get(key, 0) + 1
+            for name, seconds in state.spans:
+                self._histogram(self._spans, (state.route, name)).observe(seconds)
+            if profile is not None:
+                self._profiles.append({
+                    'time': time.time(),
+                    'route': state.route,
+                    'method': method,
+                    'status': status,
+                    'duration': elapsed,
+                    'stats': profile,
+                })
+
+    def _histogram(self, table, key):
+        """獲取或建立直方圖（呼叫前需持有鎖）"""
+        histogram = table.get(key)
+        if histogram is None:
+            histogram = table[key] = Histogram(self.buckets)
+        return histogram
+
+    @staticmethod
+    def _format_profile(profiler, limit=30):
+        """將cProfile結果格式化為依累計時間排序的文字"""
+        output = io.StringIO()
+        stats = pstats.Stats(profiler, stream=output)
+        stats.strip_dirs().sort_stats('cumulative').print_stats(limit)
+        return output.getvalue()
+
+    def record_span(self, name, seconds):
+        """
+        記錄一個區段的時間
+
+        Args:
+            name (str): 區段名稱
+            seconds (float): 秒數
+        """
+        state = getattr(self._local, 'state', None)
+        if state is not None:
+            state.spans.append((name, seconds))
+            return
+        with self._lock:
+            self._histogram(self._spans, (BACKGROUND_ROUTE, name)).observe(seconds)
+
+    @contextmanager
+    def span(self, name):
+        """
+        量測一個區段（用法: with metrics.span('workbook_save'): ...）
+
+        Args:
+            name (str): 區段名稱
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_span(name, time.perf_counter() - started)
+
+    def reset(self):
+        """清除所有統計值"""
+        with self._lock:
+            self._requests.clear()
+            self._statuses.clear()
+            self._spans.clear()
+            self._profiles.clear()
+            self.started = time.time()
+
+    def summary(self):
+        """
+        獲取統計摘要（除錯頁面使用）
+
+        Returns:
+            dict: routes（每個路由的次數、平均、p50/p95/p99、最大值及區段拆分）、profiles
+        """
+        with self._lock:
+            requests = {key: self._copy(histogram) for key, histogram in self._requests.items()}
+            spans = {key: self._copy(histogram) for key, histogram in self._spans.items()}
+            statuses = dict(self._statuses)
+            profiles = list(self._profiles)
+
+        routes = {}
+        for (route, method), histogram in requests.items():
+            routes[(route, method)] = {
+                'route': route,
+                'method': method,
+                'count': histogram.count,
+                'mean': histogram.sum / histogram.count,
+                'p50': histogram.quantile(0.5),
+                'p95': histogram.quantile(0.95),
+                'p99': histogram.quantile(0.99),
+                'max': histogram.max,
+                'statuses': {
+                    status: count for (r, m, status), count in sorted(statuses.items())
+                    if r == route and m == method
+                },
+                'spans': [],
+            }
+
+        # 區段的每請求平均時間（以該路由所有方法的請求數計算）
+        route_counts = {}
+        for (route, _), histogram in requests.items():
+            route_counts[route] = route_counts.get(route, 0) + histogram.count
+        span_rows = []
+        for (route, name), histogram in sorted(spans.items()):
+            span_rows.append({
+                'route': route,
+                'span': name,
+                'count': histogram.count,
+                'total': histogram.sum,
+                'per_request': histogram.sum / route_counts[route] if route_counts.get(route) else None,
+                'p95': histogram.quantile(0.95),
+                'max': histogram.max,
+            })
+            for key, row in routes.items():
+                if key[0] == route:
+                    row['spans'].append(span_rows[-1])
+
+        return {
+            'started': self.started,
+            'profile_rate': self.profile_rate,
+            'routes': sorted(routes.values(), key=lambda row: row['mean'] * row['count'], reverse=True),
+            'spans': span_rows,
+            'profiles': list(reversed(profiles)),
+        }
+
+    def _copy(self, histogram):
+        """複製直方圖（呼叫前需持有鎖）"""
+        copy = Histogram(histogram.buckets)
+        copy.counts = list(histogram.counts)
+        copy.sum = histogram.sum
+        copy.count = histogram.count
+        copy.max = histogram.max
+        return copy
+
+    def prometheus(self):
+        """
+        輸出Prometheus文字格式
+
+        Returns:
+            str: exposition格式的文字
+        """
+        with self._lock:
+            requests = sorted((key, self._copy(histogram)) for key, histogram in self._requests.items())
+            spans = sorted((key, self._copy(histogram)) for key, histogram in self._spans.items())
+            statuses = sorted(self._statuses.items())
+            profile_count = len(self._profiles)
+
+        lines = [
+            '# HELP oir_request_duration_seconds Request latency by route.',
+            '# TYPE oir_request_duration_seconds histogram',
+        ]
+        for (route, method), histogram in requests:
+            lines.extend(_histogram_lines('oir_request_duration_seconds', {'route': route, 'method': method}, histogram))
+
+        lines.append('# HELP oir_requests_total Requests by route and status code.')
+        lines.append('# TYPE oir_requests_total counter')
+        for (route, method, status), count in statuses:
+            lines.append(f"oir_requests_total{_labels({'route': route, 'method': method, 'status': status})} {count}")
+
+        lines.append('# HELP oir_span_duration_seconds Time spent in instrumented sections by route.')
+        lines.append('# TYPE oir_span_duration_seconds histogram')
+        for (route, name), histogram in spans:
+            lines.extend(_histogram_lines('oir_span_duration_seconds', {'route': route, 'span': name}, histogram))
+
+        lines.append('# HELP oir_profiles_retained Sampled request profiles currently retained.')
+        lines.append('# TYPE oir_profiles_retained gauge')
+        lines.append(f'oir_profiles_retained {profile_count}')
+        lines.append('# HELP oir_metrics_start_time_seconds Time the statistics were last reset.')
+        lines.append('# TYPE oir_metrics_start_time_seconds gauge')
+        lines.append(f'oir_metrics_start_time_seconds {self.started:.3f}')
+        return '\n'.join(lines) + '\n'
+
+def _escape(value):
+    """跳脫Prometheus標籤值"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(labels):
+    """格式化標籤 {a="1",b="2"}"""
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+def _histogram_lines(name, labels, histogram):
+    """直方圖的 _bucket / _sum / _count 行"""
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        lines.append(f"{name}_bucket{_labels(dict(labels, le=repr(float(bound))))} {cumulative}")
+    lines.append(f"{name}_bucket{_labels(dict(labels, le='+Inf'))} {histogram.count}")
+    lines.append(f"{name}_sum{_labels(labels)} {histogram.sum:.6f}")
+    lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+    return lines
+
+# 程序內共用的登錄區，各模組以 span() 記錄區段
+metrics = Metrics()
+
+def span(name):
+    """量測一個區段（metrics.span的捷徑）"""
+    return metrics.span(name)
+
+class MetricsMiddleware:
+    """
+    WSGI中介層
+    包住整個Flask應用，session載入/保存及錯誤處理也計入請求時間
+    """
+
+    def __init__(self, wsgi_app, registry=None):
+        self.wsgi_app = wsgi_app
+        self.registry = registry or metrics
+
+    def __call__(self, environ, start_response):
+        status = []
+
+        def capture_start_response(status_line, headers, exc_info=None):
+            status[:] = [status_line]
+            return start_response(status_line, headers, exc_info)
+
+        self.registry.begin_request()
+        try:
+            return self.wsgi_app(environ, capture_start_response)
+        finally:
+            code = int(status[0].split(' ', 1)[0]) if status else 500
+            self.registry.end_request(environ.get('REQUEST_METHOD', 'GET'), code)
+
+def init_app(app, profile_rate=0.0):
+    """
+    在Flask應用上啟用量測
+
+    Args:
+        app (Flask): 應用程式
+        profile_rate (float): 以cProfile分析的請求比例（0~1）
+    """
+    from flask import before_render_template, template_rendered, request
+
+    metrics.profile_rate = profile_rate
+    app.wsgi_app = MetricsMiddleware(app.wsgi_app)
+
+    @app.before_request
+    def _metrics_route():
+        metrics.set_route(request.endpoint)
+
+    # 模板渲染時間（只計算最外層的render_template）
+    render_started = threading.local()
+
+    def on_before_render(sender, template, context, **extra):
+        render_started.value = time.perf_counter()
+
+    def on_rendered(sender, template, context, **extra):
+        started = getattr(render_started, 'value', None)
+        if started is not None:
+            render_started.value = None
+            metrics.record_span(SPAN_TEMPLATE_RENDER, time.perf_counter() - started)
+
+    before_render_template.connect(on_before_render, app, weak=False)
+    template_rendered.connect(on_rendered, app, weak=False)
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+頁面渲染快取模組
+只依語言（及少數參數）變化的頁面以 (模板, 語言, 參數) 為鍵保存渲染後的位元組及ETag，
+重複載入時直接返回快取內容，瀏覽器帶有相同ETag時返回304；
+含有使用者數據的頁面則快取固定的片段（導覽列、語言選單、步驟指示）
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from flask import has_request_context, make_response, request
+from jinja2 import pass_context
+from markupsafe import Markup
+
+class RenderCache:
+    """
+    渲染結果的LRU快取
+    頁面項目為 (內容位元組, ETag, 建立時間)，片段項目為已標記安全的HTML
+    """
+
+    def __init__(self, max_entries=256):
+        """
+        初始化快取
+
+        Args:
+            max_entries (int): 頁面及片段各自保留的最大項目數，0為停用
+        """
+        self.max_entries = max_entries
+        self._pages = OrderedDict()
+        self._fragments = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def _get(self, table, key):
+        """從LRU表獲取項目（找不到返回None）"""
+        with self._lock:
+            entry = table.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            table.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def _put(self, table, key, entry):
+        """放入LRU表，超過容量時移除最久未使用的項目"""
+        with self._lock:
+            table[key] = entry
+            table.move_to_end(key)
+            while len(table) > self.max_entries:
+                table.popitem(last=False)
+        return entry
+
+    def page(self, key, render):
+        """
+        返回快取的頁面回應，支援If-None-Match / If-Modified-Since條件請求
+
+        Args:
+            key (tuple): 快取鍵（模板名稱、語言及參數）
+            render (callable): 快取中沒有時呼叫，返回渲染後的HTML字串
+
+        Returns:
+            Response: 200（快取或新渲染的內容）或304
+        """
+        entry = self._get(self._pages, key)
+        if entry is None:
+            body = render().encode('utf-8')
+            entry = self._put(self._pages, key, (body, hashlib.sha1(body).hexdigest(), int(time.time())))
+
+        body, etag, created = entry
+        response = make_response(body)
+        response.set_etag(etag)
+        response.last_modified = created
+        # 語言保存在session，瀏覽器每次都需要以ETag重新驗證
+        response.cache_control.no_cache = True
+        response.vary.add('Cookie')
+        response = response.make_conditional(request)
+        if response.status_code == 304:
+            with self._lock:
+                self.not_modified += 1
+        return response
+
+    @pass_context
+    def fragment(self, context, template_name, **args):
+        """
+        模板函數：渲染並快取只依語言及參數變化的片段
+        用法: {{ cached_fragment('_navbar.html') }}、{{ cached_fragment('_step_indicator.html', step=2) }}
+
+        Args:
+            context: Jinja模板上下文（提供current_lang及get_text等變數）
+            template_name (str): 片段模板名稱
+            **args: 片段參數（必須可雜湊，並且是片段內容唯一的變化來源）
+
+        Returns:
+            Markup: 片段HTML
+        """
+        script_root = request.script_root if has_request_context() else ''
+        key = (template_name, context.get('current_lang'), script_root, tuple(sorted(args.items())))
+        if self.enabled:
+            entry = self._get(self._fragments, key)
+            if entry is not None:
+                return entry
+
+        variables = context.get_all()
+        variables.update(args)
+        html = Markup(context.environment.get_template(template_name).render(variables))
+        if self.enabled:
+            self._put(self._fragments, key, html)
+        return html
+
+    def clear(self):
+        """清除所有快取（模板或語言文字變更時）"""
+        with self._lock:
+            self._pages.clear()
+            self._fragments.clear()
+
+    def get_stats(self):
+        """
+        獲取快取統計
+
+        Returns:
+            dict: 項目數、命中、未命中及304次數
+        """
+        with self._lock:
+            return {
+                'pages': len(self._pages),
+                'fragments': len(self._fragments),
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+            }
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+報告存放區模組
+以內容雜湊(SHA-256)保存已生成的報告，相同內容只保存一份，
+並依總容量及保存時間淘汰舊報告，下載時不需共用的臨時檔案
+"""
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 報告ID格式（SHA-256十六進位字串）
+_REPORT_ID_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+class ReportStore:
+    """
+    內容定址的報告存放區
+    報告以 <目錄>/<ID前兩碼>/<ID>.xlsx 保存，寫入時先寫臨時檔再原子替換；
+    每次讀取會更新修改時間，超出容量時優先淘汰最久未使用的報告；
+    保存時只累加總容量，超出上限時才掃描目錄（過期報告由Janitor依修改時間刪除）
+    """
+
+    # 總容量每隔多少秒重新掃描一次（其他工作程序寫入的報告不會計入本程序的累計）
+    RESCAN_INTERVAL = 300
+    # 超出容量時淘汰到上限的此比例，之後的保存不需每次都掃描
+    EVICT_TARGET = 0.9
+
+    def __init__(self, directory, max_bytes=200 * 1024 * 1024, max_age=24 * 3600):
+        """
+        初始化報告存放區
+
+        Args:
+            directory (str): 存放目錄
+            max_bytes (int): 總容量上限（位元組），None表示不限制
+            max_age (int): 報告保存時間（秒），None表示不限制
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._total_bytes = None  # 目前的總容量，None表示需要重新掃描
+        self._rescan_at = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, report_id):
+        """獲取報告ID對應的檔案路徑"""
+        return os.path.join(self.directory, report_id[:2], f"{report_id}.xlsx")
+
+    def put(self, report_bytes):
+        """
+        保存報告
+
+        Args:
+            report_bytes (bytes): xlsx檔案內容
+
+        Returns:
+            str: 報告ID，保存失敗則返回None
+        """
+        report_id = hashlib.sha256(report_bytes).hexdigest()
+        path = self._path(report_id)
+
+        try:
+            if os.path.exists(path):
+                os.utime(path)
+                return report_id
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(report_bytes)
+                os.replace(temp_path, path)
+            except Exception:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+
+            with self._lock:
+                if self._total_bytes is not None:
+                    self._total_bytes += len(report_bytes)
+                needs_eviction = (
+                    self._total_bytes is None or time.monotonic() >= self._rescan_at
+                    or (self.max_bytes is not None and self._total_bytes > self.max_bytes)
+                )
+            if needs_eviction:
+                self.evict()
+            return report_id
+
+        except Exception as e:
+            logger.error("Error storing report: %s", e)
+            return None
+
+    def get_path(self, report_id):
+        """
+        獲取報告檔案路徑
+
+        Args:
+            report_id (str): 報告ID
+
+        Returns:
+            str: 檔案路徑，報告不存在或已過期則返回None
+        """
+        if not report_id or not _REPORT_ID_PATTERN.match(report_id):
+            return None
+
+        path = self._path(report_id)
+        try:
+            if self.max_age is not None and time.time() - os.path.getmtime(path) > self.max_age:
+                return None
+            os.utime(path)
+            return path
+        except OSError:
+            return None
+
+    def get(self, report_id):
+        """
+        讀取報告內容
+
+        Args:
+            report_id (str): 報告ID
+
+        Returns:
+            bytes: xlsx檔案內容，報告不存在或已過期則返回None
+        """
+        path = self.get_path(report_id)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _entries(self):
+        """列出所有報告 (修改時間, 大小, 路徑)"""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.xlsx'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self):
+        """
+        淘汰過期報告，並在超出容量時由最久未使用的報告開始刪除（直到容量上限的EVICT_TARGET）
+
+        Returns:
+            tuple: (刪除的報告數量, 釋放的位元組數)
+        """
+        removed = 0
+        reclaimed = 0
+
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            cutoff = time.time() - self.max_age if self.max_age is not None else None
+            limit = self.max_bytes
+            if limit is not None and total > limit:
+                limit *= self.EVICT_TARGET
+
+            for mtime, size, path in entries:
+                expired = cutoff is not None and mtime < cutoff
+                over_size = limit is not None and total > limit
+                if not expired and not over_size:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+                reclaimed += size
+
+            self._total_bytes = total
+            self._rescan_at = time.monotonic() + self.RESCAN_INTERVAL
+
+        return removed, reclaimed
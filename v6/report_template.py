@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+報告模板快取模組
+將OIR_Report_Sample_v2.xlsx解析一次並保存在記憶體中，
+每份報告只需修改工作表XML中的儲存格，不必複製模板檔案或重新解析工作簿
+"""
+
+import io
+import math
+import numbers
+import re
+import threading
+import zipfile
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+import numpy as np
+from openpyxl import load_workbook
+from openpyxl.utils import column_index_from_string, get_column_letter
+
+from metrics import span, SPAN_WORKBOOK_LOAD, SPAN_WORKBOOK_SAVE
+from storage import file_signature
+from xlsx_reader import find_sheet_part
+
+# 工作表XML中的儲存格元素（空儲存格或含內容的儲存格）
+_CELL_PATTERN = re.compile(
+    rb'<c r="(?P<ref>[A-Z]+[0-9]+)"(?P<attrs>[^>]*?)(?:/>|>.*?</c>)', re.S
+)
+_STYLE_PATTERN = re.compile(rb'\ss="[0-9]+"')
+_MERGE_PATTERN = re.compile(rb'<mergeCell ref="([A-Z]+)([0-9]+):([A-Z]+)([0-9]+)"/>')
+# XML 1.0 不允許的控制字元
+_ILLEGAL_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+def report_cells(data):
+    """
+    將報告數據轉換為模板中要填寫的儲存格
+
+    Args:
+        data (dict): 報告數據（格式見DatabaseManager.create_report_excel）
+
+    Returns:
+        dict: 儲存格位置 -> 值（None表示保持空白）
+    """
+    cells = {
+        # 基本資訊 - 根據確切的儲存格位置
+        'D3': data.get('model_no', ''),                # Model No.
+        'D4': data.get('order_no', ''),                # Order No.
+        'D5': data.get('shipment_size', ''),           # Shipment Size
+        'D6': data.get('lot_no', ''),                  # Lot No.
+        'K3': datetime.now().strftime('%Y-%m-%d'),     # Today's Date
+        'K4': data.get('inspector', ''),               # Inspected By
+        'K5': data.get('location', ''),                # Location
+        'K6': data.get('ois_no', ''),                  # OIS No.
+    }
+
+    # 檢驗數據 - 從第9行開始，數據從C欄到L欄
+    for i, item_data in enumerate(data.get('items', [])):
+        row = 9 + i
+        cells[f'A{row}'] = item_data.get('item', i + 1)  # Item No.
+
+        datapoints = item_data.get('datapoints', [])
+        for j, datapoint in enumerate(datapoints[:10]):
+            if datapoint is not None:
+                cells[f'{chr(ord("C") + j)}{row}'] = datapoint
+
+        # Result欄位(M, N欄)
+        cells[f'M{row}'] = item_data.get('accept')
+        cells[f'N{row}'] = item_data.get('reject')
+
+    return cells
+
+def _cell_xml(ref, style, value):
+    """
+    生成儲存格XML（字串使用inlineStr，不需修改sharedStrings.xml）
+
+    Args:
+        ref (bytes): 儲存格位置
+        style (bytes): 原有的樣式屬性
+        value: 儲存格的值
+
+    Returns:
+        bytes: 儲存格XML
+    """
+    if value is None or value == '':
+        return b'<c r="' + ref + b'"' + style + b'/>'
+    if isinstance(value, (bool, np.bool_)):
+        return b'<c r="' + ref + b'"' + style + b' t="b"><v>' + (b'1' if value else b'0') + b'</v></c>'
+    if isinstance(value, numbers.Real):
+        # NumPy數值（inspection_stats的統計值）的repr不是Excel可讀的數字，先轉換為Python數值
+        value = int(value) if isinstance(value, numbers.Integral) else float(value)
+        if not math.isfinite(value):
+            return b'<c r="' + ref + b'"' + style + b'/>'
+        return b'<c r="' + ref + b'"' + style + b'><v>' + repr(value).encode('ascii') + b'</v></c>'
+
+    text = _ILLEGAL_XML_CHARS.sub('', str(value))
+    return (b'<c r="' + ref + b'"' + style + b' t="inlineStr"><is><t xml:space="preserve">'
+            + escape(text).encode('utf-8') + b'</t></is></c>')
+
+class ReportTemplate:
+    """
+    已解析的報告模板
+    保存模板zip中每個檔案的位元組，以及工作表XML中每個儲存格的位置，
+    生成報告時只替換需要填寫的儲存格
+    """
+
+    def __init__(self, template_file):
+        """
+        載入並解析模板檔案
+
+        Args:
+            template_file (str): 模板檔案路徑
+        """
+        self.template_file = template_file
+        self.signature = file_signature(template_file)
+
+        with open(template_file, 'rb') as f:
+            self.template_bytes = f.read()
+
+        with zipfile.ZipFile(io.BytesIO(self.template_bytes)) as zf:
+            self.members = [(info, zf.read(info.filename)) for info in zf.infolist()]
+
+        contents = dict((info.filename, member_data) for info, member_data in self.members)
+        self.sheet_name = find_sheet_part(contents, 'Sheet1')
+        self.sheet_xml = contents.get(self.sheet_name)
+        self.cell_spans = {}
+        self.merged_cells = set()  # 合併儲存格中非左上角的儲存格（無法寫入）
+        if self.sheet_xml is not None:
+            for match in _MERGE_PATTERN.finditer(self.sheet_xml):
+                min_col, min_row, max_col, max_row = [group.decode('ascii') for group in match.groups()]
+                min_col, max_col = column_index_from_string(min_col), column_index_from_string(max_col)
+                for col in range(min_col, max_col + 1):
+                    for row in range(int(min_row), int(max_row) + 1):
+                        if (col, row) != (min_col, int(min_row)):
+                            self.merged_cells.add(f'{get_column_letter(col)}{row}')
+            for match in _CELL_PATTERN.finditer(self.sheet_xml):
+                style = _STYLE_PATTERN.search(match.group('attrs'))
+                self.cell_spans[match.group('ref').decode('ascii')] = (
+                    match.start(), match.end(), style.group(0) if style else b''
+                )
+
+    def render(self, data):
+        """
+        生成報告
+
+        Args:
+            data (dict): 報告數據
+
+        Returns:
+            bytes: xlsx檔案內容
+        """
+        cells = {ref: value for ref, value in report_cells(data).items() if ref not in self.merged_cells}
+
+        # 所有儲存格都已存在於模板中時直接修改XML，否則使用openpyxl
+        if self.sheet_xml is None or any(ref not in self.cell_spans for ref in cells):
+            return self._render_with_openpyxl(cells)
+
+        patches = sorted(
+            (self.cell_spans[ref][0], self.cell_spans[ref][1],
+             _cell_xml(ref.encode('ascii'), self.cell_spans[ref][2], value))
+            for ref, value in cells.items()
+        )
+
+        parts = []
+        position = 0
+        for start, end, cell_xml in patches:
+            parts.append(self.sheet_xml[position:start])
+            parts.append(cell_xml)
+            position = end
+        parts.append(self.sheet_xml[position:])
+        sheet_xml = b''.join(parts)
+
+        output = io.BytesIO()
+        with span(SPAN_WORKBOOK_SAVE):
+            with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as zf:
+                for info, member_data in self.members:
+                    zf.writestr(info.filename, sheet_xml if info.filename == self.sheet_name else member_data)
+        return output.getvalue()
+
+    def _render_with_openpyxl(self, cells):
+        """
+        使用openpyxl從記憶體中的模板生成報告（項目超出模板預留行數時使用）
+
+        Args:
+            cells (dict): 要填寫的儲存格
+
+        Returns:
+            bytes: xlsx檔案內容
+        """
+        with span(SPAN_WORKBOOK_LOAD):
+            wb = load_workbook(io.BytesIO(self.template_bytes))
+        ws = wb['Sheet1'] if 'Sheet1' in wb.sheetnames else wb.active
+        for ref, value in cells.items():
+            ws[ref] = value
+
+        output = io.BytesIO()
+        with span(SPAN_WORKBOOK_SAVE):
+            wb.save(output)
+        wb.close()
+        return output.getvalue()
+
+_templates = {}
+_templates_lock = threading.Lock()
+
+def get_report_template(template_file):
+    """
+    獲取快取的報告模板，模板檔案的修改時間或大小改變時重新載入
+
+    Args:
+        template_file (str): 模板檔案路徑
+
+    Returns:
+        ReportTemplate: 已解析的報告模板
+    """
+    template = _templates.get(template_file)
+    if template is not None and template.signature == file_signature(template_file):
+        return template
+
+    with _templates_lock:
+        template = _templates.get(template_file)
+        if template is None or template.signature != file_signature(template_file):
+            template = ReportTemplate(template_file)
+            _templates[template_file] = template
+        return template
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+生產環境啟動程式
+Linux上以Gunicorn執行多個工作程序（preload：OIS索引及報告模板在fork之前載入一次），
+沒有Gunicorn（如Windows）時改用Waitress的單程序多執行緒伺服器
+
+伺服器推送事件(/events、/gauge/events)的每個串流佔用一個執行緒直到結束（最長EVENT_STREAM_MAX_DURATION秒），
+每個工作程序最多 threads / 2 個串流（EVENT_MAX_STREAMS），超過時返回503，另一半執行緒保留給一般請求；
+因此預設每個工作程序16個執行緒，減少執行緒時同時連線的串流數也隨之減少
+
+用法:
+    python serve.py --workers 4 --threads 16 --bind 0.0.0.0:5000
+    OIR_BASE_PATH=/srv/oir OIR_SECRET_KEY=... OIR_WORKERS=8 python serve.py
+"""
+
+import argparse
+import os
+import sys
+
+from app import create_app
+
+def _default_workers():
+    """預設工作程序數量（Gunicorn建議值 2 x CPU核心數 + 1）"""
+    return (os.cpu_count() or 1) * 2 + 1
+
+def run_gunicorn(args):
+    """以Gunicorn執行（fork之前建立應用程式）"""
+    from gunicorn.app.base import BaseApplication
+
+    class OIRApplication(BaseApplication):
+        def load_config(self):
+            options = {
+                'bind': args.bind,
+                'workers': args.workers,
+                'threads': args.threads,
+                'timeout': args.timeout,
+                'preload_app': True,
+                'accesslog': '-' if args.access_log else None,
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return create_app({'SERVER_WORKERS': args.workers, 'SERVER_THREADS': args.threads})
+
+    OIRApplication().run()
+
+def run_waitress(args):
+    """以Waitress執行（單一程序，執行緒數量為 工作程序 x 每程序執行緒）"""
+    from waitress import serve
+
+    host, _, port = args.bind.rpartition(':')
+    threads = args.workers * args.threads
+    app = create_app({'SERVER_WORKERS': 1, 'SERVER_THREADS': threads})
+    serve(app, host=host or '0.0.0.0', port=int(port), threads=threads)
+
+def main(argv=None):
+    """命令列入口"""
+    parser = argparse.ArgumentParser(description='Run the OIR report system with a production WSGI server.')
+    parser.add_argument('--bind', default=os.environ.get('OIR_BIND', '0.0.0.0:5000'), help='HOST:PORT to listen on')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('OIR_WORKERS', _default_workers())),
+                        help='Number of worker processes')
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('OIR_THREADS', 16)),
+                        help='Threads per worker (half of them may serve event streams)')
+    parser.add_argument('--timeout', type=int, default=int(os.environ.get('OIR_TIMEOUT', 120)),
+                        help='Worker timeout in seconds')
+    parser.add_argument('--server', choices=['auto', 'gunicorn', 'waitress'], default=os.environ.get('OIR_SERVER', 'auto'))
+    parser.add_argument('--access-log', action='store_true', help='Write the access log to stdout')
+    args = parser.parse_args(argv)
+
+    server = args.server
+    if server == 'auto':
+        try:
+            import gunicorn  # noqa: F401
+            server = 'gunicorn' if os.name != 'nt' else 'waitress'
+        except ImportError:
+            server = 'waitress'
+
+    if server == 'gunicorn':
+        run_gunicorn(args)
+    else:
+        try:
+            run_waitress(args)
+        except ImportError:
+            print('Neither gunicorn nor waitress is installed (pip install gunicorn / waitress)', file=sys.stderr)
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
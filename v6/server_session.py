@@ -0,0 +1,405 @@
+# -*- coding: utf-8 -*-
+"""
+伺服器端session模組
+session內容保存在伺服器（SQLite或檔案），cookie只保存簽名後的session ID，
+並以程序內的LRU快取保存反序列化後的內容，版本未變更時不需讀取及解碼
+"""
+
+import logging
+import os
+import secrets
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from flask.sessions import SecureCookieSession, SessionInterface, session_json_serializer
+from itsdangerous import BadSignature, Signer
+
+from metrics import span, SPAN_SESSION_LOAD, SPAN_SESSION_SAVE
+
+logger = logging.getLogger(__name__)
+
+def _copy_value(value):
+    """複製session中的巢狀容器（dict/list/tuple），其他值不可變，直接沿用"""
+    if isinstance(value, dict):
+        return {key: _copy_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy_value(item) for item in value]
+    if isinstance(value, tuple):
+        return tuple(_copy_value(item) for item in value)
+    return value
+
+class ServerSession(SecureCookieSession):
+    """
+    伺服器端session（與cookie session相同的修改追蹤，另外保存session ID）
+    從快取建立時巢狀的值與快取共用，以鍵讀取時才複製（copy-on-read），
+    修改session['report_data']內容不會影響快取或同一session的並行請求
+    """
+
+    def __init__(self, initial=None, sid=None, version=None, shared=False):
+        super().__init__(initial)
+        self.sid = sid
+        self.version = version  # 儲存區中的版本，用於驗證快取
+        # 鍵 -> 與快取共用的原始物件，讀取時仍是同一物件才需要複製
+        self._shared = dict(self) if shared else {}
+
+    def _detach(self, key):
+        """將與快取共用的值替換為副本"""
+        if key in self._shared:
+            original = self._shared.pop(key)
+            if dict.get(self, key) is original:
+                dict.__setitem__(self, key, _copy_value(original))
+
+    def __getitem__(self, key):
+        self._detach(key)
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self._detach(key)
+        return super().get(key, default)
+
+    def setdefault(self, key, default=None):
+        self._detach(key)
+        return super().setdefault(key, default)
+
+    def pop(self, key, *args):
+        self._detach(key)
+        return super().pop(key, *args)
+
+class SQLiteSessionStore:
+    """
+    SQLite session儲存區
+    每個session一行，version在每次寫入時遞增，多個程序共用同一個資料庫檔案時
+    可以只查詢version判斷快取是否仍然有效
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sessions (
+            sid TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            expires REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires);
+    """
+
+    # 每寫入多少次清理一次過期的session
+    PURGE_INTERVAL = 200
+
+    def __init__(self, db_file):
+        """
+        初始化SQLite session儲存區
+
+        Args:
+            db_file (str): 資料庫檔案路徑
+        """
+        self.db_file = db_file
+        self._local = threading.local()
+        self._writes = 0
+        self._connect().executescript(self.SCHEMA)
+        # fork之後子程序不可沿用父程序的連線
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_connections)
+
+    def _reset_connections(self):
+        """捨棄所有執行緒的資料庫連線（下次使用時重新連接）"""
+        self._local = threading.local()
+
+    def _connect(self):
+        """獲取目前執行緒的資料庫連線"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def version(self, sid):
+        """
+        獲取session的版本
+
+        Returns:
+            int: 版本，session不存在或已過期則返回None
+        """
+        row = self._connect().execute(
+            'SELECT version FROM sessions WHERE sid = ? AND expires > ?', (sid, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def load(self, sid):
+        """
+        載入session內容
+
+        Returns:
+            tuple: (序列化的內容, 版本)，session不存在或已過期則返回None
+        """
+        row = self._connect().execute(
+            'SELECT data, version FROM sessions WHERE sid = ? AND expires > ?', (sid, time.time())
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def save(self, sid, data, expires):
+        """
+        保存session內容
+
+        Args:
+            sid (str): session ID
+            data (str): 序列化的內容
+            expires (float): 過期時間（Unix時間）
+
+        Returns:
+            int: 新的版本
+        """
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                """
+                INSERT INTO sessions (sid, data, version, expires) VALUES (?, ?, 1, ?)
+                ON CONFLICT(sid) DO UPDATE SET data = excluded.data,
+                    version = sessions.version + 1, expires = excluded.expires
+                """,
+                (sid, data, expires)
+            )
+            version = conn.execute('SELECT version FROM sessions WHERE sid = ?', (sid,)).fetchone()[0]
+
+        self._writes += 1
+        if self._writes % self.PURGE_INTERVAL == 0:
+            self.purge()
+        return version
+
+    def delete(self, sid):
+        """刪除session"""
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+
+    def purge(self):
+        """
+        刪除過期的session
+
+        Returns:
+            int: 刪除的數量
+        """
+        conn = self._connect()
+        with conn:
+            return conn.execute('DELETE FROM sessions WHERE expires <= ?', (time.time(),)).rowcount
+
+class FileSessionStore:
+    """
+    檔案session儲存區
+    每個session保存為 <目錄>/<session ID>.session，以修改時間作為版本；
+    過期檔案可交由Janitor刪除
+    """
+
+    def __init__(self, directory):
+        """
+        初始化檔案session儲存區
+
+        Args:
+            directory (str): 存放目錄
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, sid):
+        """獲取session ID對應的檔案路徑"""
+        return os.path.join(self.directory, f"{sid}.session")
+
+    def version(self, sid):
+        """
+        獲取session的版本（檔案修改時間）
+
+        Returns:
+            int: 版本，session不存在則返回None
+        """
+        try:
+            return os.stat(self._path(sid)).st_mtime_ns
+        except OSError:
+            return None
+
+    def load(self, sid):
+        """
+        載入session內容
+
+        Returns:
+            tuple: (序列化的內容, 版本)，session不存在或已過期則返回None
+        """
+        path = self._path(sid)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                expires, _, data = f.read().partition('\n')
+            version = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+        if float(expires or 0) <= time.time():
+            return None
+        return data, version
+
+    def save(self, sid, data, expires):
+        """
+        保存session內容（先寫臨時檔再原子替換）
+
+        Returns:
+            int: 新的版本
+        """
+        path = self._path(sid)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(f"{expires}\n{data}")
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return os.stat(path).st_mtime_ns
+
+    def delete(self, sid):
+        """刪除session"""
+        try:
+            os.remove(self._path(sid))
+        except OSError:
+            pass
+
+class ServerSessionInterface(SessionInterface):
+    """
+    Flask session介面
+    取代預設的cookie session，session['report_data']等原有用法不需修改
+    """
+
+    serializer = session_json_serializer
+    session_class = ServerSession
+    salt = 'oir-server-session'
+
+    def __init__(self, store, cache_size=1024, defaults=None):
+        """
+        初始化session介面
+
+        Args:
+            store: session儲存區（SQLiteSessionStore或FileSessionStore）
+            cache_size (int): LRU快取保存的session數量
+            defaults (dict): 預設值，只包含預設值的新session不寫入儲存區
+        """
+        self.store = store
+        self.cache_size = cache_size
+        self.defaults = dict(defaults or {})
+        self._cache = OrderedDict()  # session ID -> (版本, 反序列化的session內容，不可修改)
+        self._lock = threading.Lock()
+
+    def _signer(self, app):
+        """獲取session ID簽名器"""
+        return Signer(app.secret_key, salt=self.salt)
+
+    def _cache_get(self, sid, version):
+        """從LRU快取獲取指定版本的session內容"""
+        with self._lock:
+            entry = self._cache.get(sid)
+            if entry is None or entry[0] != version:
+                return None
+            self._cache.move_to_end(sid)
+            return entry[1]
+
+    def _cache_put(self, sid, version, data):
+        """將session內容放入LRU快取（放入後不可再修改）"""
+        with self._lock:
+            self._cache[sid] = (version, data)
+            self._cache.move_to_end(sid)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _cache_delete(self, sid):
+        """從LRU快取移除session"""
+        with self._lock:
+            self._cache.pop(sid, None)
+
+    def _only_defaults(self, session):
+        """判斷session是否只包含預設值"""
+        return all(key in self.defaults and self.defaults[key] == value for key, value in session.items())
+
+    def open_session(self, app, request):
+        """根據cookie中的session ID載入session"""
+        if not app.secret_key:
+            return None
+
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode('ascii')
+            except (BadSignature, UnicodeDecodeError):
+                sid = None
+
+            if sid:
+                try:
+                    with span(SPAN_SESSION_LOAD):
+                        version = self.store.version(sid)
+                        if version is not None:
+                            data = self._cache_get(sid, version)
+                            if data is None:
+                                loaded = self.store.load(sid)
+                                if loaded is not None:
+                                    serialized, version = loaded
+                                    data = self.serializer.loads(serialized)
+                                    self._cache_put(sid, version, data)
+                            if data is not None:
+                                # 與快取共用巢狀的值，只有實際讀取的鍵才複製
+                                return self.session_class(data, sid=sid, version=version, shared=True)
+                except Exception as e:
+                    logger.error("Error loading session: %s", e)
+
+        return self.session_class(sid=secrets.token_urlsafe(32))
+
+    def save_session(self, app, session, response):
+        """保存修改過的session，cookie只包含簽名後的session ID"""
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        # session被清空時刪除儲存區中的內容及cookie
+        if not session:
+            if session.modified:
+                self.store.delete(session.sid)
+                self._cache_delete(session.sid)
+                response.delete_cookie(
+                    name, domain=domain, path=path, secure=secure, samesite=samesite, httponly=httponly
+                )
+                response.vary.add('Cookie')
+            return
+
+        # 新的session只包含預設值時與沒有session相同，不保存也不發出cookie
+        if session.version is None and self._only_defaults(session):
+            return
+
+        if session.modified:
+            serialized = self.serializer.dumps(dict(session))
+            expires = time.time() + app.permanent_session_lifetime.total_seconds()
+            try:
+                with span(SPAN_SESSION_SAVE):
+                    version = self.store.save(session.sid, serialized, expires)
+                # 快取保存副本，請求之後對session的修改不會影響快取
+                self._cache_put(session.sid, version, _copy_value(dict(session)))
+            except Exception as e:
+                logger.error("Error saving session: %s", e)
+                return
+
+        if session.modified or self.should_set_cookie(app, session):
+            response.set_cookie(
+                name,
+                self._signer(app).sign(session.sid).decode('ascii'),
+                expires=self.get_expiration_time(app, session),
+                httponly=httponly,
+                domain=domain,
+                path=path,
+                secure=secure,
+                samesite=samesite,
+            )
+            response.vary.add('Cookie')
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+索引快照模組
+啟動時需要從工作簿建立的索引（OIS標準、型號描述、歷史搜尋索引、SPC累計值）保存為有版本的二進位快照，
+以來源檔案的SHA-256為鍵；來源檔案未變更時，新的工作程序只需載入快照，不需解析Excel
+"""
+
+import gc
+import hashlib
+import logging
+import os
+import pickle
+import struct
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# 檔案格式：MAGIC + 版本號 + pickle內容；索引結構改變時必須遞增版本號
+MAGIC = b'OIRSNAP\x00'
+SNAPSHOT_VERSION = 2
+_HEADER = struct.Struct('<8sI')
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """
+    計算檔案的SHA-256
+
+    Args:
+        path (str): 檔案路徑
+        chunk_size (int): 每次讀取的位元組數
+
+    Returns:
+        str: 十六進位雜湊值，檔案不存在則返回None
+    """
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+def source_key(paths):
+    """
+    獲取來源檔案的鍵（檔案名稱 -> SHA-256）
+
+    Args:
+        paths (list): 來源檔案路徑列表
+
+    Returns:
+        dict: 檔案名稱 -> 雜湊值（不存在的檔案為None）
+    """
+    return {os.path.basename(path): file_hash(path) for path in paths}
+
+class IndexSnapshot:
+    """
+    索引快照檔案
+    內容為 {'sources': 來源鍵, 'state': 索引狀態}，先寫臨時檔再原子替換，
+    多個工作程序同時保存也不會讀到不完整的檔案
+    """
+
+    def __init__(self, path):
+        """
+        初始化索引快照
+
+        Args:
+            path (str): 快照檔案路徑
+        """
+        self.path = path
+
+    def load(self, sources):
+        """
+        載入快照
+
+        Args:
+            sources (dict): 目前來源檔案的鍵（source_key的結果）
+
+        Returns:
+            dict: 索引狀態；快照不存在、版本不符或來源檔案已變更則返回None
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                magic, version = _HEADER.unpack(f.read(_HEADER.size))
+                if magic != MAGIC or version != SNAPSHOT_VERSION:
+                    return None
+                payload = f.read()
+        except (OSError, struct.error):
+            return None
+
+        # 快照包含大量小物件，載入期間停用循環垃圾回收可大幅縮短時間
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            snapshot = pickle.loads(payload)
+        except Exception as e:
+            logger.error("Error loading index snapshot: %s", e)
+            return None
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+        if snapshot.get('sources') != sources:
+            return None
+        return snapshot.get('state')
+
+    def save(self, sources, state):
+        """
+        保存快照
+
+        Args:
+            sources (dict): 來源檔案的鍵（必須在匯出索引狀態之前計算）
+            state (dict): 索引狀態
+
+        Returns:
+            bool: 保存成功返回True
+        """
+        directory = os.path.dirname(self.path) or '.'
+        fd, temp_file = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_HEADER.pack(MAGIC, SNAPSHOT_VERSION))
+                pickle.dump({'sources': sources, 'state': state}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_file, self.path)
+            return True
+        except Exception as e:
+            logger.error("Error saving index snapshot: %s", e)
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            return False
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+統計製程管制(SPC)模組
+以每個(型號, 項目, 日期)的累計值（數量、平均值、離均差平方和M2、最小值、最大值）回答X-bar/S管制圖查詢，
+保存檢驗數據時以平行合併公式(Chan et al.)增量更新，查詢時不需重新掃描歷史記錄
+"""
+
+import math
+import threading
+from datetime import datetime
+
+def c4(n):
+    """
+    樣本標準差的偏差修正常數 c4(n) = E[s] / σ
+
+    Args:
+        n (int): 樣本數（≥2）
+
+    Returns:
+        float: c4常數（n很大時以對數Gamma函數計算，不會溢位）
+    """
+    return math.sqrt(2.0 / (n - 1)) * math.exp(math.lgamma(n / 2.0) - math.lgamma((n - 1) / 2.0))
+
+def _to_float(value):
+    """
+    將數據點轉換為浮點數
+
+    Returns:
+        float: 數值，空值或非數字則返回None
+    """
+    if value is None or value == '' or isinstance(value, bool):
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+def _day(value):
+    """將日期轉換為YYYY-MM-DD字串，無法解析則返回None"""
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d')
+    try:
+        return datetime.strptime(str(value)[:10], '%Y-%m-%d').strftime('%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None
+
+def _key(model_no, item):
+    """(型號, 項目) 鍵，項目統一為字串（整數項目不含小數點）"""
+    if isinstance(item, float) and item.is_integer():
+        item = int(item)
+    return str(model_no), str(item)
+
+class SPCAggregates:
+    """
+    SPC累計值
+    每個(型號, 項目)保存 日期 -> [數量, 平均值, M2, 最小值, 最大值]，
+    每日的數據點即為管制圖的一個子組；M2為離均差平方和，避免以平方和相減計算變異數時的相消誤差
+    """
+
+    def __init__(self):
+        self._groups = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        """索引快照的狀態（在鎖內複製累計值）"""
+        with self._lock:
+            return {
+                key: {day: list(aggregate) for day, aggregate in days.items()}
+                for key, days in self._groups.items()
+            }
+
+    def __setstate__(self, state):
+        self.__init__()
+        self._groups = state
+
+    def add(self, records):
+        """
+        加入歷史記錄的數據點
+
+        Args:
+            records (list): 歷史記錄列表（Model No., Item, Date, Datapoint_1 ~ Datapoint_10）
+        """
+        with self._lock:
+            for record in records:
+                day = _day(record.get('Date'))
+                if day is None:
+                    continue
+
+                values = [_to_float(record.get(f'Datapoint_{j}')) for j in range(1, 11)]
+                values = [value for value in values if value is not None]
+                if not values:
+                    continue
+
+                count = len(values)
+                mean = math.fsum(values) / count
+                m2 = math.fsum((v - mean) ** 2 for v in values)
+
+                days = self._groups.setdefault(_key(record.get('Model No.'), record.get('Item')), {})
+                aggregate = days.get(day)
+                if aggregate is None:
+                    days[day] = [count, mean, m2, min(values), max(values)]
+                else:
+                    # 兩組的數量、平均值及M2合併
+                    total = aggregate[0] + count
+                    delta = mean - aggregate[1]
+                    aggregate[1] += delta * count / total
+                    aggregate[2] += m2 + delta * delta * aggregate[0] * count / total
+                    aggregate[0] = total
+                    aggregate[3] = min(aggregate[3], min(values))
+                    aggregate[4] = max(aggregate[4], max(values))
+
+    def subgroups(self, model_no, item, date_from=None, date_to=None, limit=None):
+        """
+        獲取每日子組的統計值
+
+        Args:
+            model_no (str): 型號
+            item: 項目編號
+            date_from (str): 起始日期 YYYY-MM-DD
+            date_to (str): 結束日期 YYYY-MM-DD
+            limit (int): 只返回最近的子組數量
+
+        Returns:
+            list: [{'date', 'n', 'mean', 'range', 'min', 'max', 'std'}]，依日期排列
+        """
+        with self._lock:
+            days = self._groups.get(_key(model_no, item), {})
+            rows = sorted(
+                (day, list(aggregate)) for day, aggregate in days.items()
+                if (not date_from or day >= date_from) and (not date_to or day <= date_to)
+            )
+
+        if limit:
+            rows = rows[-limit:]
+
+        result = []
+        for day, (count, mean, m2, minimum, maximum) in rows:
+            result.append({
+                'date': day,
+                'n': count,
+                'mean': mean,
+                'range': maximum - minimum,
+                'min': minimum,
+                'max': maximum,
+                'std': math.sqrt(m2 / (count - 1)) if count > 1 else None,
+            })
+        return result
+
+    def xbar_s_chart(self, model_no, item, date_from=None, date_to=None, limit=None):
+        """
+        計算X-bar/S管制圖（子組大小可以不同）
+        σ̂為合併標準差 sqrt(ΣM2 / Σ(n_i - 1)) 除以c4修正；每個子組的界限依其大小n_i計算:
+            X-bar: x̿ ± 3σ̂/√n_i（x̿為所有數據點的平均值）
+            S: 中心線 c4(n_i)σ̂，界限 (c4(n_i) ± 3√(1 - c4(n_i)²))σ̂，下限不小於0
+
+        Args:
+            model_no (str): 型號
+            item: 項目編號
+            date_from (str): 起始日期
+            date_to (str): 結束日期
+            limit (int): 只使用最近的子組數量
+
+        Returns:
+            dict: 子組（含各自的管制界限）、x̿、σ̂及違規點
+        """
+        subgroups = self.subgroups(model_no, item, date_from, date_to, limit)
+        chart = {
+            'model_no': str(model_no),
+            'item': _key(model_no, item)[1],
+            'subgroups': subgroups,
+            'center': None,
+            'sigma': None,
+            'violations': [],
+        }
+
+        # 至少需要一個大小≥2的子組才能估計變異
+        degrees = sum(group['n'] - 1 for group in subgroups)
+        if not degrees:
+            return chart
+
+        total = sum(group['n'] for group in subgroups)
+        center = math.fsum(group['n'] * group['mean'] for group in subgroups) / total
+        pooled = math.sqrt(math.fsum(group['std'] ** 2 * (group['n'] - 1) for group in subgroups if group['n'] >= 2) / degrees)
+        sigma = pooled / c4(degrees + 1)
+
+        for group in subgroups:
+            half_width = 3 * sigma / math.sqrt(group['n'])
+            group['xbar_lcl'] = center - half_width
+            group['xbar_ucl'] = center + half_width
+            if group['n'] >= 2:
+                factor = c4(group['n'])
+                spread = 3 * math.sqrt(max(1 - factor * factor, 0.0))
+                group['s_center'] = factor * sigma
+                group['s_lcl'] = max(factor - spread, 0.0) * sigma
+                group['s_ucl'] = (factor + spread) * sigma
+            else:
+                group['s_center'] = group['s_lcl'] = group['s_ucl'] = None
+
+        chart['center'] = center
+        chart['sigma'] = sigma
+        chart['pooled_std'] = pooled
+        chart['violations'] = self._violations(subgroups, center, sigma)
+        return chart
+
+    @staticmethod
+    def _violations(subgroups, center, sigma):
+        """
+        檢查管制規則（Western Electric / Nelson）
+        子組大小不同時以標準化的平均值 z = (x̄ - x̿) / (σ̂/√n) 判斷2σ規則
+            1. 點超出3σ管制界限（X-bar及S）
+            2. 連續3點中有2點超出同側2σ
+            3. 連續9點在中心線同側
+            4. 連續6點持續上升或下降
+        """
+        violations = []
+        means = [group['mean'] for group in subgroups]
+
+        def add(rule, chart, index, description):
+            violations.append({
+                'rule': rule,
+                'chart': chart,
+                'index': index,
+                'date': subgroups[index]['date'],
+                'description': description,
+            })
+
+        for index, group in enumerate(subgroups):
+            if group['mean'] > group['xbar_ucl'] or group['mean'] < group['xbar_lcl']:
+                add(1, 'xbar', index, 'Point beyond control limits')
+            if group['n'] >= 2 and (group['std'] > group['s_ucl'] or group['std'] < group['s_lcl']):
+                add(1, 's', index, 'Standard deviation beyond control limits')
+
+        if sigma > 0:
+            scores = [(group['mean'] - center) * math.sqrt(group['n']) / sigma for group in subgroups]
+            for index in range(2, len(scores)):
+                window = scores[index - 2:index + 1]
+                if sum(1 for z in window if z > 2) >= 2 or sum(1 for z in window if z < -2) >= 2:
+                    add(2, 'xbar', index, '2 of 3 points beyond 2 sigma')
+
+        for index in range(8, len(means)):
+            window = means[index - 8:index + 1]
+            if all(mean > center for mean in window) or all(mean < center for mean in window):
+                add(3, 'xbar', index, '9 points on one side of center')
+
+        for index in range(5, len(means)):
+            window = means[index - 5:index + 1]
+            steps = [b - a for a, b in zip(window, window[1:])]
+            if all(step > 0 for step in steps) or all(step < 0 for step in steps):
+                add(4, 'xbar', index, '6 points steadily increasing or decreasing')
+
+        return violations
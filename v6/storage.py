@@ -0,0 +1,1227 @@
+# -*- coding: utf-8 -*-
+"""
+儲存後端模組
+定義DatabaseManager使用的儲存介面，提供Excel及SQLite兩種實作
+"""
+
+import logging
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+from concurrent.futures import Future
+from datetime import datetime
+from openpyxl import Workbook, load_workbook
+
+from file_lock import FileLock
+from metrics import span, SPAN_WORKBOOK_LOAD, SPAN_WORKBOOK_SAVE
+from xlsx_reader import iter_sheet_rows
+
+logger = logging.getLogger(__name__)
+
+# OIS工作表標題
+OIS_HEADERS = [
+    'OIS No.', 'Model Code', 'Model Desc.', 'Model Version', 
+    'Item', 'SC Symbol', 'Description', 'Minimum Limit', 
+    'Maximum Limit', 'Median', 'Unit', 'A.QAL(%) of Sample Size', 
+    'Type of Data', 'Measurement Equipment'
+]
+
+# database工作表標題（歷史記錄格式）
+HISTORY_HEADERS = [
+    'Date', 'Model No.', 'Model Description', 'OIS No.', 'Lot No.', 
+    'Item', 'Datapoint_1', 'Datapoint_2', 'Datapoint_3', 'Datapoint_4', 
+    'Datapoint_5', 'Datapoint_6', 'Datapoint_7', 'Datapoint_8', 
+    'Datapoint_9', 'Datapoint_10', 'Operator'
+]
+
+class OISIndex:
+    """
+    OIS標準索引
+    以OIS編號及型號代碼建立字典，保留項目在工作表中的順序
+    """
+
+    def __init__(self, headers, rows):
+        """
+        由OIS工作表的標題及數據行建立索引
+
+        Args:
+            headers (list): 標題行
+            rows (iterable): 數據行（tuple）
+        """
+        self.headers = list(headers)
+        self.by_ois = {}
+        self.model_desc = {}
+
+        model_code_col = self.headers.index('Model Code') if 'Model Code' in self.headers else 1
+        model_desc_col = self.headers.index('Model Desc.') if 'Model Desc.' in self.headers else 2
+
+        for row in rows:
+            if not row:
+                continue
+
+            row_dict = {}
+            for i, header in enumerate(self.headers):
+                row_dict[header] = row[i] if i < len(row) else None
+            self.by_ois.setdefault(row[0], []).append(row_dict)  # OIS No. 在第一欄
+
+            # 只記錄第一個有描述的型號代碼，與逐行搜尋的結果一致
+            if len(row) > model_code_col and len(row) > model_desc_col and row[model_desc_col]:
+                self.model_desc.setdefault(row[model_code_col], row[model_desc_col])
+
+    def get_items(self, ois_no):
+        """
+        獲取OIS編號的所有項目（返回副本，避免呼叫者修改索引）
+
+        Args:
+            ois_no (str): OIS編號
+
+        Returns:
+            list: OIS數據列表
+        """
+        return [dict(item) for item in self.by_ois.get(ois_no, [])]
+
+    def get_model_description(self, model_code):
+        """
+        獲取型號描述
+
+        Args:
+            model_code (str): 型號代碼
+
+        Returns:
+            str: 型號描述，找不到則返回None
+        """
+        return self.model_desc.get(model_code)
+
+    def get_ois_numbers(self):
+        """
+        獲取所有OIS編號
+
+        Returns:
+            list: 排序後的OIS編號列表
+        """
+        return sorted(ois_no for ois_no in self.by_ois if ois_no)
+
+
+def file_signature(path):
+    """
+    獲取檔案簽名（修改時間及大小），用於判斷快取是否需要重建
+    
+    Args:
+        path (str): 檔案路徑
+    
+    Returns:
+        tuple: (mtime_ns, size)，檔案不存在則返回None
+    """
+    try:
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return None
+
+def history_record(row, record_id=None):
+    """
+    將database工作表的數據行轉換為歷史記錄字典
+    
+    Args:
+        row (tuple): 數據行（欄位順序與HISTORY_HEADERS相同）
+        record_id (int): 記錄ID（Excel為工作表行號）
+    
+    Returns:
+        dict: 歷史記錄
+    """
+    record = {'ID': record_id}
+    for i, header in enumerate(HISTORY_HEADERS):
+        value = row[i] if i < len(row) else None
+        # 特別處理日期欄位，確保格式一致
+        if header == 'Date' and value:
+            value = value.strftime('%Y-%m-%d') if isinstance(value, datetime) else str(value)
+        record[header] = value
+    return record
+
+class StorageBackend:
+    """
+    儲存後端介面
+    所有後端都必須實作以下方法，DatabaseManager只透過此介面存取數據
+    """
+    
+    def get_ois_data(self, ois_no):
+        """
+        根據OIS編號獲取OIS數據
+        
+        Args:
+            ois_no (str): OIS編號
+            
+        Returns:
+            list: OIS數據列表，如果找不到則返回空列表
+        """
+        raise NotImplementedError
+    
+    def get_ois_numbers(self):
+        """
+        獲取所有可用的OIS編號
+        
+        Returns:
+            list: 排序後的OIS編號列表
+        """
+        raise NotImplementedError
+    
+    def get_model_description(self, model_code):
+        """
+        根據型號代碼獲取型號描述
+        
+        Args:
+            model_code (str): 型號代碼
+            
+        Returns:
+            str: 型號描述，找不到則返回型號代碼
+        """
+        raise NotImplementedError
+    
+    def save_inspection_data(self, data):
+        """
+        保存檢驗數據
+        
+        Args:
+            data (dict): 檢驗數據（格式見DatabaseManager.save_inspection_data）
+        
+        Returns:
+            bool: 保存成功返回True，失敗返回False
+        """
+        raise NotImplementedError
+    
+    def submit_inspection_data(self, data):
+        """
+        提交檢驗數據，返回表示保存結果的Future
+        預設直接同步保存；需要排隊寫入的後端可覆寫此方法
+        
+        Args:
+            data (dict): 檢驗數據
+        
+        Returns:
+            Future: 結果為bool，保存成功為True
+        """
+        future = Future()
+        future.set_result(self.save_inspection_data(data))
+        return future
+    
+    def search_history_data(self, filters):
+        """
+        搜尋歷史數據
+        
+        Args:
+            filters (dict): 搜尋條件（格式見DatabaseManager.search_history_data）
+        
+        Returns:
+            list: 搜尋結果列表，每筆記錄的鍵值與HISTORY_HEADERS相同
+        """
+        raise NotImplementedError
+    
+    def load_history(self, cursor=None):
+        """
+        增量載入歷史記錄，供搜尋索引同步使用
+        每筆記錄的'ID'在同一後端內唯一且不會改變，用於分頁選擇記錄
+        
+        Args:
+            cursor: 上次載入後返回的讀取位置，None表示從頭載入
+        
+        Returns:
+            tuple: (新增的記錄列表, 新的讀取位置)
+        """
+        raise NotImplementedError
+    
+    def snapshot_sources(self):
+        """
+        獲取索引快照依賴的來源檔案
+        
+        Returns:
+            list: 檔案路徑列表，任何一個檔案變更時快照失效
+        """
+        raise NotImplementedError
+    
+    def export_index_state(self):
+        """
+        匯出需要保存到索引快照的後端狀態
+        
+        Returns:
+            dict: 後端狀態（必須可以pickle）
+        """
+        return {}
+    
+    def restore_index_state(self, state):
+        """
+        從索引快照恢復後端狀態（來源檔案已確認與快照相同）
+        
+        Args:
+            state (dict): export_index_state返回的狀態
+        """
+        pass
+
+class WorkbookWriter:
+    """
+    工作簿寫入佇列
+    由單一執行緒負責寫入，呼叫者提交數據後取得Future；
+    執行緒每次取出佇列中所有等待的報告，在一次 載入/附加/保存 中完成（群組提交）
+    """
+    
+    def __init__(self, commit, max_batch=200):
+        """
+        初始化寫入佇列
+        
+        Args:
+            commit (callable): commit(數據列表) -> 每份數據的保存結果列表(bool)
+            max_batch (int): 每次群組提交的最大報告數
+        """
+        self._commit = commit
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.commits = 0
+        self.reports = 0
+    
+    def _ensure_started(self):
+        """在第一次提交時啟動寫入執行緒"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='oir-workbook-writer')
+                self._thread.daemon = True
+                self._thread.start()
+    
+    def submit(self, data):
+        """
+        提交一份數據
+        
+        Args:
+            data (dict): 檢驗數據
+        
+        Returns:
+            Future: 結果為bool，保存成功為True
+        """
+        future = Future()
+        self._ensure_started()
+        self._queue.put((data, future))
+        return future
+    
+    def _run(self):
+        """寫入執行緒：等待第一份數據，再取出所有已在佇列中的數據一起提交"""
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            try:
+                results = self._commit([data for data, _ in batch])
+            except Exception as e:
+                logger.error("Error committing workbook batch: %s", e)
+                results = [False] * len(batch)
+            
+            self.commits += 1
+            self.reports += len(batch)
+            for (_, future), result in zip(batch, results):
+                future.set_result(bool(result))
+
+class ExcelBackend(StorageBackend):
+    """Excel儲存後端，OIS及歷史記錄都保存在OIR_database.xlsx"""
+    
+    def __init__(self, database_file, sample_file=None, preload_index=True, fast_reader=True):
+        """
+        初始化Excel儲存後端
+        
+        Args:
+            database_file (str): OIR_database.xlsx路徑
+            sample_file (str): 建立新資料庫時匯入Standards的樣本檔案
+            preload_index (bool): 是否在初始化時建立OIS索引
+            fast_reader (bool): 讀取工作表時是否使用xlsx_reader（否則使用openpyxl唯讀模式）
+        """
+        self.database_file = database_file
+        self.sample_file = sample_file
+        self.fast_reader = fast_reader
+        
+        # OIS標準索引（檔案變更時才重建）
+        self._ois_index = None
+        self._ois_signature = None
+        self._ois_lock = threading.Lock()
+        
+        # 本程序寫入的歷史記錄，檔案未被其他程序修改時可直接提供給搜尋索引
+        self._history_signature = None
+        self._appended = []
+        self._history_lock = threading.Lock()
+        
+        # 所有寫入都經由單一寫入執行緒，避免並行保存互相覆蓋；
+        # 多個工作程序之間以鎖檔協調（載入/附加/保存在同一個鎖內完成）
+        self._writer = WorkbookWriter(self._append_reports)
+        self._file_lock = FileLock(f"{database_file}.lock")
+        
+        # 確保資料庫檔案存在
+        self._ensure_database_exists()
+        
+        # 啟動時預先建立OIS索引，避免在請求中解析工作簿
+        if preload_index:
+            self._get_ois_index()
+    
+    def _ensure_database_exists(self):
+        """確保資料庫檔案存在，如果不存在則創建（多個程序同時啟動時只有一個會建立）"""
+        if not os.path.exists(self.database_file):
+            with self._file_lock:
+                if not os.path.exists(self.database_file):
+                    self._create_database()
+    
+    def _create_database(self):
+        """創建新的資料庫檔案"""
+        wb = Workbook()
+        
+        # 創建OIS工作表
+        ws_ois = wb.active
+        ws_ois.title = "OIS"
+        
+        # OIS工作表標題
+        for col, header in enumerate(OIS_HEADERS, 1):
+            ws_ois.cell(row=1, column=col, value=header)
+        
+        # 嘗試從OIR_Report_Sample.xlsx匯入Standards數據
+        sample_file = self.sample_file
+        if sample_file and os.path.exists(sample_file):
+            try:
+                self._import_standards_from_sample(ws_ois, sample_file)
+            except Exception as e:
+                logger.warning("Could not import standards from sample file: %s", e)
+                # 如果匯入失敗，使用預設示例數據
+                self._add_default_sample_data(ws_ois)
+        else:
+            # 如果樣本檔案不存在，使用預設示例數據
+            self._add_default_sample_data(ws_ois)
+        
+        # 創建database工作表
+        ws_db = wb.create_sheet("database")
+        
+        # database工作表標題
+        for col, header in enumerate(HISTORY_HEADERS, 1):
+            ws_db.cell(row=1, column=col, value=header)
+        
+        # 保存檔案
+        wb.save(self.database_file)
+    
+    def _import_standards_from_sample(self, ws_ois, sample_file):
+        """從OIR_Report_Sample.xlsx匯入Standards數據"""
+        # 以xlsx_reader逐行讀取樣本檔案，找不到Standards工作表時會引發KeyError
+        sample_rows = iter_sheet_rows(sample_file, 'Standards', columns=14, min_row=2)
+        
+        # 轉換Standards格式到OIS格式
+        # Standards格式: Item, OIS No., Model Desc, OIS Rev., Model Revision, SC Symbol, Description, Minimum Limit, Maximum Limit, Median, Unit, A.QAL(%) of Sample Size, Type of Data, Measurement Equipment
+        # OIS格式: OIS No., Model Code, Model Desc., Model Version, Item, SC Symbol, Description, Minimum Limit, Maximum Limit, Median, Unit, A.QAL(%) of Sample Size, Type of Data, Measurement Equipment
+        
+        row_num = 2  # 從第2行開始寫入數據
+        
+        for _, row in sample_rows:
+            if row[0] is None:  # 跳過空行
+                continue
+                
+            # 轉換數據格式
+            ois_row = [
+                row[1],   # OIS No.
+                row[2],   # Model Code (Model Desc)
+                row[2],   # Model Desc.
+                row[4],   # Model Version (Model Revision)
+                row[0],   # Item
+                row[5],   # SC Symbol
+                row[6],   # Description
+                row[7],   # Minimum Limit
+                row[8],   # Maximum Limit
+                row[9],   # Median
+                row[10],  # Unit
+                row[11],  # A.QAL(%) of Sample Size
+                row[12],  # Type of Data
+                row[13]   # Measurement Equipment
+            ]
+            
+            # 寫入OIS工作表
+            for col, value in enumerate(ois_row, 1):
+                ws_ois.cell(row=row_num, column=col, value=value)
+            
+            row_num += 1
+    
+    def _add_default_sample_data(self, ws_ois):
+        """添加預設示例數據"""
+        sample_data = [
+            ['DCCDC-IS-11301110', '1999-1130111', 'DCJ72(4)MLG-1130111', 'E', 1, '', 'dimension_1', 10.0, 15.0, 12.5, 'mm', 10, 'A', 'Caliper'],
+            ['DCCDC-IS-11301110', '1999-1130111', 'DCJ72(4)MLG-1130111', 'E', 2, '', 'dimension_2', 5.0, 8.0, 6.5, 'mm', 10, 'A', 'Caliper'],
+            ['DCCDC-IS-11301110', '1999-1130111', 'DCJ72(4)MLG-1130111', 'E', 3, '', 'dimension_3', 2.0, 4.0, 3.0, 'mm', 10, 'A', 'Height indicator'],
+            ['DCCDC-IS-11301110', '1999-1130111', 'DCJ72(4)MLG-1130111', 'E', 4, '', 'dimension_4', 1.0, 2.5, 1.75, 'mm', 10, 'A', 'Projector'],
+            ['DCCDC-IS-11301110', '1999-1130111', 'DCJ72(4)MLG-1130111', 'E', 5, '', 'dimension_5', 0.5, 1.0, 0.75, 'mm', 10, 'A', 'Projector']
+        ]
+        
+        for row, data in enumerate(sample_data, 2):
+            for col, value in enumerate(data, 1):
+                ws_ois.cell(row=row, column=col, value=value)
+    
+    def read_sheet_rows(self, sheet_name, min_row=1, columns=None):
+        """
+        讀取工作表的數據行
+        預設以xlsx_reader直接解析工作表XML，失敗時改用openpyxl唯讀模式
+        
+        Args:
+            sheet_name (str): 工作表名稱
+            min_row (int): 起始行號
+            columns (int): 只讀取前N個欄位，None表示所有欄位
+        
+        Returns:
+            list: [(行號, 數據行tuple)]，不包含空行
+        """
+        with span(SPAN_WORKBOOK_LOAD):
+            if self.fast_reader:
+                try:
+                    return list(iter_sheet_rows(self.database_file, sheet_name, columns=columns, min_row=min_row))
+                except KeyError:
+                    raise
+                except Exception as e:
+                    logger.warning("Error reading %s sheet with xlsx_reader, using openpyxl: %s", sheet_name, e)
+            
+            wb = load_workbook(self.database_file, read_only=True)
+            try:
+                ws = wb[sheet_name]
+                rows = []
+                for row_number, row in enumerate(ws.iter_rows(min_row=min_row, max_col=columns, values_only=True), min_row):
+                    if row and any(value is not None for value in row):
+                        rows.append((row_number, row))
+                return rows
+            finally:
+                wb.close()
+    
+    def read_ois_sheet(self):
+        """
+        讀取OIS工作表
+        
+        Returns:
+            tuple: (標題行, 數據行列表)
+        """
+        rows = [row for _, row in self.read_sheet_rows('OIS', columns=len(OIS_HEADERS))]
+        headers = rows[0] if rows else ()
+        return list(headers), [row for row in rows[1:] if row and row[0] is not None]
+    
+    def read_history_sheet(self):
+        """
+        讀取database工作表的所有歷史數據行
+        
+        Returns:
+            list: 數據行列表（tuple，欄位順序與HISTORY_HEADERS相同）
+        """
+        rows = self.read_sheet_rows('database', min_row=2, columns=len(HISTORY_HEADERS))
+        return [row for _, row in rows if row and row[0]]
+    
+    def _build_ois_index(self):
+        """
+        讀取OIS工作表並建立索引
+        
+        Returns:
+            OISIndex: OIS標準索引
+        """
+        headers, rows = self.read_ois_sheet()
+        return OISIndex(headers, rows)
+    
+    def _get_ois_index(self):
+        """
+        獲取OIS索引，只有在檔案的修改時間或大小改變時才重新載入
+        
+        Returns:
+            OISIndex: OIS標準索引
+        """
+        signature = file_signature(self.database_file)
+        if self._ois_index is not None and signature == self._ois_signature:
+            return self._ois_index
+        
+        with self._ois_lock:
+            # 可能已由其他執行緒重建
+            if self._ois_index is None or signature != self._ois_signature:
+                self._ois_index = self._build_ois_index()
+                self._ois_signature = signature
+            return self._ois_index
+    
+    def get_ois_data(self, ois_no):
+        """
+        根據OIS編號獲取OIS數據
+        
+        Args:
+            ois_no (str): OIS編號
+            
+        Returns:
+            list: OIS數據列表，如果找不到則返回空列表
+        """
+        try:
+            return self._get_ois_index().get_items(ois_no)
+            
+        except Exception as e:
+            logger.error("Error reading OIS data: %s", e)
+            return []
+    
+    def get_ois_numbers(self):
+        """
+        獲取所有可用的OIS編號
+        
+        Returns:
+            list: 排序後的OIS編號列表
+        """
+        return self._get_ois_index().get_ois_numbers()
+    
+    def get_model_description(self, model_code):
+        """
+        根據型號代碼獲取型號描述
+        
+        Args:
+            model_code (str): 型號代碼
+            
+        Returns:
+            str: 型號描述
+        """
+        try:
+            return self._get_ois_index().get_model_description(model_code) or model_code
+            
+        except Exception as e:
+            logger.error("Error getting model description: %s", e)
+            return model_code
+    
+    def snapshot_sources(self):
+        """OIS及歷史記錄都來自OIR_database.xlsx"""
+        return [self.database_file]
+    
+    def export_index_state(self):
+        """
+        匯出OIS索引
+        
+        Returns:
+            dict: {'ois_index': OISIndex}
+        """
+        return {'ois_index': self._get_ois_index()}
+    
+    def restore_index_state(self, state):
+        """
+        恢復OIS索引，並將工作簿標記為已讀取到搜尋索引的讀取位置
+        
+        Args:
+            state (dict): export_index_state返回的狀態
+        """
+        signature = file_signature(self.database_file)
+        with self._ois_lock:
+            self._ois_index = state['ois_index']
+            self._ois_signature = signature
+        with self._history_lock:
+            # 工作簿內容與快照相同，load_history不需重新解析
+            self._history_signature = signature
+            self._appended = []
+    
+    def save_inspection_data(self, data):
+        """
+        保存檢驗數據到資料庫
+        
+        Args:
+            data (dict): 檢驗數據
+                - date: 日期
+                - model_no: 型號
+                - model_desc: 型號描述
+                - ois_no: OIS編號
+                - lot_no: 批號
+                - items: 項目數據列表
+                - operator: 操作員
+        
+        Returns:
+            bool: 保存成功返回True，失敗返回False
+        """
+        return self.submit_inspection_data(data).result()
+    
+    def submit_inspection_data(self, data):
+        """
+        將檢驗數據放入寫入佇列
+        
+        Returns:
+            Future: 結果為bool，保存成功為True
+        """
+        return self._writer.submit(data)
+    
+    def _append_reports(self, reports):
+        """
+        群組提交：載入工作簿一次，附加所有報告的行，保存到臨時檔後原子替換
+        （只由寫入執行緒呼叫）
+        
+        Args:
+            reports (list): 檢驗數據列表
+        
+        Returns:
+            list: 每份報告的保存結果
+        """
+        results = [False] * len(reports)
+        try:
+            with self._file_lock, self._history_lock:
+                # 檔案自上次讀取後未被修改（包括其他程序），寫入的行可直接加入增量記錄
+                known = file_signature(self.database_file) == self._history_signature
+                
+                with span(SPAN_WORKBOOK_LOAD):
+                    wb = load_workbook(self.database_file)
+                ws = wb['database']
+                
+                # 獲取下一行的行號
+                next_row = ws.max_row + 1
+                
+                written = []
+                for index, data in enumerate(reports):
+                    try:
+                        # 先組成所有行，格式錯誤的報告不影響同一批的其他報告
+                        rows = []
+                        for item_data in data['items']:
+                            # 基本資料、10個數據點及操作員 (columns 1-17)
+                            datapoints = item_data.get('datapoints', [])
+                            row_values = [
+                                data['date'],           # Date
+                                data['model_no'],       # Model No.
+                                data['model_desc'],     # Model Description
+                                data['ois_no'],         # OIS No.
+                                data['lot_no'],         # Lot No.
+                                item_data['item'],      # Item
+                            ]
+                            row_values += [datapoints[i] if i < len(datapoints) else None for i in range(10)]
+                            row_values.append(data['operator'])  # Operator
+                            rows.append(row_values)
+                    except (KeyError, TypeError) as e:
+                        logger.error("Error preparing inspection data: %s", e)
+                        continue
+                    
+                    for row_values in rows:
+                        for col, value in enumerate(row_values, 1):
+                            ws.cell(row=next_row, column=col, value=value)
+                        written.append((next_row, row_values))
+                        next_row += 1
+                    results[index] = True
+                
+                if not written:
+                    wb.close()
+                    return results
+                
+                # 保存到同一目錄的臨時檔再替換，保存中途失敗不會破壞原有檔案
+                fd, temp_file = tempfile.mkstemp(
+                    dir=os.path.dirname(os.path.abspath(self.database_file)), suffix='.xlsx'
+                )
+                os.close(fd)
+                try:
+                    with span(SPAN_WORKBOOK_SAVE):
+                        wb.save(temp_file)
+                    os.replace(temp_file, self.database_file)
+                finally:
+                    wb.close()
+                    if os.path.exists(temp_file):
+                        os.remove(temp_file)
+                
+                if known:
+                    self._appended.extend((row, history_record(values, row)) for row, values in written if values[0])
+                    self._history_signature = file_signature(self.database_file)
+                else:
+                    self._history_signature = None
+            
+            return results
+            
+        except Exception as e:
+            logger.error("Error saving inspection data: %s", e)
+            return [False] * len(reports)
+    
+    def search_history_data(self, filters):
+        """
+        搜尋歷史數據
+        
+        Args:
+            filters (dict): 搜尋條件
+                - date_from: 起始日期
+                - date_to: 結束日期
+                - model_no: 型號
+                - lot_no: 批號
+                - operator: 操作員
+        
+        Returns:
+            list: 搜尋結果列表
+        """
+        try:
+            rows = self.read_sheet_rows('database', columns=len(HISTORY_HEADERS))
+            
+            # 獲取標題行
+            headers = list(rows[0][1]) if rows and rows[0][0] == 1 else list(HISTORY_HEADERS)
+            
+            # 獲取所有數據
+            results = []
+            for row_number, row in rows:
+                if row_number < 2 or not row or not row[0]:  # 跳過標題及空行
+                    continue
+                
+                # 建立記錄字典
+                record = {}
+                for i, header in enumerate(headers):
+                    if i < len(row):
+                        value = row[i]
+                        # 特別處理日期欄位，確保格式一致
+                        if header == 'Date' and value:
+                            if isinstance(value, datetime):
+                                record[header] = value.strftime('%Y-%m-%d')
+                            else:
+                                record[header] = str(value)
+                        else:
+                            record[header] = value
+                    else:
+                        record[header] = None
+                
+                # 應用篩選條件
+                match = True
+                
+                # 日期篩選
+                if filters.get('date_from') or filters.get('date_to'):
+                    try:
+                        record_date = datetime.strptime(str(record['Date']), '%Y-%m-%d') if record.get('Date') else None
+                        if record_date:
+                            if filters.get('date_from'):
+                                filter_date_from = datetime.strptime(filters['date_from'], '%Y-%m-%d')
+                                if record_date < filter_date_from:
+                                    match = False
+                            if filters.get('date_to'):
+                                filter_date_to = datetime.strptime(filters['date_to'], '%Y-%m-%d')
+                                if record_date > filter_date_to:
+                                    match = False
+                    except:
+                        pass
+                
+                # 型號篩選
+                if filters.get('model_no') and match:
+                    model_no = str(record.get('Model No.', ''))
+                    if filters['model_no'].lower() not in model_no.lower():
+                        match = False
+                
+                # 批號篩選
+                if filters.get('lot_no') and match:
+                    lot_no = str(record.get('Lot No.', ''))
+                    if filters['lot_no'].lower() not in lot_no.lower():
+                        match = False
+                
+                # 操作員篩選
+                if filters.get('operator') and match:
+                    if record.get('Operator') != filters['operator']:
+                        match = False
+                
+                if match:
+                    results.append(record)
+            
+            return results
+            
+        except Exception as e:
+            logger.error("Error searching history data: %s", e)
+            return []
+    
+    def load_history(self, cursor=None):
+        """
+        增量載入database工作表的歷史記錄
+        讀取位置為最後讀取的行號；只偵測新增的行，不偵測已存在行的修改
+        
+        Args:
+            cursor (int): 上次讀取到的行號
+        
+        Returns:
+            tuple: (新增的記錄列表, 最後讀取的行號)
+        """
+        last_row = cursor or 1
+        with self._history_lock:
+            signature = file_signature(self.database_file)
+            if signature is not None and signature == self._history_signature:
+                # 檔案只被本程序修改過，不需重新解析
+                pending = [(row, record) for row, record in self._appended if row > last_row]
+                self._appended = []
+                if pending:
+                    last_row = pending[-1][0]
+                return [record for _, record in pending], last_row
+            
+            records = []
+            for row_number, row in self.read_sheet_rows('database', min_row=last_row + 1, columns=len(HISTORY_HEADERS)):
+                last_row = row_number
+                if row and row[0]:  # 跳過空行
+                    records.append(history_record(row, row_number))
+            
+            self._history_signature = signature
+            self._appended = []
+            return records, last_row
+
+# standards資料表欄位，順序與OIS_HEADERS相同
+STANDARDS_COLUMNS = [
+    'ois_no', 'model_code', 'model_desc', 'model_version',
+    'item', 'sc_symbol', 'description', 'min_limit',
+    'max_limit', 'median', 'unit', 'aql_sample_size',
+    'data_type', 'equipment'
+]
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TABLE IF NOT EXISTS standards (
+    id INTEGER PRIMARY KEY,
+    ois_no TEXT NOT NULL,
+    model_code TEXT,
+    model_desc TEXT,
+    model_version TEXT,
+    item,
+    sc_symbol TEXT,
+    description TEXT,
+    min_limit,
+    max_limit,
+    median,
+    unit TEXT,
+    aql_sample_size,
+    data_type TEXT,
+    equipment TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_standards_ois ON standards(ois_no);
+CREATE INDEX IF NOT EXISTS idx_standards_model ON standards(model_code);
+
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    model_no TEXT,
+    model_desc TEXT,
+    ois_no TEXT,
+    lot_no TEXT,
+    operator TEXT,
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_reports_date ON reports(date);
+CREATE INDEX IF NOT EXISTS idx_reports_model ON reports(model_no);
+CREATE INDEX IF NOT EXISTS idx_reports_lot ON reports(lot_no);
+CREATE INDEX IF NOT EXISTS idx_reports_operator ON reports(operator);
+
+CREATE TABLE IF NOT EXISTS datapoints (
+    id INTEGER PRIMARY KEY,
+    report_id INTEGER NOT NULL REFERENCES reports(id) ON DELETE CASCADE,
+    item,
+    position INTEGER NOT NULL,
+    value
+);
+CREATE INDEX IF NOT EXISTS idx_datapoints_report ON datapoints(report_id);
+"""
+
+def _normalize_date(value):
+    """將日期統一為YYYY-MM-DD字串"""
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d')
+    return str(value) if value is not None else ''
+
+def _like_pattern(text):
+    """建立部分匹配用的LIKE模式（轉義%及_）"""
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+class SQLiteBackend(StorageBackend):
+    """
+    SQLite儲存後端
+    Standards → Reports → Datapoints 三表結構，每次保存只需一個插入交易，
+    成本與歷史數據量無關。OIS標準仍由OIR_database.xlsx的OIS工作表維護，
+    工作簿變更時自動同步到standards資料表。
+    """
+    
+    def __init__(self, db_file, excel_backend):
+        """
+        初始化SQLite儲存後端
+        
+        Args:
+            db_file (str): SQLite資料庫路徑
+            excel_backend (ExcelBackend): OIS標準及舊歷史記錄的來源
+        """
+        self.db_file = db_file
+        self.excel_backend = excel_backend
+        self._local = threading.local()
+        # fork之後子程序不可沿用父程序的連線
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_connections)
+        
+        # OIS標準索引（OIS工作表變更時才重建）
+        self._ois_index = None
+        self._ois_signature = None
+        self._ois_lock = threading.Lock()
+        
+        is_new = not os.path.exists(db_file)
+        conn = self._connect()
+        with conn:
+            conn.executescript(SQLITE_SCHEMA)
+        
+        # 新建資料庫時匯入Excel中已有的歷史記錄
+        if is_new:
+            self._import_history_from_excel()
+        
+        self._get_ois_index()
+    
+    def _connect(self):
+        """
+        獲取目前執行緒的資料庫連接
+        
+        Returns:
+            sqlite3.Connection: 資料庫連接
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn = conn
+        return conn
+    
+    def _reset_connections(self):
+        """捨棄所有執行緒的資料庫連線（下次使用時重新連接）"""
+        self._local = threading.local()
+    
+    def _get_meta(self, key):
+        row = self._connect().execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+    
+    def _sync_standards(self, signature):
+        """
+        OIS工作表變更時，將其內容同步到standards資料表
+        
+        Args:
+            signature (tuple): OIS工作簿目前的檔案簽名
+        """
+        if self._get_meta('standards_signature') == repr(signature):
+            return
+        
+        headers, rows = self.excel_backend.read_ois_sheet()
+        columns = [headers.index(h) if h in headers else None for h in OIS_HEADERS]
+        records = [
+            tuple(row[i] if i is not None and i < len(row) else None for i in columns)
+            for row in rows
+        ]
+        
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM standards')
+            conn.executemany(
+                f"INSERT INTO standards ({', '.join(STANDARDS_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(STANDARDS_COLUMNS))})",
+                records
+            )
+            conn.execute(
+                'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                ('standards_signature', repr(signature))
+            )
+    
+    def _get_ois_index(self):
+        """
+        獲取OIS索引，只有在OIS工作簿的修改時間或大小改變時才重新同步及載入
+        
+        Returns:
+            OISIndex: OIS標準索引
+        """
+        signature = file_signature(self.excel_backend.database_file)
+        if self._ois_index is not None and signature == self._ois_signature:
+            return self._ois_index
+        
+        with self._ois_lock:
+            if self._ois_index is None or signature != self._ois_signature:
+                if signature is not None:
+                    self._sync_standards(signature)
+                rows = self._connect().execute(
+                    f"SELECT {', '.join(STANDARDS_COLUMNS)} FROM standards ORDER BY id"
+                ).fetchall()
+                self._ois_index = OISIndex(OIS_HEADERS, rows)
+                self._ois_signature = signature
+            return self._ois_index
+    
+    def _import_history_from_excel(self):
+        """將Excel database工作表的歷史記錄匯入SQLite（連續相同表頭的行視為同一份報告）"""
+        try:
+            rows = self.excel_backend.read_history_sheet()
+        except Exception as e:
+            logger.warning("Could not import history from Excel database: %s", e)
+            return
+        
+        reports = []
+        for row in rows:
+            row = tuple(row) + (None,) * (len(HISTORY_HEADERS) - len(row))
+            header = (_normalize_date(row[0]), row[1], row[2], row[3], row[4], row[16])
+            item = {'item': row[5], 'datapoints': list(row[6:16])}
+            if reports and reports[-1][0] == header:
+                reports[-1][1].append(item)
+            else:
+                reports.append((header, [item]))
+        
+        conn = self._connect()
+        with conn:
+            for header, items in reports:
+                date, model_no, model_desc, ois_no, lot_no, operator = header
+                self._insert_report(conn, {
+                    'date': date, 'model_no': model_no, 'model_desc': model_desc,
+                    'ois_no': ois_no, 'lot_no': lot_no, 'operator': operator,
+                    'items': items
+                })
+    
+    def _insert_report(self, conn, data):
+        """
+        在目前交易中插入一份報告及其數據點
+        
+        Returns:
+            int: 新報告的ID
+        """
+        cursor = conn.execute(
+            'INSERT INTO reports (date, model_no, model_desc, ois_no, lot_no, operator, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (_normalize_date(data['date']), data['model_no'], data['model_desc'],
+             data['ois_no'], data['lot_no'], data['operator'], datetime.now().isoformat())
+        )
+        report_id = cursor.lastrowid
+        
+        # 每個項目固定保存10個數據點位置（空值為NULL）
+        datapoint_rows = []
+        for item_data in data['items']:
+            datapoints = item_data.get('datapoints', [])
+            for i in range(10):
+                value = datapoints[i] if i < len(datapoints) else None
+                datapoint_rows.append((report_id, item_data['item'], i + 1, value))
+        
+        conn.executemany(
+            'INSERT INTO datapoints (report_id, item, position, value) VALUES (?, ?, ?, ?)',
+            datapoint_rows
+        )
+        return report_id
+    
+    def get_ois_data(self, ois_no):
+        """根據OIS編號獲取OIS數據"""
+        try:
+            return self._get_ois_index().get_items(ois_no)
+        except Exception as e:
+            logger.error("Error reading OIS data: %s", e)
+            return []
+    
+    def get_ois_numbers(self):
+        """獲取所有可用的OIS編號"""
+        return self._get_ois_index().get_ois_numbers()
+    
+    def get_model_description(self, model_code):
+        """根據型號代碼獲取型號描述"""
+        try:
+            return self._get_ois_index().get_model_description(model_code) or model_code
+        except Exception as e:
+            logger.error("Error getting model description: %s", e)
+            return model_code
+    
+    def snapshot_sources(self):
+        """OIS標準來自OIR_database.xlsx，歷史記錄來自SQLite資料庫"""
+        return [self.excel_backend.database_file, self.db_file]
+    
+    def export_index_state(self):
+        """匯出OIS索引"""
+        return {'ois_index': self._get_ois_index()}
+    
+    def restore_index_state(self, state):
+        """恢復OIS索引"""
+        with self._ois_lock:
+            self._ois_index = state['ois_index']
+            self._ois_signature = file_signature(self.excel_backend.database_file)
+    
+    def save_inspection_data(self, data):
+        """在單一交易中保存一份報告"""
+        try:
+            conn = self._connect()
+            with conn:
+                self._insert_report(conn, data)
+            return True
+        except Exception as e:
+            logger.error("Error saving inspection data: %s", e)
+            return False
+    
+    def _query_history(self, conditions, params):
+        """
+        查詢歷史數據，並將每個(報告, 項目)的數據點組合成一筆記錄
+        
+        Args:
+            conditions (list): reports資料表(r)的SQL條件
+            params (list): 條件參數
+        
+        Returns:
+            list: (報告ID, 歷史記錄) 列表，依保存順序排列
+        """
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        rows = self._connect().execute(
+            'SELECT r.id, r.date, r.model_no, r.model_desc, r.ois_no, r.lot_no, r.operator, '
+            'd.id, d.item, d.position, d.value '
+            'FROM reports r JOIN datapoints d ON d.report_id = r.id '
+            f'{where} ORDER BY r.id, d.id',
+            params
+        ).fetchall()
+        
+        results = []
+        current_key = None
+        record = None
+        for report_id, date, model_no, model_desc, ois_no, lot_no, operator, datapoint_id, item, position, value in rows:
+            key = (report_id, item)
+            if key != current_key or position == 1:
+                current_key = key
+                # 以項目第一個數據點的ID作為記錄ID
+                record = {
+                    'ID': datapoint_id,
+                    'Date': date,
+                    'Model No.': model_no,
+                    'Model Description': model_desc,
+                    'OIS No.': ois_no,
+                    'Lot No.': lot_no,
+                    'Item': item,
+                }
+                for i in range(1, 11):
+                    record[f'Datapoint_{i}'] = None
+                record['Operator'] = operator
+                results.append((report_id, record))
+            record[f'Datapoint_{position}'] = value
+        
+        return results
+    
+    def search_history_data(self, filters):
+        """以SQL條件搜尋歷史數據"""
+        try:
+            conditions = []
+            params = []
+            
+            # 日期以YYYY-MM-DD字串保存，可直接比較
+            if filters.get('date_from'):
+                conditions.append('r.date >= ?')
+                params.append(filters['date_from'])
+            if filters.get('date_to'):
+                conditions.append('r.date <= ?')
+                params.append(filters['date_to'])
+            
+            # 型號及批號為部分匹配（LIKE對ASCII不分大小寫）
+            if filters.get('model_no'):
+                conditions.append("r.model_no LIKE ? ESCAPE '\\'")
+                params.append(_like_pattern(filters['model_no']))
+            if filters.get('lot_no'):
+                conditions.append("r.lot_no LIKE ? ESCAPE '\\'")
+                params.append(_like_pattern(filters['lot_no']))
+            
+            # 操作員為完全匹配
+            if filters.get('operator'):
+                conditions.append('r.operator = ?')
+                params.append(filters['operator'])
+            
+            return [record for _, record in self._query_history(conditions, params)]
+            
+        except Exception as e:
+            logger.error("Error searching history data: %s", e)
+            return []
+    
+    def load_history(self, cursor=None):
+        """
+        增量載入歷史記錄（讀取位置為最後載入的報告ID）
+        
+        Args:
+            cursor (int): 上次載入的最後報告ID
+        
+        Returns:
+            tuple: (新增的記錄列表, 最後載入的報告ID)
+        """
+        last_id = cursor or 0
+        rows = self._query_history(['r.id > ?'], [last_id])
+        if rows:
+            last_id = rows[-1][0]
+        return [record for _, record in rows], last_id
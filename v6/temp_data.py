@@ -2,22 +2,40 @@
 """
 臨時數據管理模組
 用於保存和恢復用戶的數據輸入進度
+
+每個session以 session_<ID>.json 保存完整快照，逐項提交的數據則附加到
+session_<ID>.journal（每行一筆JSON），累積一定數量後再壓縮回快照，
+因此每次提交的寫入量固定，不需重寫整份報告；
+多個工作程序共用臨時目錄，每個session的讀寫以 session_<ID>.lock 檔案鎖協調
 """
 
 import json
+import logging
 import os
 import tempfile
 from datetime import datetime, timedelta
 
+from file_lock import FileLock
+from metrics import span, SPAN_TEMP_IO
+
+logger = logging.getLogger(__name__)
+
 class TempDataManager:
-    def __init__(self, base_path):
+    # session備份檔案保存時間
+    SESSION_TTL = timedelta(hours=24)
+    # 日誌累積多少筆後壓縮回快照
+    COMPACT_EVERY = 20
+
+    def __init__(self, base_path, janitor=None):
         """
         初始化臨時數據管理器
         
         Args:
             base_path (str): 基礎路徑
+            janitor (Janitor): 臨時檔案清理器，提供時由其負責刪除過期的session備份檔案
         """
         self.base_path = base_path
+        self.janitor = janitor
         self.temp_dir = os.path.join(tempfile.gettempdir(), 'oir_temp_data')
         
         # 確保臨時目錄存在
@@ -39,17 +57,139 @@ class TempDataManager:
             # 添加時間戳
             data['timestamp'] = datetime.now().isoformat()
             
-            # 保存到臨時文件
-            temp_file = os.path.join(self.temp_dir, f"session_{session_id}.json")
-            with open(temp_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+            with self._session_lock(session_id), span(SPAN_TEMP_IO):
+                self._write_snapshot(session_id, data)
             
             return True
             
         except Exception as e:
-            print(f"Error saving temp data: {e}")
+            logger.error("Error saving temp data: %s", e)
             return False
     
+    def _snapshot_file(self, session_id):
+        """獲取session快照檔案路徑"""
+        return os.path.join(self.temp_dir, f"session_{session_id}.json")
+    
+    def _journal_file(self, session_id):
+        """獲取session日誌檔案路徑"""
+        return os.path.join(self.temp_dir, f"session_{session_id}.journal")
+    
+    def _session_lock(self, session_id):
+        """
+        獲取session的跨程序檔案鎖
+        每次使用都開啟新的檔案描述符，同一程序的其他執行緒也會等待；
+        鎖檔不在刪除session時移除（其他程序可能正在等待），由Janitor清理過期的鎖檔
+        """
+        return FileLock(os.path.join(self.temp_dir, f"session_{session_id}.lock"))
+    
+    def _journal_count(self, session_id):
+        """
+        從日誌檔案獲取記錄數（呼叫前需持有session的檔案鎖）
+        
+        Returns:
+            int: 記錄數，最後一行不完整（寫入中途失敗）時返回None
+        """
+        try:
+            with open(self._journal_file(session_id), 'rb') as f:
+                content = f.read()
+        except FileNotFoundError:
+            return 0
+        if content and not content.endswith(b'\n'):
+            return None
+        return content.count(b'\n')
+    
+    def _write_snapshot(self, session_id, data):
+        """
+        寫入完整快照並清空日誌（呼叫前需持有session的檔案鎖）
+        先寫臨時檔再原子替換，寫入中途當機不會破壞原有的快照
+        """
+        temp_file = self._snapshot_file(session_id)
+        fd, partial_file = tempfile.mkstemp(dir=self.temp_dir, prefix='session_', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, default=str)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(partial_file, temp_file)
+        except Exception:
+            if os.path.exists(partial_file):
+                os.remove(partial_file)
+            raise
+        
+        # 快照已包含所有日誌記錄；即使刪除前當機，重播日誌也只會寫入相同的值
+        journal_file = self._journal_file(session_id)
+        if os.path.exists(journal_file):
+            os.remove(journal_file)
+        
+        if self.janitor:
+            self.janitor.schedule(temp_file, self.SESSION_TTL.total_seconds(), 'sessions')
+    
+    def append_item_data(self, session_id, data, item_key):
+        """
+        保存單一項目的數據
+        快照存在時只將該項目附加到日誌，否則（或日誌已累積COMPACT_EVERY筆時）寫入完整快照
+        
+        Args:
+            session_id (str): session ID
+            data (dict): 完整的報告數據（包含items_data及current_item）
+            item_key (str): 剛更新的項目在items_data中的鍵
+        
+        Returns:
+            bool: 保存成功返回True
+        """
+        try:
+            timestamp = datetime.now().isoformat()
+            
+            with self._session_lock(session_id), span(SPAN_TEMP_IO):
+                # 記錄數取自日誌檔案，其他工作程序附加的記錄也會計入
+                count = self._journal_count(session_id)
+                if count is None or count >= self.COMPACT_EVERY or not os.path.exists(self._snapshot_file(session_id)):
+                    self._write_snapshot(session_id, dict(data, timestamp=timestamp))
+                    return True
+                
+                entry = {
+                    'key': item_key,
+                    'item': data['items_data'].get(item_key),
+                    'current_item': data.get('current_item'),
+                    'timestamp': timestamp
+                }
+                # 寫入失敗時日誌可能留下不完整的一行，下次保存時改寫完整快照
+                journal_file = self._journal_file(session_id)
+                with open(journal_file, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry, ensure_ascii=False, default=str) + '\n')
+                
+                if count == 0 and self.janitor:
+                    self.janitor.schedule(journal_file, self.SESSION_TTL.total_seconds(), 'sessions')
+            
+            return True
+            
+        except Exception as e:
+            logger.error("Error appending temp data: %s", e)
+            return False
+    
+    def _replay_journal(self, session_id, data):
+        """
+        將日誌中的項目套用到快照數據
+        最後一行若因當機而不完整則略過
+        """
+        journal_file = self._journal_file(session_id)
+        if not os.path.exists(journal_file):
+            return data
+        
+        data.setdefault('items_data', {})
+        with open(journal_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                if entry.get('item') is not None:
+                    data['items_data'][entry['key']] = entry['item']
+                if entry.get('current_item') is not None:
+                    data['current_item'] = entry['current_item']
+                data['timestamp'] = entry.get('timestamp', data.get('timestamp'))
+        return data
+    
     def load_session_data(self, session_id):
         """
         從臨時文件載入session數據
@@ -61,26 +201,28 @@ class TempDataManager:
             dict: 載入的數據，如果失敗則返回None
         """
         try:
-            temp_file = os.path.join(self.temp_dir, f"session_{session_id}.json")
+            temp_file = self._snapshot_file(session_id)
             
             if not os.path.exists(temp_file):
                 return None
             
-            with open(temp_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            with self._session_lock(session_id), span(SPAN_TEMP_IO):
+                with open(temp_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                data = self._replay_journal(session_id, data)
             
             # 檢查文件是否過期（24小時）
             if 'timestamp' in data:
                 timestamp = datetime.fromisoformat(data['timestamp'])
-                if datetime.now() - timestamp > timedelta(hours=24):
+                if datetime.now() - timestamp > self.SESSION_TTL:
                     # 刪除過期文件
-                    os.remove(temp_file)
+                    self.delete_session_data(session_id)
                     return None
             
             return data
             
         except Exception as e:
-            print(f"Error loading temp data: {e}")
+            logger.error("Error loading temp data: %s", e)
             return None
     
     def delete_session_data(self, session_id):
@@ -91,11 +233,12 @@ class TempDataManager:
             session_id (str): session ID
         """
         try:
-            temp_file = os.path.join(self.temp_dir, f"session_{session_id}.json")
-            if os.path.exists(temp_file):
-                os.remove(temp_file)
+            with self._session_lock(session_id), span(SPAN_TEMP_IO):
+                for temp_file in (self._snapshot_file(session_id), self._journal_file(session_id)):
+                    if os.path.exists(temp_file):
+                        os.remove(temp_file)
         except Exception as e:
-            print(f"Error deleting temp data: {e}")
+            logger.error("Error deleting temp data: %s", e)
     
     def cleanup_old_files(self):
         """清理超過24小時的舊文件"""
@@ -103,10 +246,10 @@ class TempDataManager:
             if not os.path.exists(self.temp_dir):
                 return
             
-            cutoff_time = datetime.now() - timedelta(hours=24)
+            cutoff_time = datetime.now() - self.SESSION_TTL
             
             for filename in os.listdir(self.temp_dir):
-                if filename.startswith('session_') and filename.endswith('.json'):
+                if filename.startswith('session_') and filename.endswith(('.json', '.journal', '.lock')):
                     file_path = os.path.join(self.temp_dir, filename)
                     
                     # 檢查文件修改時間
@@ -115,7 +258,7 @@ class TempDataManager:
                         os.remove(file_path)
                         
         except Exception as e:
-            print(f"Error cleaning up temp files: {e}")
+            logger.error("Error cleaning up temp files: %s", e)
     
     def get_temp_files_info(self):
         """
@@ -130,7 +273,7 @@ class TempDataManager:
             
             files_info = []
             for filename in os.listdir(self.temp_dir):
-                if filename.startswith('session_') and filename.endswith('.json'):
+                if filename.startswith('session_') and filename.endswith(('.json', '.journal')):
                     file_path = os.path.join(self.temp_dir, filename)
                     file_time = datetime.fromtimestamp(os.path.getmtime(file_path))
                     file_size = os.path.getsize(file_path)
@@ -145,5 +288,5 @@ class TempDataManager:
             return files_info
             
         except Exception as e:
-            print(f"Error getting temp files info: {e}")
+            logger.error("Error getting temp files info: %s", e)
             return []
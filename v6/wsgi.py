@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+"""
+WSGI入口
+匯入時即初始化應用程式（設定見 app.create_app），供外部WSGI伺服器使用；
+OIR_SERVER_THREADS需與伺服器實際的執行緒數量相同，伺服器推送事件的串流最多使用其中一半（EVENT_MAX_STREAMS），
+每個串流佔用一個執行緒直到結束:
+    OIR_SERVER_WORKERS=4 OIR_SERVER_THREADS=16 gunicorn --preload -w 4 --threads 16 -b 0.0.0.0:5000 wsgi:app
+    OIR_SERVER_THREADS=16 waitress-serve --listen=0.0.0.0:5000 --threads=16 wsgi:app
+"""
+
+from app import create_app
+
+app = application = create_app()
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+唯讀xlsx讀取模組
+以記憶體映射(mmap)開啟xlsx檔案，直接以XML拉取解析(iterparse)讀取工作表，
+只返回需要的欄位的純tuple，不建立openpyxl的儲存格及樣式物件
+"""
+
+import mmap
+import re
+import zipfile
+from xml.etree import ElementTree
+
+from openpyxl.utils.datetime import MAC_EPOCH, WINDOWS_EPOCH, from_excel
+
+_MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+_REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+_ROW_TAG = f'{{{_MAIN_NS}}}row'
+_CELL_TAG = f'{{{_MAIN_NS}}}c'
+_VALUE_TAG = f'{{{_MAIN_NS}}}v'
+_INLINE_TAG = f'{{{_MAIN_NS}}}is'
+_TEXT_TAG = f'{{{_MAIN_NS}}}t'
+_SI_TAG = f'{{{_MAIN_NS}}}si'
+
+# 內建的日期/時間數字格式ID
+_BUILTIN_DATE_FORMATS = set(range(14, 23)) | set(range(45, 48))
+# 自訂格式中的日期字元（移除引號及方括號內容後判斷）
+_DATE_FORMAT_PATTERN = re.compile(r'[dmyhs]', re.I)
+_FORMAT_LITERALS = re.compile(r'"[^"]*"|\[[^\]]*\]|\\.')
+_DIGITS = '0123456789'
+
+def find_sheet_part(contents, sheet_name, fallback=True):
+    """
+    根據workbook.xml及其關聯檔案找出工作表XML的路徑
+
+    Args:
+        contents (dict): zip內的檔案名稱 -> 內容（至少包含workbook.xml及其rels）
+        sheet_name (str): 優先使用的工作表名稱
+        fallback (bool): 找不到指定名稱時是否使用第一個工作表
+
+    Returns:
+        str: 工作表XML在zip中的路徑，無法解析則返回None
+    """
+    try:
+        workbook = ElementTree.fromstring(contents['xl/workbook.xml'])
+        rels = ElementTree.fromstring(contents['xl/_rels/workbook.xml.rels'])
+    except (KeyError, ElementTree.ParseError):
+        return None
+
+    sheets = workbook.findall(f'{{{_MAIN_NS}}}sheets/{{{_MAIN_NS}}}sheet')
+    if not sheets:
+        return None
+    sheet = next((s for s in sheets if s.get('name') == sheet_name), sheets[0] if fallback else None)
+    if sheet is None:
+        return None
+    rel_id = sheet.get(f'{{{_REL_NS}}}id')
+
+    for rel in rels:
+        if rel.get('Id') == rel_id:
+            target = rel.get('Target')
+            return target.lstrip('/') if target.startswith('/') else f'xl/{target}'
+    return None
+
+class _MappedFile:
+    """
+    mmap的唯讀檔案介面
+    Python 3.13之前mmap沒有seekable()，zipfile無法直接使用
+    """
+
+    def __init__(self, mapped):
+        self._mapped = mapped
+
+    def read(self, size=-1):
+        return self._mapped.read(None if size is None or size < 0 else size)
+
+    def seek(self, offset, whence=0):
+        self._mapped.seek(offset, whence)
+        return self._mapped.tell()
+
+    def tell(self):
+        return self._mapped.tell()
+
+    def seekable(self):
+        return True
+
+def _column_index(letters):
+    """將欄位字母（如 'C'）轉換為0起算的欄位索引"""
+    index = 0
+    for char in letters:
+        index = index * 26 + ord(char) - 64
+    return index - 1
+
+def _read_shared_strings(zf):
+    """讀取共用字串表（富文字的多段文字會合併）"""
+    try:
+        source = zf.open('xl/sharedStrings.xml')
+    except KeyError:
+        return []
+
+    strings = []
+    with source:
+        for _, element in ElementTree.iterparse(source):
+            if element.tag == _SI_TAG:
+                strings.append(''.join(text.text or '' for text in element.iter(_TEXT_TAG)))
+                element.clear()
+    return strings
+
+def _read_date_styles(zf):
+    """
+    讀取樣式表中屬於日期格式的樣式索引
+
+    Returns:
+        set: cellXfs中日期格式的樣式索引
+    """
+    try:
+        styles = ElementTree.fromstring(zf.read('xl/styles.xml'))
+    except (KeyError, ElementTree.ParseError):
+        return set()
+
+    date_formats = set(_BUILTIN_DATE_FORMATS)
+    for num_fmt in styles.iter(f'{{{_MAIN_NS}}}numFmt'):
+        code = _FORMAT_LITERALS.sub('', num_fmt.get('formatCode', ''))
+        if _DATE_FORMAT_PATTERN.search(code):
+            date_formats.add(int(num_fmt.get('numFmtId')))
+
+    cell_xfs = styles.find(f'{{{_MAIN_NS}}}cellXfs')
+    if cell_xfs is None:
+        return set()
+    return {
+        index for index, xf in enumerate(cell_xfs)
+        if int(xf.get('numFmtId', 0)) in date_formats
+    }
+
+def _is_date1904(contents):
+    """工作簿是否使用1904日期系統"""
+    workbook = ElementTree.fromstring(contents['xl/workbook.xml'])
+    properties = workbook.find(f'{{{_MAIN_NS}}}workbookPr')
+    return properties is not None and properties.get('date1904') in ('1', 'true')
+
+def _number(text):
+    """將數值文字轉換為int或float（與openpyxl相同）"""
+    if '.' in text or 'E' in text or 'e' in text:
+        return float(text)
+    return int(text)
+
+def iter_sheet_rows(path, sheet_name, columns=None, min_row=1):
+    """
+    逐行讀取工作表
+
+    Args:
+        path (str): xlsx檔案路徑
+        sheet_name (str): 工作表名稱
+        columns (int | list): 欄位數量（返回前N欄）或0起算的欄位索引列表，None表示所有欄位
+        min_row (int): 起始行號（1起算）
+
+    Yields:
+        tuple: (行號, 欄位值tuple)；空行不會返回
+    """
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with zipfile.ZipFile(_MappedFile(mapped)) as zf:
+                contents = {
+                    name: zf.read(name) for name in ('xl/workbook.xml', 'xl/_rels/workbook.xml.rels')
+                    if name in zf.NameToInfo
+                }
+                sheet_part = find_sheet_part(contents, sheet_name, fallback=False)
+                if sheet_part is None:
+                    raise KeyError(f"Worksheet {sheet_name} does not exist")
+
+                shared_strings = _read_shared_strings(zf)
+                date_styles = _read_date_styles(zf)
+                epoch = MAC_EPOCH if _is_date1904(contents) else WINDOWS_EPOCH
+
+                if columns is None:
+                    selected = None
+                    width = None
+                elif isinstance(columns, int):
+                    selected = None
+                    width = columns
+                else:
+                    selected = {column: position for position, column in enumerate(columns)}
+                    width = len(columns)
+
+                column_cache = {}  # 欄位字母 -> 欄位索引
+                with zf.open(sheet_part) as source:
+                    for _, element in ElementTree.iterparse(source):
+                        if element.tag != _ROW_TAG:
+                            continue
+
+                        row_number = int(element.get('r'))
+                        if row_number < min_row:
+                            element.clear()
+                            continue
+
+                        values = {}
+                        for position, cell in enumerate(element.iter(_CELL_TAG)):
+                            ref = cell.get('r')
+                            if ref:
+                                letters = ref.rstrip(_DIGITS)
+                                column = column_cache.get(letters)
+                                if column is None:
+                                    column = column_cache[letters] = _column_index(letters)
+                            else:
+                                column = position
+                            if selected is not None:
+                                if column not in selected:
+                                    continue
+                                column = selected[column]
+                            elif width is not None and column >= width:
+                                continue
+
+                            cell_type = cell.get('t', 'n')
+                            if cell_type == 'inlineStr':
+                                inline = cell.find(_INLINE_TAG)
+                                value = ''.join(t.text or '' for t in inline.iter(_TEXT_TAG)) if inline is not None else None
+                            else:
+                                text = cell.findtext(_VALUE_TAG)
+                                if text is None:
+                                    continue
+                                if cell_type == 's':
+                                    value = shared_strings[int(text)]
+                                elif cell_type == 'b':
+                                    value = text == '1'
+                                elif cell_type in ('str', 'e'):
+                                    value = text
+                                else:
+                                    value = _number(text)
+                                    if int(cell.get('s', 0)) in date_styles:
+                                        value = from_excel(value, epoch)
+                            values[column] = value
+
+                        element.clear()
+                        if not values:
+                            continue
+
+                        row_width = width if width is not None else max(values) + 1
+                        yield row_number, tuple(values.get(column) for column in range(row_width))